@@ -18,7 +18,13 @@ if os.path.exists('.env'):
 from config import ProductionConfig, DevelopmentConfig
 from models import db, Usuario
 from views import init_routes
+from services import IdPublicoService
 from logging_config_simple import structured_logger
+from termo import termo_renderer
+from security import rate_limiter
+from cache_usuarios import cache_usuarios
+from instrumentacao import instrumentacao_sql
+from metricas import metricas
 
 # ============= INICIALIZAÇÃO DA APLICAÇÃO =============
 def create_app(config_name=None):
@@ -60,11 +66,26 @@ def create_app(config_name=None):
     
     @login_manager.user_loader
     def load_user(user_id):
-        return db.session.get(Usuario, int(user_id))
+        # Snapshot em cache: a maioria das requisições não consulta a tabela usuario
+        return cache_usuarios.obter(int(user_id))
+    
+    cache_usuarios.init_app(app)
     
     # Configurar logging estruturado
     structured_logger.init_app(app)
     
+    # Cache de PDFs do termo de cautela
+    termo_renderer.init_app(app)
+    
+    # Backend do rate limiter (memória ou arquivo compartilhado)
+    rate_limiter.init_app(app)
+    
+    # Consultas e tempo de banco por requisição (Server-Timing, N+1)
+    instrumentacao_sql.init_app(app)
+    
+    # Contadores/histogramas expostos em /metrics
+    metricas.init_app(app)
+    
     # Registrar rotas
     init_routes(app)
     
@@ -90,8 +111,6 @@ def setup_upload_directories(app):
 
 def setup_azure_storage(app):
     """Configurar Azure Blob Storage"""
-    from azure.storage.blob import BlobServiceClient
-    
     BLOB_CONTAINER = 'termos'
     blob_connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
     
@@ -99,6 +118,9 @@ def setup_azure_storage(app):
     USE_LOCAL_STORAGE = not blob_connection_string or blob_connection_string == "DefaultEndpointsProtocol=https;AccountName=devaccount;AccountKey=fake;EndpointSuffix=core.windows.net"
     
     if not USE_LOCAL_STORAGE:
+        # SDK do Azure só é carregado quando o armazenamento em blob está configurado
+        from azure.storage.blob import BlobServiceClient
+        
         try:
             blob_service_client = BlobServiceClient.from_connection_string(blob_connection_string)
             container_client = blob_service_client.get_container_client(BLOB_CONTAINER)
@@ -129,29 +151,43 @@ def register_context_processors(app):
             'app_version': '1.0.0'
         }
 
-def setup_app_hooks(app):
-    """Configurar hooks da aplicação"""
+def create_admin_user(app):
+    """Criar usuário admin se não existir (retorna True se criou)"""
+    if Usuario.query.filter_by(username='admin').first():
+        return False
+    
+    hash_senha = bcrypt.hashpw('admin123'.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    admin = Usuario(
+        username='admin', 
+        password_hash=hash_senha, 
+        nivel_acesso=3, 
+        nome_completo='Administrador do Sistema',
+        ativo=True,
+        created_at=datetime.utcnow()
+    )
+    db.session.add(admin)
+    db.session.commit()
+    app.logger.info("Usuário admin criado: admin / admin123")
+    return True
+
+def inicializar_banco(app):
+    """Criar tabelas e o usuário admin padrão
     
-    def create_admin_user():
-        """Criar usuário admin se não existir"""
-        if not Usuario.query.filter_by(username='admin').first():
-            hash_senha = bcrypt.hashpw('admin123'.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-            admin = Usuario(
-                username='admin', 
-                password_hash=hash_senha, 
-                nivel_acesso=3, 
-                nome_completo='Administrador do Sistema',
-                ativo=True,
-                created_at=datetime.utcnow()
-            )
-            db.session.add(admin)
-            db.session.commit()
-            app.logger.info("Usuário admin criado: admin / admin123")
-    
-    # Executar criação de usuário admin na inicialização
+    Passo explícito de implantação (python inicializar_banco.py); no boot só
+    roda com INICIALIZAR_BANCO_NO_BOOT=1, para os workers subirem sem tocar no banco.
+    """
     with app.app_context():
         db.create_all()
-        create_admin_user()
+        # create_all cria a sequência de IDs públicos a partir de 1
+        IdPublicoService.sincronizar_sequencia()
+        db.session.commit()
+        return create_admin_user(app)
+
+def setup_app_hooks(app):
+    """Configurar hooks da aplicação"""
+    
+    if app.config.get('INICIALIZAR_BANCO_NO_BOOT'):
+        inicializar_banco(app)
     
     @app.errorhandler(404)
     def not_found(error):
@@ -168,14 +204,6 @@ def setup_app_hooks(app):
 # ============= CRIAÇÃO DA APLICAÇÃO =============
 app = create_app()
 
-# ============= INICIALIZAÇÃO DO BANCO DE DADOS =============
-with app.app_context():
-    try:
-        db.create_all()
-        app.logger.info("Banco de dados inicializado com sucesso")
-    except Exception as e:
-        app.logger.error(f"Erro ao inicializar banco de dados: {e}")
-
 # ============= EXECUÇÃO DO SERVIDOR =============
 if __name__ == '__main__':
     # Configurações específicas para desenvolvimento
@@ -0,0 +1,361 @@
+"""
+Retenção de Histórico e Notificações
+Partições mensais (PostgreSQL), arquivamento das linhas frias em arquivos
+comprimidos e leitura dos arquivos para períodos antigos
+
+Layout em ARQUIVO_DIR:
+    <tabela>/AAAA-MM.jsonl.gz (ou .parquet)   linhas do mês
+    <tabela>/manifesto.json                   {"arquivado_ate": "AAAA-MM-01T00:00:00"}
+
+Linhas anteriores a arquivado_ate (o corte) foram movidas para os arquivos.
+"""
+import os
+import re
+import gzip
+import json
+import time
+import importlib.util
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, text
+from models import db, HistoricoEquipamento, Notificacao
+from logging_config_simple import log_performance_metric
+
+# tabela -> (modelo, coluna de data da partição/arquivamento, config da retenção em meses)
+TABELAS_RETENCAO = {
+    'historico_equipamento': (HistoricoEquipamento, 'data_acao', 'RETENCAO_HISTORICO_MESES'),
+    'notificacao': (Notificacao, 'created_at', 'RETENCAO_NOTIFICACAO_MESES'),
+}
+
+EXTENSOES = {'jsonl': '.jsonl.gz', 'parquet': '.parquet'}
+
+# Partições criadas à frente do mês atual pelo job
+MESES_PARTICOES_FUTURAS = 3
+
+TAMANHO_LOTE = 5000
+
+MANIFESTO = 'manifesto.json'
+ARQUIVO_MES = re.compile(r'^(\d{4})-(\d{2})(?:\.jsonl\.gz|\.parquet)$')
+
+def _inicio_do_mes(instante):
+    return datetime(instante.year, instante.month, 1)
+
+def _somar_meses(mes, meses):
+    total = mes.year * 12 + mes.month - 1 + meses
+    return datetime(total // 12, total % 12 + 1, 1)
+
+class ArquivoService:
+    """Retenção de historico_equipamento e notificacao"""
+    
+    @staticmethod
+    def _tabela(tabela):
+        if tabela not in TABELAS_RETENCAO:
+            raise ValueError(f"Tabela sem retenção: {tabela} (use {', '.join(TABELAS_RETENCAO)})")
+        modelo, coluna, _ = TABELAS_RETENCAO[tabela]
+        return modelo.__table__, modelo.__table__.c[coluna]
+    
+    @staticmethod
+    def particao(tabela, mes):
+        """Nome da partição mensal (manter em sincronia com a migração particionamento_mensal)"""
+        return f"{tabela}_p{mes:%Y_%m}"
+    
+    @staticmethod
+    def particao_padrao(tabela):
+        """Nome da partição DEFAULT (migração particionamento_mensal)"""
+        return f"{tabela}_padrao"
+    
+    @staticmethod
+    def validar_formato(formato):
+        """Levanta ValueError se o formato não existir ou exigir biblioteca ausente"""
+        if formato not in EXTENSOES:
+            raise ValueError(f"Formato de arquivo inválido: {formato} (use {', '.join(EXTENSOES)})")
+        if formato == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+            raise ValueError("Formato parquet requer pyarrow (pip install pyarrow)")
+    
+    @staticmethod
+    def configurado():
+        return bool(current_app.config.get('ARQUIVO_DIR'))
+    
+    @staticmethod
+    def diretorio(tabela):
+        """Levanta ValueError sem ARQUIVO_DIR: arquivar num diretório do contêiner perderia as linhas"""
+        if not ArquivoService.configurado():
+            raise ValueError("ARQUIVO_DIR não configurado (use um diretório em volume persistente)")
+        return os.path.join(current_app.config['ARQUIVO_DIR'], tabela)
+    
+    @staticmethod
+    def corte(tabela):
+        """Instante até o qual (exclusive) as linhas foram arquivadas, ou None"""
+        if not ArquivoService.configurado():
+            return None
+        caminho = os.path.join(ArquivoService.diretorio(tabela), MANIFESTO)
+        try:
+            with open(caminho, encoding='utf-8') as arquivo:
+                return datetime.fromisoformat(json.load(arquivo)['arquivado_ate'])
+        except FileNotFoundError:
+            return None
+    
+    @staticmethod
+    def _gravar_corte(tabela, corte):
+        caminho = os.path.join(ArquivoService.diretorio(tabela), MANIFESTO)
+        with open(caminho + '.tmp', 'w', encoding='utf-8') as arquivo:
+            json.dump({'arquivado_ate': corte.isoformat()}, arquivo)
+        os.replace(caminho + '.tmp', caminho)
+    
+    @staticmethod
+    def _meses_arquivados(tabela):
+        """{mes: caminho} dos arquivos mensais existentes"""
+        if not ArquivoService.configurado():
+            return {}
+        diretorio = ArquivoService.diretorio(tabela)
+        if not os.path.isdir(diretorio):
+            return {}
+        meses = {}
+        for nome in os.listdir(diretorio):
+            encontrado = ARQUIVO_MES.match(nome)
+            if encontrado:
+                meses[datetime(int(encontrado.group(1)), int(encontrado.group(2)), 1)] = os.path.join(diretorio, nome)
+        return meses
+    
+    @staticmethod
+    def _ler_arquivo(tabela, caminho, filtros=None):
+        """Linhas de um arquivo mensal, como dicts com os tipos das colunas
+        
+        Com filtros, descarta pelo texto as linhas .jsonl que não contêm
+        '"campo": valor' antes do json.loads (quem chama ainda compara os valores).
+        """
+        if caminho.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            yield from pq.read_table(caminho).to_pylist()
+            return
+        
+        colunas_data = [c.name for c in ArquivoService._tabela(tabela)[0].c if c.type.python_type is datetime]
+        # Mesmo formato de json.dumps em _gravar_arquivo
+        trechos = [
+            f'"{campo}": {json.dumps(valor, ensure_ascii=False)}'
+            for campo, valor in (filtros or {}).items() if isinstance(valor, (int, str))
+        ]
+        with gzip.open(caminho, 'rt', encoding='utf-8') as arquivo:
+            for texto in arquivo:
+                if not all(trecho in texto for trecho in trechos):
+                    continue
+                linha = json.loads(texto)
+                for nome in colunas_data:
+                    if linha.get(nome):
+                        linha[nome] = datetime.fromisoformat(linha[nome])
+                yield linha
+    
+    @staticmethod
+    def _gravar_arquivo(tabela, caminho, linhas, formato):
+        """Grava as linhas (iterável de dicts) no caminho; só substitui o arquivo ao final"""
+        temporario = caminho + '.tmp'
+        if formato == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            tipos = {int: pa.int64(), float: pa.float64(), bool: pa.bool_(),
+                     datetime: pa.timestamp('us'), str: pa.string()}
+            esquema = pa.schema([(c.name, tipos[c.type.python_type]) for c in ArquivoService._tabela(tabela)[0].c])
+            with pq.ParquetWriter(temporario, esquema, compression='zstd') as escritor:
+                lote = []
+                for linha in linhas:
+                    lote.append(linha)
+                    if len(lote) >= TAMANHO_LOTE:
+                        escritor.write_table(pa.Table.from_pylist(lote, schema=esquema))
+                        lote = []
+                if lote:
+                    escritor.write_table(pa.Table.from_pylist(lote, schema=esquema))
+        else:
+            with gzip.open(temporario, 'wt', encoding='utf-8') as arquivo:
+                for linha in linhas:
+                    arquivo.write(json.dumps(linha, ensure_ascii=False, default=lambda valor: valor.isoformat()))
+                    arquivo.write('\n')
+        os.replace(temporario, caminho)
+    
+    @staticmethod
+    def _arquivar_mes(tabela, mes, formato):
+        """Move as linhas do mês para o arquivo mensal e as remove do banco
+        
+        Um arquivo já existente do mês (ex.: execução interrompida antes de
+        remover as linhas) é mesclado pelo id; a partição do mês é descartada
+        mesmo vazia. Retorna o número de linhas movidas.
+        """
+        t, coluna = ArquivoService._tabela(tabela)
+        proximo = _somar_meses(mes, 1)
+        faixa = db.and_(coluna >= mes, coluna < proximo)
+        
+        existente = ArquivoService._meses_arquivados(tabela).get(mes)
+        anteriores = list(ArquivoService._ler_arquivo(tabela, existente)) if existente else []
+        ids_anteriores = {linha['id'] for linha in anteriores}
+        movidas = 0
+        
+        def linhas():
+            nonlocal movidas
+            yield from anteriores
+            resultado = db.session.execute(
+                db.select(t).where(faixa).order_by(coluna, t.c.id).execution_options(yield_per=TAMANHO_LOTE)
+            ).mappings()
+            for linha in resultado:
+                movidas += 1
+                if linha['id'] not in ids_anteriores:
+                    yield dict(linha)
+        
+        if db.session.execute(db.select(t.c.id).where(faixa).limit(1)).first():
+            caminho = os.path.join(ArquivoService.diretorio(tabela), f"{mes:%Y-%m}{EXTENSOES[formato]}")
+            ArquivoService._gravar_arquivo(tabela, caminho, linhas(), formato)
+            if existente and existente != caminho:
+                os.remove(existente)
+        
+        if db.engine.dialect.name == 'postgresql':
+            # Partição do mês: descartá-la é instantâneo (sem DELETE linha a linha)
+            nome = ArquivoService.particao(tabela, mes)
+            if db.session.execute(text("SELECT to_regclass(:nome)"), {'nome': nome}).scalar():
+                db.session.execute(text(f"ALTER TABLE {tabela} DETACH PARTITION {nome}"))
+                db.session.execute(text(f"DROP TABLE {nome}"))
+        # Linhas fora de partição mensal (SQLite, partição DEFAULT, tabela não particionada)
+        db.session.execute(delete(t).where(faixa))
+        db.session.commit()
+        return movidas
+    
+    @staticmethod
+    def arquivar(tabela, retencao_meses=None, formato=None, hoje=None):
+        """Arquiva as linhas de `tabela` anteriores aos últimos `retencao_meses` meses
+        
+        Mês a mês, da mais antiga para a mais recente: grava o arquivo, remove
+        as linhas do banco e, ao final, avança o corte do manifesto. Pode rodar
+        repetidamente; meses já arquivados não têm mais linhas no banco.
+        
+        Retorna {'tabela', 'meses', 'linhas', 'corte', 'segundos'}.
+        """
+        inicio = time.perf_counter()
+        t, coluna = ArquivoService._tabela(tabela)
+        diretorio = ArquivoService.diretorio(tabela)
+        retencao_meses = retencao_meses or current_app.config[TABELAS_RETENCAO[tabela][2]]
+        formato = formato or current_app.config['ARQUIVO_FORMATO']
+        ArquivoService.validar_formato(formato)
+        if retencao_meses < 1:
+            raise ValueError("Retenção deve ser de pelo menos 1 mês")
+        
+        limite = _somar_meses(_inicio_do_mes(hoje or datetime.utcnow()), -retencao_meses)
+        os.makedirs(diretorio, exist_ok=True)
+        
+        mais_antiga = db.session.execute(db.select(db.func.min(coluna)).where(coluna < limite)).scalar()
+        meses = linhas = 0
+        mes = _inicio_do_mes(mais_antiga) if mais_antiga else limite
+        while mes < limite:
+            movidas = ArquivoService._arquivar_mes(tabela, mes, formato)
+            if movidas:
+                meses += 1
+                linhas += movidas
+            mes = _somar_meses(mes, 1)
+        
+        corte = ArquivoService.corte(tabela)
+        if corte is None or limite > corte:
+            corte = limite
+            ArquivoService._gravar_corte(tabela, corte)
+        
+        resultado = {
+            'tabela': tabela,
+            'meses': meses,
+            'linhas': linhas,
+            'corte': corte.isoformat(),
+            'segundos': round(time.perf_counter() - inicio, 3)
+        }
+        log_performance_metric('arquivamento_segundos', resultado['segundos'], resultado)
+        return resultado
+    
+    @staticmethod
+    def _criar_particao(tabela, mes):
+        """Cria a partição do mês, movendo para ela as linhas do mês que estão na DEFAULT
+        
+        Sem isso o CREATE TABLE ... PARTITION OF falha quando a DEFAULT já
+        recebeu linhas do mês (ex.: o job não rodou a tempo). A DEFAULT é
+        desanexada durante a cópia e reanexada em seguida, na mesma transação.
+        """
+        _, coluna = ArquivoService._tabela(tabela)
+        nome = ArquivoService.particao(tabela, mes)
+        padrao = ArquivoService.particao_padrao(tabela)
+        faixa = {'inicio': mes, 'fim': _somar_meses(mes, 1)}
+        criar = (f"CREATE TABLE {nome} PARTITION OF {tabela} "
+                 f"FOR VALUES FROM ('{mes:%Y-%m-%d}') TO ('{faixa['fim']:%Y-%m-%d}')")
+        no_mes = f"{coluna.name} >= :inicio AND {coluna.name} < :fim"
+        
+        if not (db.session.execute(text("SELECT to_regclass(:nome)"), {'nome': padrao}).scalar()
+                and db.session.execute(text(f"SELECT 1 FROM {padrao} WHERE {no_mes} LIMIT 1"), faixa).first()):
+            db.session.execute(text(criar))
+            return
+        
+        db.session.execute(text(f"ALTER TABLE {tabela} DETACH PARTITION {padrao}"))
+        db.session.execute(text(criar))
+        db.session.execute(text(f"INSERT INTO {nome} SELECT * FROM {padrao} WHERE {no_mes}"), faixa)
+        db.session.execute(text(f"DELETE FROM {padrao} WHERE {no_mes}"), faixa)
+        db.session.execute(text(f"ALTER TABLE {tabela} ATTACH PARTITION {padrao} DEFAULT"))
+    
+    @staticmethod
+    def garantir_particoes(meses_a_frente=MESES_PARTICOES_FUTURAS, hoje=None):
+        """PostgreSQL: cria as partições do mês atual e dos próximos meses
+        
+        Só nas tabelas já particionadas (migração particionamento_mensal); em
+        outros bancos não há nada a fazer. Linhas dos meses novos que já estão
+        na partição DEFAULT são movidas para a partição do mês. Retorna os
+        nomes das partições criadas.
+        """
+        if db.engine.dialect.name != 'postgresql':
+            return []
+        
+        mes_atual = _inicio_do_mes(hoje or datetime.utcnow())
+        criadas = []
+        for tabela in TABELAS_RETENCAO:
+            tipo = db.session.execute(
+                text("SELECT relkind FROM pg_class WHERE relname = :nome"), {'nome': tabela}
+            ).scalar()
+            if tipo != 'p':
+                continue
+            for i in range(meses_a_frente + 1):
+                mes = _somar_meses(mes_atual, i)
+                nome = ArquivoService.particao(tabela, mes)
+                if db.session.execute(text("SELECT to_regclass(:nome)"), {'nome': nome}).scalar():
+                    continue
+                ArquivoService._criar_particao(tabela, mes)
+                criadas.append(nome)
+        db.session.commit()
+        return criadas
+    
+    @staticmethod
+    def ler(tabela, ate=None, desde=None, filtros=None):
+        """Linhas arquivadas com desde <= coluna < ate, da mais recente para a mais antiga
+        
+        Abre só os arquivos dos meses da faixa, do mais recente para o mais
+        antigo, então consumir parte do gerador lê só os meses necessários.
+        filtros = {coluna: valor}, por igualdade.
+        """
+        _, coluna = ArquivoService._tabela(tabela)
+        filtros = filtros or {}
+        for mes, caminho in sorted(ArquivoService._meses_arquivados(tabela).items(), reverse=True):
+            if ate is not None and mes >= ate:
+                continue
+            if desde is not None and _somar_meses(mes, 1) <= desde:
+                break
+            linhas = [
+                linha for linha in ArquivoService._ler_arquivo(tabela, caminho, filtros)
+                if all(linha.get(campo) == valor for campo, valor in filtros.items())
+                and (ate is None or linha[coluna.name] < ate)
+                and (desde is None or linha[coluna.name] >= desde)
+            ]
+            linhas.sort(key=lambda linha: (linha[coluna.name], linha['id']), reverse=True)
+            yield from linhas
+    
+    @staticmethod
+    def ler_ate(tabela, chave, filtros=None):
+        """Linhas arquivadas com (coluna, id) < chave, da mais recente para a mais antiga
+        
+        Continuação de uma paginação keyset (data, id) para dentro dos arquivos;
+        sem chave (primeira página), todas as linhas arquivadas.
+        """
+        if chave is None:
+            yield from ArquivoService.ler(tabela, filtros=filtros)
+            return
+        data_chave, id_chave = chave
+        _, coluna = ArquivoService._tabela(tabela)
+        for linha in ArquivoService.ler(tabela, ate=data_chave + timedelta(microseconds=1), filtros=filtros):
+            if (linha[coluna.name], linha['id']) < (data_chave, id_chave):
+                yield linha
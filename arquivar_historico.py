@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Job agendado: retenção de histórico e notificações
+
+Cria as partições mensais dos próximos meses (PostgreSQL) e move as linhas
+mais antigas que a retenção para arquivos comprimidos em ARQUIVO_DIR. As
+consultas de histórico continuam lendo os arquivos para períodos antigos.
+
+Uso (ex.: cron mensal):
+    python arquivar_historico.py [--tabela historico_equipamento|notificacao]
+                                 [--retencao-meses 24] [--formato jsonl|parquet]
+"""
+import sys
+import argparse
+
+from app import app
+from arquivamento import ArquivoService, TABELAS_RETENCAO, EXTENSOES, MESES_PARTICOES_FUTURAS
+
+def main():
+    parser = argparse.ArgumentParser(description='Arquiva histórico e notificações antigos')
+    parser.add_argument('--tabela', choices=list(TABELAS_RETENCAO), help='Só esta tabela (padrão: todas)')
+    parser.add_argument('--retencao-meses', type=int, help='Meses mantidos no banco (padrão: RETENCAO_*_MESES)')
+    parser.add_argument('--formato', choices=list(EXTENSOES), help='Formato dos arquivos (padrão: ARQUIVO_FORMATO)')
+    parser.add_argument('--particoes-futuras', type=int, default=MESES_PARTICOES_FUTURAS,
+                        help=f'Meses de partições criadas à frente (padrão: {MESES_PARTICOES_FUTURAS})')
+    args = parser.parse_args()
+    
+    if not app.config.get('ARQUIVO_DIR'):
+        print("❌ ARQUIVO_DIR não configurado: aponte para um diretório em volume persistente")
+        return 1
+    
+    with app.app_context():
+        try:
+            criadas = ArquivoService.garantir_particoes(args.particoes_futuras)
+            if criadas:
+                print(f"🧱 Partições criadas: {', '.join(criadas)}")
+            
+            for tabela in [args.tabela] if args.tabela else TABELAS_RETENCAO:
+                resultado = ArquivoService.arquivar(tabela, args.retencao_meses, args.formato)
+                print(f"📦 {tabela}: {resultado['linhas']} linhas de {resultado['meses']} meses arquivadas "
+                      f"(corte {resultado['corte'][:10]}, {resultado['segundos']:.3f}s)")
+        except Exception as e:
+            print(f"❌ Erro no arquivamento: {e}")
+            return 1
+        
+        print(f"🗄️  Arquivos em: {app.config['ARQUIVO_DIR']}")
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Job agendado: backfill de valor_depreciado
+
+Calcula a depreciação linear de todos os equipamentos de uma vez (NumPy) e
+grava o valor contábil em valor_depreciado, só nas linhas que mudaram.
+
+Uso (ex.: cron noturno):
+    python atualizar_depreciacao.py [--data AAAA-MM-DD] [--lote 5000]
+"""
+import sys
+import argparse
+from datetime import datetime
+
+from app import app
+from depreciacao import DepreciacaoService, TAMANHO_LOTE
+
+def main():
+    parser = argparse.ArgumentParser(description='Atualiza valor_depreciado de todos os equipamentos')
+    parser.add_argument('--data', help='Data de referência AAAA-MM-DD (padrão: hoje)')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help=f'Linhas por UPDATE em lote (padrão: {TAMANHO_LOTE})')
+    args = parser.parse_args()
+    
+    try:
+        data_referencia = datetime.strptime(args.data, '%Y-%m-%d').date() if args.data else None
+    except ValueError:
+        print("❌ Data inválida (use AAAA-MM-DD)")
+        return 1
+    
+    with app.app_context():
+        try:
+            resultado = DepreciacaoService.atualizar_valor_depreciado(data_referencia, tamanho_lote=args.lote)
+        except Exception as e:
+            print(f"❌ Erro ao atualizar depreciação: {e}")
+            return 1
+        
+        print(f"📦 Equipamentos calculados: {resultado['equipamentos']}")
+        print(f"💰 valor_depreciado atualizado: {resultado['atualizados']}")
+        print(f"⏱️  Tempo: {resultado['segundos']:.3f}s")
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
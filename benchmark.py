@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+Suíte de benchmark com gerador de dados sintéticos
+
+Popula um banco separado com volumes realistas (distribuições de categoria e
+localização concentradas, como no inventário real), mede os cenários mais
+usados e grava o resultado em JSON para comparar entre commits.
+
+Volumes com --escala 1: 100k equipamentos, 1M registros de histórico e 10k
+notificações. A geração é determinística para a mesma --semente/--escala.
+
+Uso:
+    python benchmark.py --escala 0.05 --saida antes.json
+    python benchmark.py --escala 0.05 --reutilizar --comparar antes.json
+    python benchmark.py --banco postgresql://.../bench --cenarios consulta,api_search
+
+Por padrão o banco é um SQLite em arquivo temporário; nunca aponte --banco
+para o banco de produção (o script recusa bancos que já tenham equipamentos,
+a menos que --reutilizar seja informado).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime, date, timedelta
+
+from sqlalchemy import insert
+from models import db, Usuario, Equipamento, Categoria, Fornecedor, HistoricoEquipamento, Notificacao
+
+VOLUMES = {
+    'equipamentos': 100_000,
+    'historico': 1_000_000,
+    'notificacoes': 10_000,
+    'usuarios': 200,
+    'categorias': 25,
+    'fornecedores': 60,
+    'localizacoes': 300,
+    'centros_custo': 40,
+    'departamentos': 15,
+}
+
+VOLUMOSAS = ('equipamentos', 'historico', 'notificacoes')
+
+TAMANHO_LOTE = 5000
+SEMENTE_PADRAO = 42
+
+# Aplicadas com create_all, que não cria a tabela FTS5/os índices trigram
+MIGRACOES_BUSCA = ('indice_busca_textual', 'gatilho_busca_colunas')
+
+# (valor, peso)
+STATUS = (('Em uso', 60), ('Estocado', 25), ('Manutenção', 10), ('Descartado', 5))
+CONDICOES = (('Novo', 30), ('Usado', 55), ('Danificado', 10), ('Obsoleto', 5))
+TIPOS = ('Notebook', 'Desktop', 'Monitor', 'Mouse', 'Teclado', 'Impressora', 'Celular',
+         'Tablet', 'Projetor', 'Roteador', 'Switch', 'Nobreak', 'Cadeira', 'Mesa')
+MARCAS = ('Dell', 'HP', 'Lenovo', 'Samsung', 'LG', 'Logitech', 'Epson', 'Apple',
+          'Positivo', 'Cisco', 'APC', 'Multilaser')
+ACOES = (('Editado', 50), ('Movido', 25), ('Manutenção', 10), ('Termo Gerado', 10), ('Criado', 5))
+CAMPOS = ('status', 'localizacao', 'responsavel', 'condicao', 'valor')
+
+def _pesos_zipf(quantidade, expoente=1.1):
+    """Pesos acumulados de uma distribuição de Zipf (poucos itens concentram a maioria)"""
+    acumulado = []
+    total = 0.0
+    for posicao in range(1, quantidade + 1):
+        total += 1 / posicao ** expoente
+        acumulado.append(total)
+    return acumulado
+
+def _acumulados(opcoes):
+    valores = [valor for valor, _ in opcoes]
+    acumulado = []
+    total = 0
+    for _, peso in opcoes:
+        total += peso
+        acumulado.append(total)
+    return valores, acumulado
+
+class GeradorDados:
+    """Gera o inventário sintético com inserts em lote (determinístico pela semente)"""
+    
+    def __init__(self, semente=SEMENTE_PADRAO, escala=1.0, hoje=None):
+        self.rnd = random.Random(semente)
+        self.hoje = hoje or date.today()
+        # Cadastros auxiliares crescem mais devagar que as tabelas volumosas
+        self.volumes = {
+            nome: max(1, round(quantidade * escala)) if nome in VOLUMOSAS
+            else max(3, min(quantidade, round(quantidade * escala ** 0.5)))
+            for nome, quantidade in VOLUMES.items()
+        }
+    
+    def _inserir(self, modelo, linhas):
+        """INSERT (Core) em lotes de TAMANHO_LOTE linhas"""
+        for i in range(0, len(linhas), TAMANHO_LOTE):
+            db.session.execute(insert(modelo.__table__), linhas[i:i + TAMANHO_LOTE])
+    
+    def _ids(self, coluna):
+        return db.session.execute(db.select(coluna).order_by(coluna)).scalars().all()
+    
+    def gerar(self, progresso=None):
+        """Popula o banco (na sessão corrente) e retorna as contagens e o tempo gasto"""
+        from services import IdPublicoService
+        inicio = time.perf_counter()
+        rnd = self.rnd
+        avisar = progresso or (lambda mensagem: None)
+        agora = datetime.combine(self.hoje, datetime.min.time())
+        
+        avisar("👥 Usuários, categorias e fornecedores...")
+        # bcrypt é caro: todos os usuários sintéticos compartilham o mesmo hash
+        import bcrypt
+        hash_senha = bcrypt.hashpw(b'benchmark', bcrypt.gensalt(4)).decode('utf-8')
+        self._inserir(Usuario, [{
+            'username': f'bench_usuario_{i:04d}',
+            'password_hash': hash_senha,
+            'nivel_acesso': 2 if i % 10 == 0 else 1,
+            'nome_completo': f'Usuário Sintético {i}',
+            'departamento': f'Departamento {i % 12}',
+            'ativo': True,
+            'created_at': agora
+        } for i in range(self.volumes['usuarios'])])
+        self._inserir(Categoria, [{
+            'nome': f'Categoria {i:02d}', 'icone': '📦', 'cor': '#3B82F6', 'ativo': True
+        } for i in range(self.volumes['categorias'])])
+        self._inserir(Fornecedor, [{
+            'nome': f'Fornecedor {i:03d}', 'cnpj': f'{i:02d}.345.678/0001-90', 'ativo': True, 'created_at': agora
+        } for i in range(self.volumes['fornecedores'])])
+        
+        usuarios = self._ids(Usuario.id)
+        categorias = self._ids(Categoria.id)
+        fornecedores = self._ids(Fornecedor.id)
+        localizacoes = [f'Prédio {i // 20} - Sala {i % 20:02d}' for i in range(self.volumes['localizacoes'])]
+        pesos_categoria = _pesos_zipf(len(categorias))
+        pesos_localizacao = _pesos_zipf(len(localizacoes))
+        centros_custo = [f'CC-{i:03d}' for i in range(self.volumes['centros_custo'])]
+        pesos_centro_custo = _pesos_zipf(len(centros_custo))
+        departamentos = [f'Departamento {i:02d}' for i in range(self.volumes['departamentos'])]
+        pesos_departamento = _pesos_zipf(len(departamentos))
+        status, pesos_status = _acumulados(STATUS)
+        condicoes, pesos_condicao = _acumulados(CONDICOES)
+        
+        avisar(f"💻 {self.volumes['equipamentos']} equipamentos...")
+        ids_publicos = IdPublicoService.reservar(self.volumes['equipamentos'])
+        linhas = []
+        for numero, id_publico in enumerate(ids_publicos):
+            aquisicao = self.hoje - timedelta(days=rnd.randint(0, 8 * 365))
+            garantia = aquisicao + timedelta(days=rnd.choice((365, 730, 1095))) if rnd.random() < 0.7 else None
+            linhas.append({
+                'id_publico': id_publico,
+                'tipo': rnd.choice(TIPOS),
+                'marca': rnd.choice(MARCAS),
+                'modelo': f'Modelo {rnd.randint(1, 400)}',
+                'num_serie': f'SN{numero:08d}',
+                'data_aquisicao': aquisicao,
+                'valor': round(rnd.lognormvariate(7.5, 1.0), 2),
+                'valor_residual': 0.0,
+                'vida_util_anos': rnd.choice((3, 5, 5, 10)),
+                'valor_depreciado': 0.0,
+                'localizacao': rnd.choices(localizacoes, cum_weights=pesos_localizacao)[0],
+                'responsavel': f'Colaborador {rnd.randint(1, 5000)}',
+                'centro_custo': rnd.choices(centros_custo, cum_weights=pesos_centro_custo)[0],
+                'departamento': rnd.choices(departamentos, cum_weights=pesos_departamento)[0],
+                'status': rnd.choices(status, cum_weights=pesos_status)[0],
+                'condicao': rnd.choices(condicoes, cum_weights=pesos_condicao)[0],
+                'garantia_ate': garantia,
+                'fornecedor_id': rnd.choice(fornecedores),
+                'categoria_id': rnd.choices(categorias, cum_weights=pesos_categoria)[0],
+                'created_at': agora,
+                'updated_at': agora,
+                'ativo': True,
+                'bloqueado': False
+            })
+        self._inserir(Equipamento, linhas)
+        equipamentos = self._ids(Equipamento.id_interno)
+        
+        avisar(f"🕘 {self.volumes['historico']} registros de histórico...")
+        # Alguns equipamentos concentram a maior parte das movimentações
+        pesos_equipamento = _pesos_zipf(len(equipamentos), expoente=0.8)
+        acoes, pesos_acao = _acumulados(ACOES)
+        restantes = self.volumes['historico']
+        while restantes:
+            quantidade = min(restantes, TAMANHO_LOTE * 4)
+            lote = []
+            for equipamento_id, acao in zip(
+                rnd.choices(equipamentos, cum_weights=pesos_equipamento, k=quantidade),
+                rnd.choices(acoes, cum_weights=pesos_acao, k=quantidade)
+            ):
+                campo = rnd.choice(CAMPOS) if acao == 'Editado' else None
+                lote.append({
+                    'equipamento_id': equipamento_id,
+                    'acao': acao,
+                    'campo_alterado': campo,
+                    'valor_anterior': 'anterior' if campo else None,
+                    'valor_novo': 'novo' if campo else None,
+                    'descricao': f'{acao} (sintético)',
+                    'data_acao': agora - timedelta(seconds=rnd.randint(0, 5 * 365 * 86400)),
+                    'usuario_id': rnd.choice(usuarios),
+                    'ip_address': '10.0.0.1'
+                })
+            self._inserir(HistoricoEquipamento, lote)
+            restantes -= quantidade
+        
+        avisar(f"🔔 {self.volumes['notificacoes']} notificações...")
+        pesos_usuario = _pesos_zipf(len(usuarios))
+        self._inserir(Notificacao, [{
+            'usuario_id': rnd.choices(usuarios, cum_weights=pesos_usuario)[0],
+            'titulo': 'Aviso sintético',
+            'mensagem': 'Notificação gerada pelo benchmark',
+            'tipo': 'info',
+            'lida': rnd.random() < 0.7,
+            'equipamento_id': rnd.choice(equipamentos),
+            'created_at': agora - timedelta(seconds=rnd.randint(0, 365 * 86400))
+        } for _ in range(self.volumes['notificacoes'])])
+        
+        db.session.commit()
+        return {'volumes': contar_volumes(), 'segundos': round(time.perf_counter() - inicio, 2)}
+
+def contar_volumes():
+    """Quantidade de linhas das tabelas medidas"""
+    return {
+        'equipamentos': db.session.query(db.func.count(Equipamento.id_interno)).scalar(),
+        'historico': db.session.query(db.func.count(HistoricoEquipamento.id)).scalar(),
+        'notificacoes': db.session.query(db.func.count(Notificacao.id)).scalar(),
+        'usuarios': db.session.query(db.func.count(Usuario.id)).scalar(),
+    }
+
+def ativar_indice_busca():
+    """Aplica as migrações do índice de busca (FTS5/pg_trgm) no banco de benchmark"""
+    import importlib.util
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+    from search import search_index
+    
+    for nome in MIGRACOES_BUSCA:
+        caminho = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations', 'versions', f'{nome}.py')
+        spec = importlib.util.spec_from_file_location(nome, caminho)
+        migracao = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(migracao)
+        with db.engine.begin() as conexao:
+            with Operations.context(MigrationContext.configure(conexao)):
+                migracao.upgrade()
+    search_index.invalidar()
+
+# ============= CENÁRIOS =============
+
+def _termo_busca():
+    """Termo frequente (localização mais comum) para as buscas textuais"""
+    localizacao = db.session.execute(
+        db.select(Equipamento.localizacao).group_by(Equipamento.localizacao)
+        .order_by(db.func.count().desc()).limit(1)
+    ).scalar()
+    return (localizacao or 'Prédio').split(' - ')[0]
+
+def _cenario_garantias(client, contexto):
+    from services import NotificacaoService, TITULO_GARANTIA
+    # Cada repetição parte do mesmo estado: sem notificações de garantia
+    db.session.execute(db.delete(Notificacao).where(Notificacao.titulo.like(f'{TITULO_GARANTIA}%')))
+    db.session.commit()
+    inicio = time.perf_counter()
+    resultado = NotificacaoService.verificar_garantias_expirando(hoje=contexto['hoje'])
+    return {'ms': (time.perf_counter() - inicio) * 1000, 'status': 200, 'bytes': 0,
+            'criadas': resultado['criadas']}
+
+def _cenario_termo(client, contexto):
+    # Um equipamento diferente por repetição: mede a renderização, não o cache
+    id_publico = contexto['ids_termo'][contexto['repeticao'] % len(contexto['ids_termo'])]
+    return f'/gerar_termo_cautela/{id_publico}'
+
+# nome: URL (str), função que monta a URL a partir do contexto ou função que mede por conta própria
+CENARIOS = {
+    'consulta': lambda client, contexto: '/consulta?status=Em+uso',
+    'consulta_busca': lambda client, contexto: f"/consulta?busca={contexto['termo']}&ordenacao=recentes",
+    'api_search': lambda client, contexto: f"/api/search?q={contexto['termo']}",
+    'api_dashboard_stats': lambda client, contexto: '/api/dashboard-stats',
+    'exportar_csv': lambda client, contexto: '/exportar_csv',
+    'gerar_termo_cautela': _cenario_termo,
+    'previsao_depreciacao': lambda client, contexto: '/api/depreciacao/previsao?meses=60&agrupar_por=centro_custo',
+    'verificar_garantias_expirando': _cenario_garantias,
+}
+
+def _ler_server_timing(valor):
+    """(consultas, ms de banco) a partir do header Server-Timing da instrumentação SQL"""
+    consultas, db_ms = None, None
+    for metrica in (valor or '').split(','):
+        partes = [parte.strip() for parte in metrica.split(';')]
+        if partes[0] != 'db':
+            continue
+        for parte in partes[1:]:
+            if parte.startswith('dur='):
+                db_ms = float(parte[4:])
+            elif parte.startswith('desc='):
+                consultas = int(parte[5:].strip('"').split()[0])
+    return consultas, db_ms
+
+def _medir(client, cenario, contexto):
+    alvo = cenario(client, contexto)
+    if isinstance(alvo, dict):
+        return alvo
+    inicio = time.perf_counter()
+    resposta = client.get(alvo)
+    # Em respostas em streaming o header sai antes das consultas: não há contagem
+    streaming = 'Content-Length' not in resposta.headers
+    corpo = resposta.get_data()
+    ms = (time.perf_counter() - inicio) * 1000
+    consultas, db_ms = (None, None) if streaming else _ler_server_timing(resposta.headers.get('Server-Timing'))
+    return {'ms': ms, 'status': resposta.status_code, 'bytes': len(corpo), 'consultas': consultas, 'db_ms': db_ms}
+
+def _resumir(medicoes):
+    tempos = sorted(m['ms'] for m in medicoes)
+    p95 = statistics.quantiles(tempos, n=20, method='inclusive')[18] if len(tempos) > 1 else tempos[0]
+    resumo = {
+        'repeticoes': len(tempos),
+        'mediana_ms': round(statistics.median(tempos), 2),
+        'p95_ms': round(p95, 2),
+        'min_ms': round(tempos[0], 2),
+        'max_ms': round(tempos[-1], 2),
+        'status': sorted({m['status'] for m in medicoes}),
+        'bytes': medicoes[-1]['bytes'],
+    }
+    for chave in ('consultas', 'db_ms', 'criadas'):
+        valores = [m[chave] for m in medicoes if m.get(chave) is not None]
+        if valores:
+            resumo[chave] = round(statistics.median(valores), 2)
+    return resumo
+
+def executar_cenarios(client, repeticoes=5, aquecimento=1, nomes=None, hoje=None):
+    """Mede os cenários com o `client` (já autenticado); retorna {nome: resumo}"""
+    nomes = nomes or list(CENARIOS)
+    desconhecidos = [nome for nome in nomes if nome not in CENARIOS]
+    if desconhecidos:
+        raise ValueError(f"Cenário(s) desconhecido(s): {', '.join(desconhecidos)}")
+    
+    contexto = {
+        'hoje': hoje or date.today(),
+        'termo': _termo_busca(),
+        'ids_termo': db.session.execute(
+            db.select(Equipamento.id_publico).order_by(Equipamento.id_interno).limit(repeticoes + aquecimento)
+        ).scalars().all() or ['PAT-001'],
+    }
+    db.session.commit()
+    
+    resultados = {}
+    for nome in nomes:
+        medicoes = []
+        for repeticao in range(aquecimento + repeticoes):
+            contexto['repeticao'] = repeticao
+            medicao = _medir(client, CENARIOS[nome], contexto)
+            if repeticao >= aquecimento:
+                medicoes.append(medicao)
+        resultados[nome] = _resumir(medicoes)
+    return resultados
+
+def comparar(atual, anterior, tolerancia=0.10):
+    """Linhas (nome, antes, depois, variação, regrediu) comparando as medianas"""
+    linhas = []
+    for nome, resumo in atual['cenarios'].items():
+        antes = anterior.get('cenarios', {}).get(nome)
+        if not antes:
+            continue
+        variacao = (resumo['mediana_ms'] - antes['mediana_ms']) / antes['mediana_ms'] if antes['mediana_ms'] else 0.0
+        linhas.append((nome, antes['mediana_ms'], resumo['mediana_ms'], variacao, variacao > tolerancia))
+    return linhas
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dos cenários principais com dados sintéticos')
+    parser.add_argument('--banco', help='URL do banco de benchmark (padrão: SQLite temporário)')
+    parser.add_argument('--escala', type=float, default=1.0, help='Fração dos volumes padrão (1 = 100k equipamentos)')
+    parser.add_argument('--semente', type=int, default=SEMENTE_PADRAO, help=f'Semente do gerador (padrão: {SEMENTE_PADRAO})')
+    parser.add_argument('--reutilizar', action='store_true', help='Usa os dados já gerados no banco, se houver')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Medições por cenário (padrão: 5)')
+    parser.add_argument('--cenarios', help=f"Lista separada por vírgula (padrão: todos: {', '.join(CENARIOS)})")
+    parser.add_argument('--sem-indice-busca', action='store_true', help='Não cria o índice de busca textual (FTS5/pg_trgm)')
+    parser.add_argument('--saida', help='Grava o resultado em JSON')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior para comparar as medianas')
+    parser.add_argument('--tolerancia', type=float, default=0.10, help='Variação aceita na comparação (padrão: 0.10)')
+    parser.add_argument('--exigir', action='store_true', help='Sai com código 1 se algum cenário regredir além da tolerância')
+    args = parser.parse_args()
+    
+    # O banco precisa estar definido antes de importar a aplicação
+    os.environ['DATABASE_URL'] = args.banco or f"sqlite:///{os.path.join(tempfile.gettempdir(), 'benchmark_patrimonio.db')}"
+    os.environ.setdefault('INSTRUMENTACAO_SQL', '1')
+    from app import app, inicializar_banco
+    
+    with app.app_context():
+        try:
+            inicializar_banco(app)
+            volumes = contar_volumes()
+            if volumes['equipamentos'] and not args.reutilizar:
+                print("❌ O banco já tem equipamentos; use --reutilizar ou um banco vazio")
+                return 1
+            geracao = None
+            if not volumes['equipamentos']:
+                geracao = GeradorDados(args.semente, args.escala).gerar(progresso=print)
+                volumes = geracao['volumes']
+                print(f"✅ Dados gerados em {geracao['segundos']}s")
+            if not args.sem_indice_busca:
+                ativar_indice_busca()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Erro ao preparar o banco de benchmark: {e}")
+            return 1
+        
+        client = app.test_client()
+        resposta = client.post('/login', data={'username': 'admin', 'senha': 'admin123'})
+        if resposta.status_code != 302:
+            print("❌ Não foi possível autenticar com o usuário admin padrão")
+            return 1
+        
+        nomes = [nome.strip() for nome in args.cenarios.split(',')] if args.cenarios else None
+        try:
+            cenarios = executar_cenarios(client, repeticoes=args.repeticoes, nomes=nomes)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        banco = db.engine.dialect.name
+    
+    resultado = {
+        'commit': _commit_atual(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'banco': banco,
+        'semente': args.semente,
+        'escala': args.escala,
+        'volumes': volumes,
+        'geracao_segundos': geracao['segundos'] if geracao else None,
+        'cenarios': cenarios,
+    }
+    
+    for nome, resumo in cenarios.items():
+        extra = f", {resumo['consultas']:.0f} consultas" if 'consultas' in resumo else ''
+        erro = '' if resumo['status'] == [200] else f" ⚠️  status {resumo['status']}"
+        print(f"⏱️  {nome}: mediana {resumo['mediana_ms']} ms, p95 {resumo['p95_ms']} ms{extra}{erro}")
+    
+    regressoes = []
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            anterior = json.load(arquivo)
+        if any(anterior.get(chave) != resultado[chave] for chave in ('banco', 'semente', 'escala')):
+            print("⚠️  Banco, semente ou escala diferentes da execução anterior; a comparação pode não ser justa")
+        print(f"📊 Comparação com {anterior.get('commit') or args.comparar}:")
+        for nome, antes, depois, variacao, regrediu in comparar(resultado, anterior, args.tolerancia):
+            print(f"   {'❌' if regrediu else '✅'} {nome}: {antes} -> {depois} ms ({variacao:+.1%})")
+            if regrediu:
+                regressoes.append(nome)
+    
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+        print(f"💾 Resultado gravado em {args.saida}")
+    
+    return 1 if args.exigir and regressoes else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark de inicialização da aplicação
+
+Mede, em processos Python novos, o tempo de `import app` (módulos + create_app)
+e de um create_app adicional já com os módulos carregados, e lista quais
+bibliotecas pesadas foram carregadas no boot.
+
+Uso:
+    python benchmark_inicializacao.py [--repeticoes 5] [--json]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BIBLIOTECAS_PESADAS = ('pandas', 'numpy', 'reportlab', 'qrcode', 'PIL', 'azure.storage.blob', 'openpyxl')
+
+# Executado em cada processo filho; imprime uma linha JSON
+MEDICAO = """
+import sys, json, time
+inicio = time.perf_counter()
+import app as modulo
+total = time.perf_counter() - inicio
+inicio = time.perf_counter()
+modulo.create_app()
+boot = time.perf_counter() - inicio
+print(json.dumps({
+    'total_ms': total * 1000,
+    'boot_ms': boot * 1000,
+    'carregadas': [nome for nome in %r if nome in sys.modules]
+}))
+"""
+
+def medir(diretorio):
+    ambiente = dict(os.environ)
+    ambiente.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+    resultado = subprocess.run(
+        [sys.executable, '-c', MEDICAO % (BIBLIOTECAS_PESADAS,)],
+        cwd=diretorio, env=ambiente, capture_output=True, text=True, check=True
+    )
+    return json.loads(resultado.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Mede o tempo de import e boot da aplicação')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Processos medidos (padrão: 5)')
+    parser.add_argument('--json', action='store_true', help='Imprime o resultado em JSON')
+    args = parser.parse_args()
+    
+    diretorio = os.path.dirname(os.path.abspath(__file__))
+    try:
+        medicoes = [medir(diretorio) for _ in range(args.repeticoes)]
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Erro ao iniciar a aplicação:\n{e.stderr}")
+        return 1
+    
+    total = statistics.median(m['total_ms'] for m in medicoes)
+    boot = statistics.median(m['boot_ms'] for m in medicoes)
+    resultado = {
+        'repeticoes': args.repeticoes,
+        'import_ms': round(total - boot, 1),
+        'boot_ms': round(boot, 1),
+        'total_ms': round(total, 1),
+        'bibliotecas_pesadas_no_boot': medicoes[-1]['carregadas']
+    }
+    
+    if args.json:
+        print(json.dumps(resultado, ensure_ascii=False))
+        return 0
+    
+    print(f"📦 Import dos módulos: {resultado['import_ms']} ms (mediana de {args.repeticoes})")
+    print(f"🚀 create_app: {resultado['boot_ms']} ms")
+    print(f"⏱️  Total até servir: {resultado['total_ms']} ms")
+    carregadas = resultado['bibliotecas_pesadas_no_boot']
+    print(f"📚 Bibliotecas pesadas no boot: {', '.join(carregadas) if carregadas else 'nenhuma'}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Cache de Usuários Autenticados
+Snapshots imutáveis de usuário/permissões para o user_loader do Flask-Login
+"""
+import time
+import threading
+from flask_login import UserMixin
+from models import db, Usuario
+
+# Tempo de vida padrão de um snapshot (sobrescrito por USUARIO_CACHE_TTL)
+TTL_PADRAO = 60
+
+class UsuarioSnapshot(UserMixin):
+    """Cópia somente-leitura dos campos de um Usuario usados nas requisições
+    
+    Não é uma entidade do ORM: para alterar o usuário, carregue o Usuario
+    pelo id e invalide o cache depois do commit.
+    """
+    
+    CAMPOS = ('id', 'username', 'nivel_acesso', 'nome_completo', 'email', 'departamento', 'ativo')
+    
+    def __init__(self, **valores):
+        for campo in self.CAMPOS:
+            object.__setattr__(self, campo, valores.get(campo))
+    
+    def __setattr__(self, nome, valor):
+        raise AttributeError(f"Snapshot de usuário é somente leitura (campo '{nome}')")
+    
+    def __repr__(self):
+        return f'<UsuarioSnapshot {self.username}>'
+    
+    @classmethod
+    def de_usuario(cls, usuario):
+        return cls(**{campo: getattr(usuario, campo) for campo in cls.CAMPOS})
+    
+    @property
+    def is_admin(self):
+        """Retorna True se o usuário for administrador (nível 3)"""
+        return self.nivel_acesso == 3
+
+class CacheUsuarios:
+    """Cache por processo (TTL) de snapshots de usuário
+    
+    Alterações feitas neste processo invalidam a entrada na hora; nos demais
+    workers o snapshot antigo vale no máximo até o TTL expirar.
+    """
+    
+    def __init__(self, ttl=TTL_PADRAO, limite=10000):
+        self.ttl = ttl
+        self.limite = limite
+        self._itens = {}
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        """Ajusta o TTL pela configuração USUARIO_CACHE_TTL"""
+        self.ttl = float(app.config.get('USUARIO_CACHE_TTL', TTL_PADRAO))
+    
+    def obter(self, usuario_id):
+        """Snapshot do usuário, consultando o banco só quando ausente ou expirado"""
+        agora = time.monotonic()
+        item = self._itens.get(usuario_id)
+        if item and item[1] > agora:
+            return item[0]
+        
+        usuario = db.session.get(Usuario, usuario_id)
+        if usuario is None:
+            self.invalidar(usuario_id)
+            return None
+        
+        snapshot = UsuarioSnapshot.de_usuario(usuario)
+        with self._lock:
+            if len(self._itens) >= self.limite:
+                self._descartar_expirados(agora)
+            self._itens[usuario_id] = (snapshot, agora + self.ttl)
+        return snapshot
+    
+    def invalidar(self, usuario_id=None):
+        """Remove o snapshot de um usuário (ou de todos, sem argumento)"""
+        with self._lock:
+            if usuario_id is None:
+                self._itens.clear()
+            else:
+                self._itens.pop(usuario_id, None)
+    
+    def _descartar_expirados(self, agora):
+        for chave in [c for c, (_, expira) in self._itens.items() if expira <= agora]:
+            del self._itens[chave]
+        # Ainda cheio: descarta os mais antigos (ordem de inserção)
+        excesso = len(self._itens) - self.limite + 1
+        for chave in list(self._itens)[:max(excesso, 0)]:
+            del self._itens[chave]
+
+# Instância global
+cache_usuarios = CacheUsuarios()
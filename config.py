@@ -5,6 +5,40 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = "/app/uploads/termos"
+    TERMO_CACHE_MB = int(os.environ.get("TERMO_CACHE_MB", 32))
+    TERMO_PROCESSOS = int(os.environ.get("TERMO_PROCESSOS", 0)) or None
+    # 'memoria' (por processo) ou 'sqlite:///caminho/rate_limit.db' (compartilhado entre workers)
+    RATE_LIMIT_STORAGE = os.environ.get("RATE_LIMIT_STORAGE", "memoria")
+    # Segundos que um snapshot de usuário/permissões fica em cache no worker
+    USUARIO_CACHE_TTL = int(os.environ.get("USUARIO_CACHE_TTL", 60))
+    # Contagem de consultas/tempo de banco por requisição (header Server-Timing)
+    INSTRUMENTACAO_SQL = os.environ.get("INSTRUMENTACAO_SQL", "1") == "1"
+    REQUISICAO_LENTA_MS = int(os.environ.get("REQUISICAO_LENTA_MS", 500))
+    LIMIAR_N_MAIS_1 = int(os.environ.get("LIMIAR_N_MAIS_1", 5))
+    # Diretório compartilhado entre os workers do gunicorn para agregar /metrics
+    # (vazio = métricas só do worker que atende); token opcional para o scrape
+    METRICAS_DIR = os.environ.get("METRICAS_DIR")
+    METRICAS_INTERVALO = float(os.environ.get("METRICAS_INTERVALO", 5))
+    METRICAS_TOKEN = os.environ.get("METRICAS_TOKEN")
+    # Logging assíncrono: fila (QueueHandler) + thread de escrita (QueueListener)
+    # Política de fila cheia: 'descartar' (não bloqueia) ou 'bloquear' (espera LOG_FILA_ESPERA s)
+    LOG_ASSINCRONO = os.environ.get("LOG_ASSINCRONO", "0") == "1"
+    LOG_FILA_TAMANHO = int(os.environ.get("LOG_FILA_TAMANHO", 10000))
+    LOG_POLITICA_FILA = os.environ.get("LOG_POLITICA_FILA", "descartar")
+    LOG_FILA_ESPERA = float(os.environ.get("LOG_FILA_ESPERA", 0.5))
+    # Com vários processos gravando o mesmo app.log (ex.: gunicorn --workers N),
+    # cada um rotaciona sozinho: prefira LOG_COMPRIMIR_ROTACAO=0 e logrotate externo
+    LOG_COMPRIMIR_ROTACAO = os.environ.get("LOG_COMPRIMIR_ROTACAO", "1") == "1"
+    # Retenção: linhas mais antigas que N meses saem do banco para arquivos
+    # comprimidos em ARQUIVO_DIR ('jsonl' = .jsonl.gz; 'parquet' requer pyarrow).
+    # Sem padrão: aponte para um volume persistente, senão o job não arquiva
+    ARQUIVO_DIR = os.environ.get("ARQUIVO_DIR")
+    ARQUIVO_FORMATO = os.environ.get("ARQUIVO_FORMATO", "jsonl")
+    RETENCAO_HISTORICO_MESES = int(os.environ.get("RETENCAO_HISTORICO_MESES", 24))
+    RETENCAO_NOTIFICACAO_MESES = int(os.environ.get("RETENCAO_NOTIFICACAO_MESES", 12))
+    # Tabelas e admin padrão são criados por `python inicializar_banco.py`;
+    # 1 = também no boot (comportamento antigo, útil com SQLite local)
+    INICIALIZAR_BANCO_NO_BOOT = os.environ.get("INICIALIZAR_BANCO_NO_BOOT", "0") == "1"
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -12,3 +46,4 @@ class DevelopmentConfig(Config):
 
 class ProductionConfig(Config):
     DEBUG = False
+    LOG_ASSINCRONO = os.environ.get("LOG_ASSINCRONO", "1") == "1"
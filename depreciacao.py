@@ -0,0 +1,357 @@
+"""
+Motor de Depreciação
+Depreciação linear da frota inteira em arrays NumPy (mesma regra de
+Equipamento.valor_atual), backfill de valor_depreciado e relatório por categoria
+"""
+import time
+from io import BytesIO
+from datetime import date
+from sqlalchemy import update, bindparam
+from models import db, Equipamento, Categoria
+from logging_config_simple import log_performance_metric
+
+TAMANHO_LOTE = 5000
+
+# Mesma base de Equipamento.valor_atual
+DIAS_POR_ANO = 365.25
+
+# date(1970, 1, 1).toordinal(): época do datetime64
+ORDINAL_1970 = 719163
+
+# Máximo de anos na projeção do relatório
+MAX_ANOS_PROJECAO = 20
+
+# Previsão mensal: horizonte padrão/máximo e meses calculados por matriz
+MESES_PREVISAO = 60
+MAX_MESES_PREVISAO = 120
+BLOCO_MESES = 12
+
+AGRUPAMENTOS_PREVISAO = {
+    'categoria': 'Categoria',
+    'centro_custo': 'Centro de Custo',
+    'departamento': 'Departamento',
+}
+
+class DepreciacaoService:
+    """Cálculo vetorizado de depreciação (sem carregar objetos ORM)"""
+    
+    @staticmethod
+    def carregar(apenas_ativos=False, extras=()):
+        """Colunas de depreciação de todos os equipamentos como arrays NumPy
+        
+        Valores ausentes viram NaN (números) ou NaT (datas); categoria ausente vira -1.
+        `extras` são colunas de texto adicionais (arrays de objetos, '' se ausente).
+        """
+        import numpy as np
+        
+        consulta = db.select(
+            Equipamento.id_interno, Equipamento.valor, Equipamento.valor_residual,
+            Equipamento.vida_util_anos, Equipamento.data_aquisicao,
+            Equipamento.categoria_id, Equipamento.valor_depreciado,
+            *[getattr(Equipamento, coluna) for coluna in extras]
+        ).order_by(Equipamento.id_interno)
+        if apenas_ativos:
+            consulta = consulta.where(Equipamento.ativo == True)
+        
+        # SQL compilado direto no driver: sem a camada ORM nem os processadores de
+        # tipo por valor (no SQLite as datas chegam como texto e o NumPy as converte)
+        conexao = db.session.connection()
+        sql = str(consulta.compile(dialect=conexao.dialect, compile_kwargs={'literal_binds': True}))
+        colunas = list(zip(*conexao.exec_driver_sql(sql).all())) or [()] * (7 + len(extras))
+        ids, valor, residual, vida, aquisicao, categoria, depreciado = colunas[:7]
+        dados = {
+            'id': np.array(ids, dtype=np.int64),
+            'valor': np.array(valor, dtype=float),
+            'valor_residual': np.array(residual, dtype=float),
+            'vida_util_anos': np.array(vida, dtype=float),
+            'data_aquisicao': DepreciacaoService._datas(aquisicao),
+            'categoria_id': np.array([c if c is not None else -1 for c in categoria], dtype=np.int64),
+            'valor_depreciado': np.array(depreciado, dtype=float),
+        }
+        for coluna, valores in zip(extras, colunas[7:]):
+            dados[coluna] = np.array([v or '' for v in valores], dtype=object)
+        return dados
+    
+    @staticmethod
+    def _datas(datas):
+        """Sequência de date, texto ISO ou None como datetime64[D]"""
+        import numpy as np
+        
+        if any(isinstance(d, str) for d in datas):
+            return np.array(datas, dtype='datetime64[D]')
+        # Objetos date: via ordinal, bem mais rápido que np.array
+        nat = np.iinfo(np.int64).min
+        ordinais = np.fromiter((d.toordinal() - ORDINAL_1970 if d else nat for d in datas),
+                               dtype=np.int64, count=len(datas))
+        return ordinais.view('datetime64[D]')
+    
+    @staticmethod
+    def valores_contabeis(dados, datas):
+        """Valor contábil de cada equipamento em cada data: matriz (len(datas), n)
+        
+        Regra de Equipamento.valor_atual: sem valor, data de aquisição ou vida
+        útil não há depreciação; após a vida útil vale o residual; antes disso,
+        depreciação linear nunca abaixo do residual.
+        """
+        import numpy as np
+        
+        valor = np.nan_to_num(dados['valor'])
+        residual = np.nan_to_num(dados['valor_residual'])
+        vida = np.nan_to_num(dados['vida_util_anos'])
+        aquisicao = dados['data_aquisicao']
+        referencias = np.array(datas, dtype='datetime64[D]').reshape(-1, 1)
+        
+        depreciavel = (valor != 0) & (vida != 0) & ~np.isnat(aquisicao)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            anos_uso = (referencias - aquisicao).astype(float) / DIAS_POR_ANO
+            depreciacao_anual = (valor - residual) / vida
+            contabil = np.maximum(valor - depreciacao_anual * anos_uso, residual)
+            contabil = np.where(anos_uso >= vida, residual, contabil)
+        return np.where(depreciavel, contabil, valor)
+    
+    @staticmethod
+    def _grupos(dados, agrupar_por):
+        """(chaves, rótulos, índice do grupo de cada equipamento) para um agrupamento"""
+        import numpy as np
+        
+        if agrupar_por == 'categoria':
+            chaves, grupo = np.unique(dados['categoria_id'], return_inverse=True)
+            chaves = chaves.tolist()
+            nomes = dict(db.session.execute(db.select(Categoria.id, Categoria.nome)).all())
+            return chaves, [nomes.get(chave, 'Sem categoria') for chave in chaves], grupo
+        
+        chaves, grupo = np.unique(dados[agrupar_por], return_inverse=True)
+        chaves = chaves.tolist()
+        return chaves, [chave or 'Não informado' for chave in chaves], grupo
+    
+    @staticmethod
+    def datas_projecao(data_referencia, anos):
+        """data_referencia e os mesmos dia/mês nos `anos` anos seguintes"""
+        datas = [data_referencia]
+        for ano in range(1, anos + 1):
+            try:
+                datas.append(data_referencia.replace(year=data_referencia.year + ano))
+            except ValueError:
+                # 29/02 em ano não bissexto
+                datas.append(data_referencia.replace(year=data_referencia.year + ano, day=28))
+        return datas
+    
+    @staticmethod
+    def atualizar_valor_depreciado(data_referencia=None, tamanho_lote=TAMANHO_LOTE):
+        """Grava o valor contábil em valor_depreciado (só nas linhas que mudaram)
+        
+        UPDATE em lotes via executemany, sem tocar em updated_at. Retorna
+        {'equipamentos', 'atualizados', 'segundos'}.
+        """
+        import numpy as np
+        
+        inicio = time.perf_counter()
+        data_referencia = data_referencia or date.today()
+        dados = DepreciacaoService.carregar()
+        novos = np.round(DepreciacaoService.valores_contabeis(dados, [data_referencia])[0], 2)
+        # NaN (nunca calculado) sempre difere
+        alterados = np.flatnonzero(~np.isclose(novos, dados['valor_depreciado'], rtol=0, atol=0.005))
+        
+        tabela = Equipamento.__table__
+        atualizar = update(tabela).where(tabela.c.id_interno == bindparam('b_id')).values(
+            valor_depreciado=bindparam('b_valor'),
+            # Impede o onupdate: depreciação não é uma edição do equipamento
+            updated_at=tabela.c.updated_at
+        )
+        for i in range(0, len(alterados), tamanho_lote):
+            indices = alterados[i:i + tamanho_lote]
+            db.session.execute(atualizar, [
+                {'b_id': int(id_interno), 'b_valor': float(valor)}
+                for id_interno, valor in zip(dados['id'][indices], novos[indices])
+            ])
+        db.session.commit()
+        
+        resultado = {
+            'equipamentos': len(dados['id']),
+            'atualizados': len(alterados),
+            'segundos': round(time.perf_counter() - inicio, 3)
+        }
+        log_performance_metric('depreciacao_segundos', resultado['segundos'], resultado)
+        return resultado
+    
+    @staticmethod
+    def relatorio_por_categoria(data_referencia=None, anos=0):
+        """Depreciação dos equipamentos ativos agrupada por categoria
+        
+        Para cada categoria: quantidade, valor de aquisição, valor contábil e
+        depreciação acumulada na data de referência, e o valor contábil
+        projetado para cada um dos `anos` seguintes.
+        """
+        import numpy as np
+        
+        if not 0 <= anos <= MAX_ANOS_PROJECAO:
+            raise ValueError(f"Anos de projeção deve estar entre 0 e {MAX_ANOS_PROJECAO}")
+        
+        data_referencia = data_referencia or date.today()
+        datas = DepreciacaoService.datas_projecao(data_referencia, anos)
+        dados = DepreciacaoService.carregar(apenas_ativos=True)
+        contabeis = DepreciacaoService.valores_contabeis(dados, datas)
+        
+        # Soma por categoria com bincount sobre o índice de cada categoria
+        categorias, nomes, grupo = DepreciacaoService._grupos(dados, 'categoria')
+        quantidade = np.bincount(grupo, minlength=len(categorias))
+        aquisicao = np.bincount(grupo, weights=np.nan_to_num(dados['valor']), minlength=len(categorias))
+        por_data = np.stack([
+            np.bincount(grupo, weights=linha, minlength=len(categorias)) for linha in contabeis
+        ]) if len(grupo) else np.zeros((len(datas), 0))
+        
+        itens = []
+        for i, categoria_id in enumerate(categorias):
+            itens.append({
+                'categoria_id': categoria_id if categoria_id >= 0 else None,
+                'categoria': nomes[i],
+                'quantidade': int(quantidade[i]),
+                'valor_aquisicao': round(float(aquisicao[i]), 2),
+                'valor_contabil': round(float(por_data[0, i]), 2),
+                'depreciacao_acumulada': round(float(aquisicao[i] - por_data[0, i]), 2),
+                'projecao': [
+                    {'data': datas[k].isoformat(), 'valor_contabil': round(float(por_data[k, i]), 2)}
+                    for k in range(1, len(datas))
+                ]
+            })
+        itens.sort(key=lambda item: item['valor_aquisicao'], reverse=True)
+        
+        return {
+            'data_referencia': data_referencia.isoformat(),
+            'categorias': itens,
+            'totais': {
+                'quantidade': int(quantidade.sum()),
+                'valor_aquisicao': round(float(aquisicao.sum()), 2),
+                'valor_contabil': round(float(por_data[0].sum()), 2),
+                'depreciacao_acumulada': round(float(aquisicao.sum() - por_data[0].sum()), 2)
+            }
+        }
+    
+    @staticmethod
+    def previsao(data_referencia=None, meses=MESES_PREVISAO, agrupar_por='categoria'):
+        """Previsão mensal de valor contábil e de fim de vida útil, por grupo
+        
+        Para cada fechamento (último dia de cada mês, a partir do mês da data de
+        referência): valor contábil do grupo, quantos equipamentos atingem o
+        fim da vida útil no mês e o custo de reposição deles (valor de
+        aquisição). `vencidos` são os que já passaram da vida útil.
+        """
+        import numpy as np
+        
+        if agrupar_por not in AGRUPAMENTOS_PREVISAO:
+            raise ValueError(f"Agrupamento inválido (use {', '.join(AGRUPAMENTOS_PREVISAO)})")
+        if not 1 <= meses <= MAX_MESES_PREVISAO:
+            raise ValueError(f"Horizonte deve estar entre 1 e {MAX_MESES_PREVISAO} meses")
+        
+        data_referencia = data_referencia or date.today()
+        extras = () if agrupar_por == 'categoria' else (agrupar_por,)
+        dados = DepreciacaoService.carregar(apenas_ativos=True, extras=extras)
+        _, nomes, grupo = DepreciacaoService._grupos(dados, agrupar_por)
+        total_grupos = len(nomes)
+        
+        mes_inicial = np.datetime64(data_referencia, 'M')
+        fechamentos = np.arange(mes_inicial + 1, mes_inicial + meses + 1).astype('datetime64[D]') - 1
+        
+        # Matriz (meses x equipamentos) em blocos, para limitar a memória
+        valor_contabil = np.zeros((total_grupos, meses))
+        for inicio in range(0, meses, BLOCO_MESES):
+            matriz = DepreciacaoService.valores_contabeis(dados, fechamentos[inicio:inicio + BLOCO_MESES])
+            for k, linha in enumerate(matriz):
+                valor_contabil[:, inicio + k] = np.bincount(grupo, weights=linha, minlength=total_grupos)
+        
+        # Fim da vida útil: primeiro dia em que valor_atual passa a ser o residual
+        valor = np.nan_to_num(dados['valor'])
+        vida = np.nan_to_num(dados['vida_util_anos'])
+        depreciavel = (valor != 0) & (vida != 0) & ~np.isnat(dados['data_aquisicao'])
+        fim_vida = dados['data_aquisicao'] + np.ceil(vida * DIAS_POR_ANO).astype('timedelta64[D]')
+        vencido = depreciavel & (fim_vida <= np.datetime64(data_referencia, 'D'))
+        mes_fim = (fim_vida.astype('datetime64[M]') - mes_inicial).astype(np.int64)
+        no_horizonte = depreciavel & ~vencido & (mes_fim < meses)
+        
+        posicao = grupo[no_horizonte] * meses + mes_fim[no_horizonte]
+        fins = np.bincount(posicao, minlength=total_grupos * meses).reshape(total_grupos, meses)
+        custos = np.bincount(posicao, weights=valor[no_horizonte], minlength=total_grupos * meses).reshape(total_grupos, meses)
+        
+        por_grupo = {
+            'quantidade': np.bincount(grupo, minlength=total_grupos),
+            'valor_aquisicao': np.bincount(grupo, weights=valor, minlength=total_grupos),
+            'vencidos': np.bincount(grupo[vencido], minlength=total_grupos),
+            'custo_vencidos': np.bincount(grupo[vencido], weights=valor[vencido], minlength=total_grupos),
+        }
+        anos = fechamentos.astype('datetime64[Y]').astype(np.int64) + 1970
+        
+        grupos = [
+            DepreciacaoService._serie_previsao(
+                nome, {campo: valores[i] for campo, valores in por_grupo.items()},
+                valor_contabil[i], fins[i], custos[i], anos
+            )
+            for i, nome in enumerate(nomes)
+        ]
+        grupos.sort(key=lambda item: item['valor_aquisicao'], reverse=True)
+        
+        return {
+            'data_referencia': data_referencia.isoformat(),
+            'agrupar_por': agrupar_por,
+            'meses': meses,
+            'fechamentos': [str(fechamento) for fechamento in fechamentos],
+            'grupos': grupos,
+            'totais': DepreciacaoService._serie_previsao(
+                'Total', {campo: valores.sum() for campo, valores in por_grupo.items()},
+                valor_contabil.sum(axis=0), fins.sum(axis=0), custos.sum(axis=0), anos
+            )
+        }
+    
+    @staticmethod
+    def _serie_previsao(nome, totais, valor_contabil, fins, custos, anos):
+        """Item da previsão: séries mensais e o resumo de cada ano do horizonte"""
+        import numpy as np
+        
+        anual = []
+        for ano in np.unique(anos).tolist():
+            meses_ano = np.flatnonzero(anos == ano)
+            anual.append({
+                'ano': ano,
+                # Valor no último fechamento do ano dentro do horizonte
+                'valor_contabil': round(float(valor_contabil[meses_ano[-1]]), 2),
+                'fim_vida': int(fins[meses_ano].sum()),
+                'custo_reposicao': round(float(custos[meses_ano].sum()), 2)
+            })
+        
+        return {
+            'grupo': nome,
+            'quantidade': int(totais['quantidade']),
+            'valor_aquisicao': round(float(totais['valor_aquisicao']), 2),
+            'vencidos': int(totais['vencidos']),
+            'custo_reposicao_vencidos': round(float(totais['custo_vencidos']), 2),
+            'valor_contabil': np.round(valor_contabil, 2).tolist(),
+            'fim_vida': fins.astype(int).tolist(),
+            'custo_reposicao': np.round(custos, 2).tolist(),
+            'anual': anual
+        }
+    
+    @staticmethod
+    def previsao_xlsx(previsao):
+        """Planilha da previsão: uma aba por série (grupos x fechamentos) e o resumo anual"""
+        from openpyxl import Workbook
+        
+        livro = Workbook(write_only=True)
+        rotulo = AGRUPAMENTOS_PREVISAO[previsao['agrupar_por']]
+        itens = previsao['grupos'] + [previsao['totais']]
+        
+        for titulo, campo in (('Valor contábil', 'valor_contabil'),
+                              ('Fim de vida', 'fim_vida'),
+                              ('Custo de reposição', 'custo_reposicao')):
+            aba = livro.create_sheet(titulo)
+            aba.append([rotulo, 'Quantidade', 'Vencidos'] + previsao['fechamentos'])
+            for item in itens:
+                aba.append([item['grupo'], item['quantidade'], item['vencidos']] + item[campo])
+        
+        aba = livro.create_sheet('Resumo anual')
+        aba.append([rotulo, 'Ano', 'Valor contábil', 'Fim de vida', 'Custo de reposição'])
+        for item in itens:
+            for ano in item['anual']:
+                aba.append([item['grupo'], ano['ano'], ano['valor_contabil'], ano['fim_vida'], ano['custo_reposicao']])
+        
+        saida = BytesIO()
+        livro.save(saida)
+        return saida.getvalue()
@@ -0,0 +1,234 @@
+"""
+Etiquetas Patrimoniais
+Folhas A4 de etiquetas com QR Code e código de barras Code128 (reportlab)
+"""
+import itertools
+import qrcode
+from io import BytesIO
+from functools import lru_cache
+from reportlab.pdfgen import canvas
+from reportlab.pdfgen.pathobject import PDFPathObject
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.graphics.shapes import Drawing, Group, Rect, String, mmult, nullTransform, transformPoint
+from reportlab.graphics.barcode import getCodes
+from models import db, Equipamento
+from services import ConsultaService, IdPublicoService
+from metricas import RENDERIZACAO_PDF
+
+# Grades de etiquetas A4 (medidas das folhas adesivas mais comuns)
+LAYOUTS = {
+    # 24 etiquetas 70 x 37 mm, sem margens laterais
+    '3x8': {'colunas': 3, 'linhas': 8, 'largura': 70 * mm, 'altura': 37 * mm,
+            'margem_esquerda': 0, 'margem_superior': 0.5 * mm, 'espaco_x': 0, 'espaco_y': 0},
+    # 14 etiquetas 99,1 x 38,1 mm (padrão L7163)
+    '2x7': {'colunas': 2, 'linhas': 7, 'largura': 99.1 * mm, 'altura': 38.1 * mm,
+            'margem_esquerda': 4.65 * mm, 'margem_superior': 15.15 * mm, 'espaco_x': 2.5 * mm, 'espaco_y': 0},
+}
+LAYOUT_PADRAO = '3x8'
+
+# Códigos mantidos em memória (um QR e um código de barras por id_publico)
+TAMANHO_CACHE = 4096
+
+MAXIMO_ITENS = 10000
+
+PADDING = 2 * mm
+
+# Zona de silêncio do QR, em módulos
+BORDA_QR = 2
+MASCARA_QR = 0
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def modulos_qr(id_publico):
+    """QR Code do id_publico codificado uma única vez
+    
+    Retorna (módulos por lado, trechos escuros (linha, coluna, comprimento)),
+    que bastam para redesenhar o código em qualquer tamanho sem recodificar.
+    A máscara é fixa: qualquer uma é válida pela norma (o leitor a obtém dos
+    bits de formato) e pular a avaliação das 8 deixa a codificação ~7x mais rápida.
+    """
+    codigo = qrcode.QRCode(border=0, error_correction=qrcode.constants.ERROR_CORRECT_M, mask_pattern=MASCARA_QR)
+    codigo.add_data(id_publico)
+    codigo.make(fit=True)
+    matriz = codigo.get_matrix()
+    trechos = []
+    for linha, modulos in enumerate(matriz):
+        coluna = 0
+        for escuro, grupo in itertools.groupby(modulos):
+            comprimento = len(list(grupo))
+            if escuro:
+                trechos.append((linha, coluna, comprimento))
+            coluna += comprimento
+    return len(matriz), tuple(trechos)
+
+def _retangulos_qr(id_publico, lado):
+    """Retângulos (x, y, largura, altura) do QR em um quadrado de `lado` com origem embaixo à esquerda"""
+    total, trechos = modulos_qr(id_publico)
+    modulo = lado / (total + 2 * BORDA_QR)
+    for linha, coluna, comprimento in trechos:
+        yield ((coluna + BORDA_QR) * modulo, lado - (linha + BORDA_QR + 1) * modulo, comprimento * modulo, modulo)
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def caminho_qr(id_publico):
+    """Path PDF do QR em unidades de módulo (lado total + bordas), pronto para ser escalado"""
+    total, _ = modulos_qr(id_publico)
+    caminho = PDFPathObject()
+    for rx, ry, largura, altura in _retangulos_qr(id_publico, total + 2 * BORDA_QR):
+        caminho.rect(rx, ry, largura, altura)
+    return total + 2 * BORDA_QR, caminho
+
+def desenhar_qr(pdf, id_publico, x, y, lado):
+    """Desenha o QR direto no canvas, como um único path preenchido"""
+    unidades, caminho = caminho_qr(id_publico)
+    pdf.saveState()
+    pdf.translate(x, y)
+    pdf.scale(lado / unidades, lado / unidades)
+    pdf.drawPath(caminho, stroke=0, fill=1)
+    pdf.restoreState()
+
+def desenho_qr(id_publico, tamanho=22 * mm):
+    """QR Code como Drawing (flowable para documentos platypus, ex.: o termo)"""
+    desenho = Drawing(tamanho, tamanho)
+    for rx, ry, largura, altura in _retangulos_qr(id_publico, tamanho):
+        desenho.add(Rect(rx, ry, largura, altura, fillColor=colors.black, strokeColor=None))
+    return desenho
+
+def _formas(grupo, transformacao=nullTransform()):
+    """(forma, transformação acumulada) das formas de um grupo, descendo nos subgrupos"""
+    for forma in grupo.getContents():
+        if isinstance(forma, Group):
+            yield from _formas(forma, mmult(transformacao, forma.transform))
+        else:
+            yield forma, transformacao
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def codigo_barras(id_publico):
+    """Código de barras Code128 do id_publico (com texto legível), codificado uma única vez
+    
+    Retorna (largura, path das barras, (x, y, texto, fonte, tamanho)), lidos
+    das formas (Rect/String) que o widget Code128 do reportlab desenha. Só
+    dados imutáveis ficam em cache: o Flowable Code128 guarda o canvas em si
+    durante o drawOn e não pode ser compartilhado entre threads. Levanta
+    ValueError para IDs fora do ASCII.
+    """
+    # Widget direto, e não createBarcodeDrawing: este desenha o código duas vezes (~3x mais lento)
+    widget = getCodes()['Code128'](value=id_publico, barHeight=8 * mm, barWidth=0.8, humanReadable=True, fontSize=7)
+    widget.validate()
+    if not widget.valid:
+        raise ValueError(f"ID {id_publico} não pode ser impresso em Code128 (use só caracteres ASCII)")
+    barras = PDFPathObject()
+    texto = None
+    for forma, transformacao in _formas(widget.draw()):
+        if isinstance(forma, Rect) and forma.fillColor is not None:  # sem fillColor: fundo
+            x0, y0 = transformPoint(transformacao, (forma.x, forma.y))
+            x1, y1 = transformPoint(transformacao, (forma.x + forma.width, forma.y + forma.height))
+            barras.rect(x0, y0, x1 - x0, y1 - y0)
+        elif isinstance(forma, String):
+            x, y = transformPoint(transformacao, (forma.x, forma.y))
+            texto = (x, y, forma.text, forma.fontName, forma.fontSize)
+    return widget.width, barras, texto
+
+def desenhar_barras(pdf, id_publico, x, y, largura_maxima):
+    """Desenha o código de barras direto no canvas, reduzido se passar de largura_maxima"""
+    largura, caminho, (texto_x, texto_y, texto, fonte, tamanho) = codigo_barras(id_publico)
+    escala = min(1.0, largura_maxima / largura)
+    pdf.saveState()
+    pdf.translate(x, y)
+    pdf.scale(escala, escala)
+    pdf.drawPath(caminho, stroke=0, fill=1)
+    pdf.setFont(fonte, tamanho)
+    pdf.drawCentredString(texto_x, texto_y, texto)
+    pdf.restoreState()
+
+def _truncar(texto, limite):
+    texto = texto or ''
+    return texto if len(texto) <= limite else texto[:limite - 1] + '…'
+
+class EtiquetaService:
+    """Seleção de equipamentos e montagem das folhas de etiquetas"""
+    
+    @staticmethod
+    def selecionar(ids_publicos=None, filtros=None):
+        """Linhas (id_publico, tipo, marca, localizacao) para as etiquetas, em ordem de id_publico
+        
+        Consulta só as colunas impressas; levanta ValueError para seleção vazia,
+        acima de MAXIMO_ITENS ou com IDs informados inexistentes ou inativos.
+        """
+        query = db.session.query(
+            Equipamento.id_publico, Equipamento.tipo, Equipamento.marca, Equipamento.localizacao
+        ).filter(Equipamento.ativo == True)
+        
+        if ids_publicos:
+            ids_publicos = list(dict.fromkeys(ids_publicos))
+            query = query.filter(Equipamento.id_publico.in_(ids_publicos))
+        elif filtros:
+            query = ConsultaService.aplicar_filtros(query, filtros)
+        else:
+            raise ValueError("Informe IDs ou ao menos um filtro")
+        
+        linhas = query.order_by(*IdPublicoService.ORDEM).limit(MAXIMO_ITENS + 1).all()
+        if len(linhas) > MAXIMO_ITENS:
+            raise ValueError(f"Máximo de {MAXIMO_ITENS} etiquetas por folha de impressão")
+        if ids_publicos:
+            # Como nos termos em lote: a folha não sai com menos etiquetas que o pedido
+            encontrados = {linha.id_publico for linha in linhas}
+            faltando = [i for i in ids_publicos if i not in encontrados]
+            if faltando:
+                raise ValueError(f"Equipamentos não encontrados ou inativos: {', '.join(faltando[:20])}")
+        if not linhas:
+            raise ValueError("Nenhum equipamento encontrado")
+        return linhas
+    
+    @staticmethod
+    def _desenhar(pdf, x, y, layout, linha):
+        """Desenha uma etiqueta com canto inferior esquerdo em (x, y)"""
+        largura, altura = layout['largura'], layout['altura']
+        
+        # QR à esquerda, ocupando a altura útil
+        lado_qr = altura - 2 * PADDING
+        desenhar_qr(pdf, linha.id_publico, x + PADDING, y + PADDING, lado_qr)
+        
+        # Textos à direita do QR
+        texto_x = x + lado_qr + 2 * PADDING
+        largura_texto = largura - lado_qr - 3 * PADDING
+        caracteres = int(largura_texto / (1.9 * mm))
+        pdf.setFont('Helvetica-Bold', 10)
+        pdf.drawString(texto_x, y + altura - PADDING - 10, linha.id_publico)
+        pdf.setFont('Helvetica', 7)
+        pdf.drawString(texto_x, y + altura - PADDING - 19, _truncar(' '.join(filter(None, (linha.tipo, linha.marca))), caracteres))
+        pdf.drawString(texto_x, y + altura - PADDING - 27, _truncar(linha.localizacao, caracteres))
+        
+        # Código de barras no rodapé, reduzido se não couber na largura
+        desenhar_barras(pdf, linha.id_publico, texto_x, y + PADDING, largura_texto)
+    
+    @staticmethod
+    def gerar_pdf(linhas, layout=LAYOUT_PADRAO, pdf_buffer=None):
+        """Desenha todas as etiquetas em uma passada sobre um único canvas
+        
+        `linhas` precisa ter id_publico, tipo, marca e localizacao. Retorna os
+        bytes do PDF (ou escreve em `pdf_buffer`, se informado).
+        """
+        if layout not in LAYOUTS:
+            raise ValueError(f"Layout inválido (use {', '.join(LAYOUTS)})")
+        grade = LAYOUTS[layout]
+        por_folha = grade['colunas'] * grade['linhas']
+        
+        destino = pdf_buffer or BytesIO()
+        pdf = canvas.Canvas(destino, pagesize=A4)
+        pdf.setTitle('Etiquetas patrimoniais')
+        _, altura_pagina = A4
+        
+        with RENDERIZACAO_PDF.cronometrar(documento='etiquetas'):
+            for indice, linha in enumerate(linhas):
+                posicao = indice % por_folha
+                if indice and posicao == 0:
+                    pdf.showPage()
+                coluna, fileira = posicao % grade['colunas'], posicao // grade['colunas']
+                x = grade['margem_esquerda'] + coluna * (grade['largura'] + grade['espaco_x'])
+                y = altura_pagina - grade['margem_superior'] - (fileira + 1) * grade['altura'] - fileira * grade['espaco_y']
+                EtiquetaService._desenhar(pdf, x, y, grade, linha)
+            
+            pdf.save()
+        if pdf_buffer is None:
+            return destino.getvalue()
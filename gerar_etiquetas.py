@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Script para gerar folhas de etiquetas patrimoniais (QR Code + Code128)
+
+Uso:
+    python gerar_etiquetas.py PAT-001 PAT-002 ... [--layout 3x8] [--saida etiquetas.pdf]
+    python gerar_etiquetas.py --localizacao "Almoxarifado" --layout 2x7
+"""
+import sys
+import time
+import argparse
+from datetime import datetime
+
+from app import app
+from services import ConsultaService
+from etiquetas import EtiquetaService, LAYOUTS, LAYOUT_PADRAO
+
+def main():
+    parser = argparse.ArgumentParser(description='Geração de etiquetas patrimoniais para inventário')
+    parser.add_argument('ids', nargs='*', help='IDs públicos dos equipamentos')
+    parser.add_argument('--layout', choices=sorted(LAYOUTS), default=LAYOUT_PADRAO, help=f'Grade da folha A4 (padrão: {LAYOUT_PADRAO})')
+    parser.add_argument('--saida', help='Arquivo PDF de saída (padrão: etiquetas_<data>.pdf)')
+    for campo in ConsultaService.FILTROS_TEXTO + ConsultaService.FILTROS_DATA:
+        parser.add_argument(f'--{campo}', help=f'Filtro de consulta: {campo}')
+    args = parser.parse_args()
+    
+    saida = args.saida or f'etiquetas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+    
+    with app.app_context():
+        try:
+            filtros = ConsultaService.extrair_filtros(vars(args))
+            linhas = EtiquetaService.selecionar(args.ids, filtros)
+            inicio = time.perf_counter()
+            with open(saida, 'wb') as arquivo:
+                EtiquetaService.gerar_pdf(linhas, args.layout, arquivo)
+        except (OSError, ValueError) as e:
+            print(f"❌ {e}")
+            return 1
+        
+        por_folha = LAYOUTS[args.layout]['colunas'] * LAYOUTS[args.layout]['linhas']
+        folhas = -(-len(linhas) // por_folha)
+        print(f"🏷️  {len(linhas)} etiquetas em {folhas} folhas ({time.perf_counter() - inicio:.2f}s)")
+        print(f"✅ Etiquetas gravadas em {saida}")
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Job agendado: snapshots de estado dos equipamentos
+
+Grava um snapshot a cada N eventos do histórico, para que a reconstrução
+do estado em um instante (/api/equipamento/<id>/estado) reverta no máximo
+N eventos, por mais longo que seja o histórico.
+
+Uso (ex.: cron noturno):
+    python gerar_snapshots.py [--intervalo 50] [--lote 500]
+"""
+import sys
+import argparse
+
+from app import app
+from reconstrucao import ReconstrucaoService, INTERVALO_SNAPSHOT, TAMANHO_LOTE
+
+def main():
+    parser = argparse.ArgumentParser(description='Grava snapshots de estado dos equipamentos')
+    parser.add_argument('--intervalo', type=int, default=INTERVALO_SNAPSHOT, help=f'Eventos entre snapshots (padrão: {INTERVALO_SNAPSHOT})')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help=f'Equipamentos por lote (padrão: {TAMANHO_LOTE})')
+    args = parser.parse_args()
+    
+    if args.intervalo < 1:
+        print("❌ Intervalo deve ser maior que zero")
+        return 1
+    
+    with app.app_context():
+        try:
+            resultado = ReconstrucaoService.gerar_snapshots(args.intervalo, tamanho_lote=args.lote)
+        except Exception as e:
+            print(f"❌ Erro ao gerar snapshots: {e}")
+            return 1
+        
+        print(f"📦 Equipamentos com eventos pendentes: {resultado['equipamentos']}")
+        print(f"📸 Snapshots gravados: {resultado['snapshots']}")
+        print(f"⏱️  Tempo: {resultado['segundos']:.3f}s")
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
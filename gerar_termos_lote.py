@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Script para gerar termos de cautela em lote (ZIP ou PDF único)
+
+Uso:
+    python gerar_termos_lote.py PAT-001 PAT-002 ... [--formato zip|pdf] [--saida arquivo]
+    python gerar_termos_lote.py --localizacao "Sala 3" --status "Em uso" [--processos 4]
+"""
+import sys
+import argparse
+from datetime import datetime
+
+from app import app, Usuario
+from services import ConsultaService, TermoLoteService
+
+def main():
+    parser = argparse.ArgumentParser(description='Geração de termos de cautela em lote')
+    parser.add_argument('ids', nargs='*', help='IDs públicos dos equipamentos')
+    parser.add_argument('--formato', choices=TermoLoteService.FORMATOS, default='zip', help='zip (um PDF por equipamento) ou pdf (arquivo único)')
+    parser.add_argument('--saida', help='Arquivo de saída (padrão: termos_cautela_<data>.<formato>)')
+    parser.add_argument('--processos', type=int, help='Processos de renderização (padrão: núcleos da máquina)')
+    parser.add_argument('--usuario', default='admin', help='Usuário registrado como emitente (padrão: admin)')
+    for campo in ConsultaService.FILTROS_TEXTO + ConsultaService.FILTROS_DATA:
+        parser.add_argument(f'--{campo}', help=f'Filtro de consulta: {campo}')
+    args = parser.parse_args()
+    
+    saida = args.saida or f'termos_cautela_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{args.formato}'
+    
+    with app.app_context():
+        usuario = Usuario.query.filter_by(username=args.usuario).first()
+        if not usuario:
+            print(f"❌ Usuário não encontrado: {args.usuario}")
+            return 1
+        
+        try:
+            filtros = ConsultaService.extrair_filtros(vars(args))
+            equipamentos = TermoLoteService.selecionar(args.ids, filtros)
+            chunks = TermoLoteService.gerar(
+                equipamentos,
+                args.formato,
+                usuario_emitente=usuario.nome_completo,
+                usuario_id=usuario.id,
+                descricao=f'Termo de cautela gerado em lote por {usuario.username} (linha de comando)',
+                processos=args.processos
+            )
+            print(f"📄 Gerando {len(equipamentos)} termos...")
+            with open(saida, 'wb') as arquivo:
+                for chunk in chunks:
+                    arquivo.write(chunk)
+        except (OSError, ValueError) as e:
+            print(f"❌ {e}")
+            return 1
+        
+        print(f"✅ Termos gravados em {saida}")
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
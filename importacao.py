@@ -0,0 +1,262 @@
+"""
+Importação em Lote de Equipamentos
+Leitura de CSV/XLSX, validação vetorizada (pandas) e inserção em lotes
+"""
+from datetime import datetime
+from sqlalchemy import insert
+from models import db, Equipamento, Categoria, Fornecedor
+from services import IdPublicoService, HistoricoService
+
+# Cabeçalhos aceitos -> campo do modelo (nomes dos campos e cabeçalhos do CSV exportado)
+CABECALHOS = {
+    'tipo': 'tipo', 'Tipo': 'tipo',
+    'marca': 'marca', 'Marca': 'marca',
+    'modelo': 'modelo', 'Modelo': 'modelo',
+    'num_serie': 'num_serie', 'Número Série': 'num_serie',
+    'data_aquisicao': 'data_aquisicao', 'Data Aquisição': 'data_aquisicao',
+    'localizacao': 'localizacao', 'Localização': 'localizacao',
+    'status': 'status', 'Status': 'status',
+    'responsavel': 'responsavel', 'Responsável': 'responsavel',
+    'valor': 'valor', 'Valor': 'valor',
+    'SPE': 'SPE',
+    'centro_custo': 'centro_custo', 'Centro de Custo': 'centro_custo',
+    'departamento': 'departamento', 'Departamento': 'departamento',
+    'garantia_ate': 'garantia_ate', 'Garantia até': 'garantia_ate',
+    'ultima_manutencao': 'ultima_manutencao', 'Última Manutenção': 'ultima_manutencao',
+    'codigo_barras': 'codigo_barras', 'Código de Barras': 'codigo_barras',
+    'nota_fiscal': 'nota_fiscal', 'Nota Fiscal': 'nota_fiscal',
+    'vida_util_anos': 'vida_util_anos', 'Vida Útil (anos)': 'vida_util_anos',
+    'condicao': 'condicao', 'Condição': 'condicao',
+    'observacoes': 'observacoes', 'Observações': 'observacoes',
+    'categoria': 'categoria', 'Categoria': 'categoria',
+    'fornecedor': 'fornecedor', 'Fornecedor': 'fornecedor',
+}
+
+CAMPOS_TEXTO = [
+    'tipo', 'marca', 'modelo', 'num_serie', 'localizacao', 'status', 'responsavel', 'SPE',
+    'centro_custo', 'departamento', 'codigo_barras', 'nota_fiscal', 'condicao', 'observacoes'
+]
+CAMPOS_DATA = ['data_aquisicao', 'garantia_ate', 'ultima_manutencao']
+CAMPOS_UNICOS = ['num_serie', 'codigo_barras']
+
+STATUS_VALIDOS = ('Estocado', 'Em uso', 'Manutenção')
+EXTENSOES_IMPORTACAO = {'csv', 'xlsx'}
+
+TAMANHO_LOTE = 1000
+
+class ImportacaoService:
+    """Pipeline de importação em lote"""
+    
+    @staticmethod
+    def ler_arquivo(arquivo, nome_arquivo):
+        """Lê CSV ou XLSX como DataFrame de texto, com cabeçalhos normalizados"""
+        import pandas as pd
+        
+        extensao = nome_arquivo.rsplit('.', 1)[-1].lower() if '.' in nome_arquivo else ''
+        if extensao == 'xlsx':
+            df = pd.read_excel(arquivo, dtype=str, engine='openpyxl')
+        elif extensao == 'csv':
+            # sep=None detecta ',' ou ';' (planilhas em português costumam usar ';')
+            df = pd.read_csv(arquivo, dtype=str, sep=None, engine='python', encoding='utf-8-sig')
+        else:
+            raise ValueError(f"Formato não suportado: use {', '.join(sorted(EXTENSOES_IMPORTACAO))}")
+        
+        df = df.rename(columns=lambda c: CABECALHOS.get(str(c).strip(), str(c).strip()))
+        if 'tipo' not in df.columns:
+            raise ValueError("Coluna obrigatória ausente: tipo")
+        
+        return df.fillna('').apply(lambda coluna: coluna.str.strip())
+    
+    @staticmethod
+    def _converter_datas(serie):
+        """Converte datas AAAA-MM-DD ou DD/MM/AAAA; inválidas viram NaT"""
+        import pandas as pd
+        
+        iso = pd.to_datetime(serie, format='%Y-%m-%d', errors='coerce')
+        br = pd.to_datetime(serie, format='%d/%m/%Y', errors='coerce')
+        return iso.fillna(br)
+    
+    @staticmethod
+    def _converter_valores(serie):
+        """Converte valores monetários aceitando '1.234,56' e '1234.56'"""
+        import pandas as pd
+        
+        formato_br = serie.str.contains(',', regex=False)
+        normalizado = serie.where(
+            ~formato_br,
+            serie.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        ).str.replace('R$', '', regex=False).str.strip()
+        return pd.to_numeric(normalizado, errors='coerce')
+    
+    @staticmethod
+    def _existentes_no_banco(campo, valores):
+        """Valores de um campo único que já existem no banco (consultas IN em lotes)"""
+        coluna = getattr(Equipamento, campo)
+        valores = list(valores)
+        existentes = set()
+        for inicio in range(0, len(valores), 500):
+            lote = valores[inicio:inicio + 500]
+            existentes.update(v for (v,) in db.session.query(coluna).filter(coluna.in_(lote)))
+        return existentes
+    
+    @staticmethod
+    def validar(df):
+        """Valida todas as linhas de uma vez
+        
+        Retorna (DataFrame das linhas válidas já convertidas, {linha: [erros]}).
+        O número da linha é o da planilha (cabeçalho = linha 1).
+        """
+        import pandas as pd
+        
+        df = df.copy()
+        for campo in CAMPOS_TEXTO + CAMPOS_DATA + ['valor', 'vida_util_anos', 'categoria', 'fornecedor']:
+            if campo not in df.columns:
+                df[campo] = ''
+        
+        df.index = range(2, len(df) + 2)
+        erros = pd.Series([[] for _ in range(len(df))], index=df.index, dtype=object)
+        
+        def marcar(mascara, mensagem):
+            for linha in df.index[mascara]:
+                erros[linha].append(mensagem)
+        
+        # Obrigatórios e domínios
+        marcar(df['tipo'] == '', "Tipo é obrigatório")
+        df['status'] = df['status'].where(df['status'] != '', 'Estocado')
+        marcar(~df['status'].isin(STATUS_VALIDOS), f"Status inválido (use {', '.join(STATUS_VALIDOS)})")
+        
+        # Datas
+        for campo in CAMPOS_DATA:
+            convertidas = ImportacaoService._converter_datas(df[campo])
+            marcar((df[campo] != '') & convertidas.isna(), f"Data inválida em {campo} (use AAAA-MM-DD ou DD/MM/AAAA)")
+            df[campo] = convertidas
+        
+        # Números
+        valores = ImportacaoService._converter_valores(df['valor'])
+        marcar((df['valor'] != '') & valores.isna(), "Valor inválido")
+        marcar(valores < 0, "Valor não pode ser negativo")
+        df['valor'] = valores.fillna(0.0)
+        
+        vida_util = pd.to_numeric(df['vida_util_anos'].where(df['vida_util_anos'] != '', '5'), errors='coerce')
+        marcar(vida_util.isna() | (vida_util <= 0) | (vida_util % 1 != 0), "Vida útil deve ser um número inteiro de anos")
+        df['vida_util_anos'] = vida_util.fillna(5)
+        
+        # Duplicidades no arquivo e no banco
+        for campo in CAMPOS_UNICOS:
+            preenchidos = df[campo] != ''
+            marcar(preenchidos & df[campo].duplicated(keep=False), f"{campo} repetido no arquivo")
+            existentes = ImportacaoService._existentes_no_banco(campo, df.loc[preenchidos, campo].unique())
+            marcar(preenchidos & df[campo].isin(existentes), f"{campo} já cadastrado")
+        
+        # Categoria e fornecedor por nome (tabelas pequenas: uma consulta cada)
+        categorias = {nome.lower(): id for id, nome in db.session.query(Categoria.id, Categoria.nome)}
+        fornecedores = {nome.lower(): id for id, nome in db.session.query(Fornecedor.id, Fornecedor.nome)}
+        df['categoria_id'] = df['categoria'].str.lower().map(categorias)
+        df['fornecedor_id'] = df['fornecedor'].str.lower().map(fornecedores)
+        marcar((df['categoria'] != '') & df['categoria_id'].isna(), "Categoria não encontrada")
+        marcar((df['fornecedor'] != '') & df['fornecedor_id'].isna(), "Fornecedor não encontrado")
+        
+        erros_por_linha = {int(linha): mensagens for linha, mensagens in erros.items() if mensagens}
+        validas = df[erros.map(len) == 0]
+        return validas, erros_por_linha
+    
+    @staticmethod
+    def _registro(linha, id_publico, usuario_id, agora):
+        """Monta o dicionário de inserção de uma linha válida"""
+        import pandas as pd
+        
+        def texto(campo):
+            return linha[campo] or None
+        
+        def data(campo):
+            return linha[campo].date() if not pd.isna(linha[campo]) else None
+        
+        def inteiro(campo):
+            return int(linha[campo]) if not pd.isna(linha[campo]) else None
+        
+        return {
+            'id_publico': id_publico,
+            'tipo': linha['tipo'],
+            'marca': texto('marca'),
+            'modelo': texto('modelo'),
+            'num_serie': texto('num_serie'),
+            'data_aquisicao': data('data_aquisicao'),
+            'ultima_manutencao': data('ultima_manutencao'),
+            'garantia_ate': data('garantia_ate'),
+            'localizacao': texto('localizacao'),
+            'status': linha['status'],
+            'responsavel': texto('responsavel'),
+            'valor': float(linha['valor']),
+            'SPE': texto('SPE'),
+            'observacoes': texto('observacoes'),
+            'codigo_barras': texto('codigo_barras'),
+            'nota_fiscal': texto('nota_fiscal'),
+            'centro_custo': texto('centro_custo'),
+            'departamento': texto('departamento'),
+            'condicao': texto('condicao') or 'Novo',
+            'categoria_id': inteiro('categoria_id'),
+            'fornecedor_id': inteiro('fornecedor_id'),
+            'vida_util_anos': int(linha['vida_util_anos']),
+            'qr_code': f"PAT:{id_publico}|TIPO:{linha['tipo']}|SERIE:{linha['num_serie']}",
+            'ativo': True,
+            'created_at': agora,
+            'updated_at': agora,
+            'created_by': usuario_id,
+            'updated_by': usuario_id
+        }
+    
+    @staticmethod
+    def importar(arquivo, nome_arquivo, usuario_id=None, ip_address=None, apenas_validar=False):
+        """Importa um arquivo de equipamentos
+        
+        Linhas válidas são inseridas em lotes (INSERT ... RETURNING) junto com
+        suas linhas de histórico 'Criado', tudo em uma única transação.
+        Retorna o relatório {'total_linhas', 'importados', 'ids', 'erros'}.
+        """
+        df = ImportacaoService.ler_arquivo(arquivo, nome_arquivo)
+        validas, erros = ImportacaoService.validar(df)
+        
+        relatorio = {
+            'total_linhas': len(df),
+            'validas': len(validas),
+            'importados': 0,
+            'ids': [],
+            'erros': [{'linha': linha, 'mensagens': mensagens} for linha, mensagens in sorted(erros.items())]
+        }
+        if apenas_validar or validas.empty:
+            return relatorio
+        
+        agora = datetime.utcnow()
+        try:
+            ids_publicos = IdPublicoService.reservar(len(validas))
+            for inicio in range(0, len(validas), TAMANHO_LOTE):
+                lote = validas.iloc[inicio:inicio + TAMANHO_LOTE]
+                registros = [
+                    ImportacaoService._registro(linha, ids_publicos[inicio + i], usuario_id, agora)
+                    for i, (_, linha) in enumerate(lote.iterrows())
+                ]
+                inseridos = db.session.execute(
+                    insert(Equipamento).returning(Equipamento.id_interno, Equipamento.id_publico),
+                    registros
+                ).all()
+                
+                HistoricoService.registrar_lote([
+                    HistoricoService.montar_registro(
+                        id_interno,
+                        'Criado',
+                        f'Equipamento {id_publico} criado por importação ({nome_arquivo})',
+                        usuario_id=usuario_id,
+                        ip_address=ip_address,
+                        data_acao=agora
+                    )
+                    for id_interno, id_publico in inseridos
+                ])
+                relatorio['ids'].extend(id_publico for _, id_publico in inseridos)
+            
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        relatorio['importados'] = len(relatorio['ids'])
+        return relatorio
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Script para importar equipamentos em lote a partir de CSV/XLSX
+
+Uso:
+    python importar_equipamentos.py planilha.xlsx [--validar] [--usuario admin]
+"""
+import sys
+import argparse
+
+from app import app, Usuario
+from importacao import ImportacaoService
+
+def main():
+    parser = argparse.ArgumentParser(description='Importação em lote de equipamentos')
+    parser.add_argument('arquivo', help='Arquivo CSV ou XLSX')
+    parser.add_argument('--validar', action='store_true', help='Apenas validar, sem gravar')
+    parser.add_argument('--usuario', default='admin', help='Usuário registrado como autor (padrão: admin)')
+    args = parser.parse_args()
+    
+    with app.app_context():
+        usuario = Usuario.query.filter_by(username=args.usuario).first()
+        if not usuario:
+            print(f"❌ Usuário não encontrado: {args.usuario}")
+            return 1
+        
+        try:
+            with open(args.arquivo, 'rb') as arquivo:
+                relatorio = ImportacaoService.importar(
+                    arquivo,
+                    args.arquivo,
+                    usuario_id=usuario.id,
+                    apenas_validar=args.validar
+                )
+        except (OSError, ValueError) as e:
+            print(f"❌ {e}")
+            return 1
+        
+        print(f"📄 Linhas lidas: {relatorio['total_linhas']}")
+        print(f"✓ Válidas: {relatorio['validas']}")
+        print(f"📦 Importadas: {relatorio['importados']}")
+        
+        for erro in relatorio['erros']:
+            print(f"  - Linha {erro['linha']}: {'; '.join(erro['mensagens'])}")
+        
+        if relatorio['erros']:
+            print(f"\n⚠️  {len(relatorio['erros'])} linhas com erro não foram importadas")
+        elif args.validar:
+            print("\n✅ Arquivo válido")
+        else:
+            print("\n✅ Importação concluída!")
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Passo de implantação: criação das tabelas e do usuário admin padrão
+
+Os workers do gunicorn não criam schema nem usuários ao subir; rode este
+script uma vez antes de iniciar o servidor (ou após `flask db upgrade`).
+
+Uso:
+    python inicializar_banco.py
+"""
+import sys
+
+from app import app, inicializar_banco
+
+def main():
+    try:
+        criou_admin = inicializar_banco(app)
+    except Exception as e:
+        print(f"❌ Erro ao inicializar banco de dados: {e}")
+        return 1
+    
+    print("✅ Tabelas verificadas/criadas")
+    if criou_admin:
+        print("👤 Usuário admin criado (admin / admin123) - altere a senha no primeiro acesso")
+    else:
+        print("👤 Usuário admin já existe")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
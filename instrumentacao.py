@@ -0,0 +1,129 @@
+"""
+Instrumentação de SQL por Requisição
+Contagem de consultas, tempo de banco, detecção de N+1 e header Server-Timing
+"""
+import time
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from logging_config_simple import log_performance_metric
+
+# Padrões (sobrescritos pela configuração da aplicação)
+REQUISICAO_LENTA_MS = 500
+LIMIAR_N_MAIS_1 = 5
+
+class EstatisticasSQL:
+    """Consultas executadas durante uma requisição"""
+    
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tempo_db = 0.0
+        self.por_comando = {}
+    
+    def registrar(self, comando, duracao):
+        self.consultas += 1
+        self.tempo_db += duracao
+        contagem = self.por_comando.get(comando)
+        if contagem is None:
+            self.por_comando[comando] = [1, duracao]
+        else:
+            contagem[0] += 1
+            contagem[1] += duracao
+    
+    def repetidas(self, limiar):
+        """Comandos idênticos executados `limiar` vezes ou mais (típico de N+1 com lazy load)"""
+        return sorted(
+            ({'sql': comando[:300], 'vezes': vezes, 'ms': round(duracao * 1000, 2)}
+             for comando, (vezes, duracao) in self.por_comando.items() if vezes >= limiar),
+            key=lambda item: item['vezes'],
+            reverse=True
+        )
+    
+    @property
+    def duracao(self):
+        return time.perf_counter() - self.inicio
+
+def estatisticas_atuais():
+    """Estatísticas SQL da requisição atual (None fora de requisições)"""
+    if not has_request_context():
+        return None
+    return g.get('_estatisticas_sql')
+
+def _antes_de_executar(conn, cursor, statement, parameters, context, executemany):
+    # No contexto da execução, não na conexão: some junto com ele, mesmo se o comando falhar
+    if context is not None and estatisticas_atuais() is not None:
+        context._inicio_consulta = time.perf_counter()
+
+def _registrar(context, statement):
+    estatisticas = estatisticas_atuais()
+    inicio = getattr(context, '_inicio_consulta', None)
+    if estatisticas is None or inicio is None:
+        return
+    del context._inicio_consulta
+    estatisticas.registrar(statement, time.perf_counter() - inicio)
+
+def _depois_de_executar(conn, cursor, statement, parameters, context, executemany):
+    _registrar(context, statement)
+
+def _ao_falhar(contexto_erro):
+    # Comando que falha não dispara after_cursor_execute; conta a consulta mesmo assim
+    _registrar(contexto_erro.execution_context, contexto_erro.statement)
+
+class InstrumentacaoSQL:
+    """Liga os eventos de cursor do SQLAlchemy ao ciclo de requisição do Flask
+    
+    Por requisição: número de consultas e tempo de banco no header
+    Server-Timing; comandos repetidos (N+1) e requisições lentas vão para
+    log_performance_metric.
+    """
+    
+    def __init__(self):
+        self._eventos_registrados = False
+    
+    def init_app(self, app):
+        if not app.config.get('INSTRUMENTACAO_SQL', True):
+            return
+        
+        if not self._eventos_registrados:
+            # Em Engine (classe) para cobrir qualquer engine criado pela aplicação
+            event.listen(Engine, 'before_cursor_execute', _antes_de_executar)
+            event.listen(Engine, 'after_cursor_execute', _depois_de_executar)
+            event.listen(Engine, 'handle_error', _ao_falhar)
+            self._eventos_registrados = True
+        
+        lenta_ms = app.config.get('REQUISICAO_LENTA_MS', REQUISICAO_LENTA_MS)
+        limiar = app.config.get('LIMIAR_N_MAIS_1', LIMIAR_N_MAIS_1)
+        
+        @app.before_request
+        def iniciar_estatisticas_sql():
+            g._estatisticas_sql = EstatisticasSQL()
+        
+        @app.after_request
+        def finalizar_estatisticas_sql(response):
+            estatisticas = g.get('_estatisticas_sql')
+            if estatisticas is None:
+                return response
+            
+            duracao_ms = estatisticas.duracao * 1000
+            db_ms = estatisticas.tempo_db * 1000
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={db_ms:.1f};desc="{estatisticas.consultas} consultas", app;dur={duracao_ms:.1f}'
+            )
+            
+            repetidas = estatisticas.repetidas(limiar)
+            if repetidas or duracao_ms >= lenta_ms:
+                log_performance_metric('requisicao_lenta' if duracao_ms >= lenta_ms else 'consultas_repetidas', round(duracao_ms, 1), {
+                    'endpoint': request.endpoint,
+                    'metodo': request.method,
+                    'caminho': request.path,
+                    'status': response.status_code,
+                    'consultas': estatisticas.consultas,
+                    'db_ms': round(db_ms, 1),
+                    'n_mais_1': repetidas
+                })
+            return response
+
+# Instância global
+instrumentacao_sql = InstrumentacaoSQL()
@@ -3,11 +3,20 @@ Sistema de Logging Simplificado
 Implementação básica de logging para o sistema
 """
 import os
+import copy
+import gzip
+import queue
+import shutil
+import atexit
 import logging
 import logging.handlers
+from flask.logging import default_handler
 from datetime import datetime
 import json
 
+# Políticas de fila cheia do logging assíncrono
+POLITICAS_FILA = ('descartar', 'bloquear')
+
 def get_current_user_info():
     """Helper para obter informações do usuário atual com segurança"""
     try:
@@ -21,11 +30,92 @@ def get_current_user_info():
         pass
     return {'user_id': None, 'username': None}
 
+def _nome_comprimido(nome):
+    return nome + '.gz'
+
+def _comprimir_rotacao(origem, destino):
+    """Rotator do RotatingFileHandler: grava o arquivo rotacionado como .gz
+    
+    Renomeia antes de comprimir: o app.log novo existe desde o início e outros
+    processos com o arquivo aberto seguem escrevendo no renomeado, não num
+    arquivo já removido.
+    """
+    rotacionado = destino[:-len('.gz')] if destino.endswith('.gz') else destino + '.tmp'
+    os.replace(origem, rotacionado)
+    with open(rotacionado, 'rb') as entrada, gzip.open(destino, 'wb') as saida:
+        shutil.copyfileobj(entrada, saida)
+    os.remove(rotacionado)
+
+class FilaLogHandler(logging.handlers.QueueHandler):
+    """QueueHandler com política para fila cheia
+    
+    'descartar' nunca bloqueia a requisição: o registro é contado e
+    descartado. 'bloquear' espera até `espera` segundos por espaço (contrapressão)
+    e só então descarta. Registros WARNING ou mais graves sempre esperam.
+    """
+    
+    def __init__(self, fila, politica='descartar', espera=0.5):
+        super().__init__(fila)
+        if politica not in POLITICAS_FILA:
+            raise ValueError(f"Política de fila inválida (use {', '.join(POLITICAS_FILA)})")
+        self.politica = politica
+        self.espera = espera
+        self.descartados = 0
+    
+    def prepare(self, record):
+        """Cópia leve do registro; formatação (JSON) fica para a thread do listener"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Traceback precisa ser lido agora, enquanto os frames ainda existem
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+    
+    def enqueue(self, record):
+        try:
+            if self.politica == 'bloquear' or record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=self.espera)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+class OuvinteFilaLog(logging.handlers.QueueListener):
+    """QueueListener que também registra quantos registros a fila descartou"""
+    
+    def __init__(self, fila, fila_handler, *handlers):
+        super().__init__(fila, *handlers, respect_handler_level=True)
+        self.fila_handler = fila_handler
+        self._descartes_informados = 0
+    
+    def enqueue_sentinel(self):
+        # Com a fila cheia, espera a vez em vez de perder o sinal de parada
+        self.queue.put(self._sentinel)
+    
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+    
+    def handle(self, record):
+        super().handle(record)
+        descartados = self.fila_handler.descartados
+        if descartados > self._descartes_informados:
+            aviso = logging.LogRecord(
+                record.name, logging.WARNING, __file__, 0,
+                f'Fila de log cheia: {descartados - self._descartes_informados} registro(s) descartado(s)',
+                None, None
+            )
+            self._descartes_informados = descartados
+            super().handle(aviso)
+
 class SimpleStructuredLogger:
     """Logger estruturado simplificado"""
     
     def __init__(self, app=None):
         self.app = app
+        self.ouvinte = None
         if app is not None:
             self.init_app(app)
     
@@ -49,14 +139,42 @@ class SimpleStructuredLogger:
         )
         file_handler.setLevel(log_level)
         
-        # Configurar formato
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        file_handler.setFormatter(formatter)
+        # Arquivos rotacionados comprimidos (app.log.1.gz, ...)
+        if app.config.get('LOG_COMPRIMIR_ROTACAO', True):
+            file_handler.namer = _nome_comprimido
+            file_handler.rotator = _comprimir_rotacao
+        
+        if self.ouvinte is not None:
+            self.ouvinte.stop()
+            self.ouvinte = None
         
-        # Adicionar handler ao logger da aplicação
-        app.logger.addHandler(file_handler)
+        if app.config.get('LOG_ASSINCRONO', False):
+            # Requisição só enfileira; JSON, escrita, rotação e gzip na thread do listener
+            file_handler.setFormatter(SimpleJSONFormatter())
+            fila = queue.Queue(maxsize=int(app.config.get('LOG_FILA_TAMANHO', 10000)))
+            fila_handler = FilaLogHandler(
+                fila,
+                politica=app.config.get('LOG_POLITICA_FILA', 'descartar'),
+                espera=float(app.config.get('LOG_FILA_ESPERA', 0.5))
+            )
+            # O handler de console do Flask também sai do caminho da requisição
+            destinos = [file_handler]
+            if default_handler in app.logger.handlers:
+                app.logger.removeHandler(default_handler)
+                destinos.append(default_handler)
+            self.ouvinte = OuvinteFilaLog(fila, fila_handler, *destinos)
+            self.ouvinte.start()
+            atexit.register(self.ouvinte.stop)
+            app.logger.addHandler(fila_handler)
+        else:
+            # Configurar formato
+            formatter = logging.Formatter(
+                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+            )
+            file_handler.setFormatter(formatter)
+            
+            # Adicionar handler ao logger da aplicação
+            app.logger.addHandler(file_handler)
         app.logger.setLevel(log_level)
         
         # Log de inicialização
@@ -150,6 +268,11 @@ class SimpleJSONFormatter(logging.Formatter):
             except (TypeError, AttributeError):
                 pass
         
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            log_data['exception'] = record.exc_text
+        
         return json.dumps(log_data, ensure_ascii=False, default=str)
 
 # Funções de conveniência
@@ -0,0 +1,278 @@
+"""
+Métricas da Aplicação
+Contadores e histogramas em memória, agregados entre workers do gunicorn
+e expostos em /metrics no formato de texto do Prometheus
+"""
+import os
+import copy
+import json
+import time
+import atexit
+import threading
+from flask import g, request
+from instrumentacao import estatisticas_atuais
+
+# Limites dos histogramas (segundos e bytes)
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LIMITES_BYTES = (1024, 10240, 102400, 1048576, 10485760, 104857600)
+
+# Intervalo mínimo entre gravações do arquivo do worker (modo multiprocesso)
+INTERVALO_PADRAO = 5
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _formatar_rotulos(pares):
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + '}'
+
+def _numero(valor):
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+class Metrica:
+    """Base: valores por combinação de rótulos"""
+    
+    tipo = None
+    
+    def __init__(self, nome, descricao, rotulos, lock):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self._lock = lock
+        self._valores = {}
+    
+    def _chave(self, rotulos):
+        return tuple(str(rotulos.get(nome, '')) for nome in self.rotulos)
+    
+    def estado(self):
+        """Valores serializáveis em JSON (chave = lista de valores dos rótulos)"""
+        with self._lock:
+            return {json.dumps(chave): copy.deepcopy(valor) for chave, valor in self._valores.items()}
+
+class Contador(Metrica):
+    """Valor que só cresce (ex.: total de requisições)"""
+    
+    tipo = 'counter'
+    
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+    
+    @staticmethod
+    def somar(atual, outro):
+        return (atual or 0) + outro
+    
+    def linhas(self, valores):
+        for chave, valor in sorted(valores.items()):
+            yield f'{self.nome}{_formatar_rotulos(list(zip(self.rotulos, chave)))} {_numero(valor)}'
+
+class Histograma(Metrica):
+    """Distribuição em faixas (ex.: latência); guarda contagens por faixa, soma e total"""
+    
+    tipo = 'histogram'
+    
+    def __init__(self, nome, descricao, rotulos, lock, limites=LIMITES_SEGUNDOS):
+        super().__init__(nome, descricao, rotulos, lock)
+        self.limites = tuple(sorted(limites))
+    
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            faixas = self._valores.get(chave)
+            if faixas is None:
+                # [contagem por faixa (+Inf no fim), soma, total]
+                faixas = self._valores[chave] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            indice = next((i for i, limite in enumerate(self.limites) if valor <= limite), len(self.limites))
+            faixas[0][indice] += 1
+            faixas[1] += valor
+            faixas[2] += 1
+    
+    def cronometrar(self, **rotulos):
+        """Context manager que observa o tempo decorrido do bloco, em segundos"""
+        return _Cronometro(self, rotulos)
+    
+    @staticmethod
+    def somar(atual, outro):
+        if atual is None:
+            return [list(outro[0]), outro[1], outro[2]]
+        return [[a + b for a, b in zip(atual[0], outro[0])], atual[1] + outro[1], atual[2] + outro[2]]
+    
+    def linhas(self, valores):
+        for chave, (contagens, soma, total) in sorted(valores.items()):
+            pares = list(zip(self.rotulos, chave))
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (float('inf'),), contagens):
+                acumulado += contagem
+                le = '+Inf' if limite == float('inf') else _numero(limite)
+                yield f'{self.nome}_bucket{_formatar_rotulos(pares + [("le", le)])} {acumulado}'
+            yield f'{self.nome}_sum{_formatar_rotulos(pares)} {_numero(soma)}'
+            yield f'{self.nome}_count{_formatar_rotulos(pares)} {total}'
+
+class _Cronometro:
+    def __init__(self, histograma, rotulos):
+        self.histograma = histograma
+        self.rotulos = rotulos
+    
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.histograma.observar(time.perf_counter() - self.inicio, **self.rotulos)
+        return False
+
+class RegistroMetricas:
+    """Registro de métricas do processo
+    
+    Sem METRICAS_DIR, /metrics mostra só o worker que atendeu. Com
+    METRICAS_DIR, cada worker grava seu estado em metricas_<pid>.json (no
+    máximo a cada METRICAS_INTERVALO segundos e ao encerrar) e a exportação
+    soma os arquivos de todos os workers. Os arquivos de workers encerrados
+    continuam somando (contadores não podem diminuir); esvazie o diretório
+    ao reiniciar o serviço.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metricas = {}
+        self.diretorio = None
+        self.intervalo = INTERVALO_PADRAO
+        self._ultima_gravacao = 0.0
+    
+    def contador(self, nome, descricao, rotulos=()):
+        return self._registrar(Contador(nome, descricao, rotulos, self._lock))
+    
+    def histograma(self, nome, descricao, rotulos=(), limites=LIMITES_SEGUNDOS):
+        return self._registrar(Histograma(nome, descricao, rotulos, self._lock, limites))
+    
+    def _registrar(self, metrica):
+        if metrica.nome in self._metricas:
+            raise ValueError(f"Métrica já registrada: {metrica.nome}")
+        self._metricas[metrica.nome] = metrica
+        return metrica
+    
+    def init_app(self, app):
+        """Hooks de requisição e modo multiprocesso (METRICAS_DIR)"""
+        self.diretorio = app.config.get('METRICAS_DIR')
+        self.intervalo = float(app.config.get('METRICAS_INTERVALO', INTERVALO_PADRAO))
+        if self.diretorio:
+            os.makedirs(self.diretorio, exist_ok=True)
+            atexit.register(self.gravar)
+        
+        @app.before_request
+        def iniciar_metricas_requisicao():
+            g._inicio_metricas = time.perf_counter()
+        
+        @app.after_request
+        def registrar_metricas_requisicao(response):
+            inicio = g.get('_inicio_metricas')
+            if inicio is None:
+                return response
+            
+            endpoint = request.endpoint or 'nao_encontrado'
+            REQUISICOES.inc(endpoint=endpoint, metodo=request.method, status=response.status_code)
+            LATENCIA.observar(time.perf_counter() - inicio, endpoint=endpoint, status=response.status_code)
+            
+            estatisticas = estatisticas_atuais()
+            if estatisticas is not None:
+                TEMPO_DB.observar(estatisticas.tempo_db, endpoint=endpoint)
+                CONSULTAS_DB.inc(estatisticas.consultas, endpoint=endpoint)
+            
+            self.gravar_se_necessario()
+            return response
+    
+    def _arquivo(self, pid):
+        return os.path.join(self.diretorio, f'metricas_{pid}.json')
+    
+    def estado(self):
+        return {nome: metrica.estado() for nome, metrica in self._metricas.items()}
+    
+    def gravar(self):
+        """Grava o estado do worker no diretório compartilhado (troca atômica do arquivo)"""
+        if not self.diretorio:
+            return
+        destino = self._arquivo(os.getpid())
+        temporario = f'{destino}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(self.estado(), arquivo)
+        os.replace(temporario, destino)
+        self._ultima_gravacao = time.monotonic()
+    
+    def gravar_se_necessario(self):
+        if self.diretorio and time.monotonic() - self._ultima_gravacao >= self.intervalo:
+            try:
+                self.gravar()
+            except OSError:
+                pass
+    
+    def _estados(self):
+        """Estado deste processo (em memória) e dos demais workers (arquivos)"""
+        yield self.estado()
+        if not self.diretorio:
+            return
+        proprio = os.path.basename(self._arquivo(os.getpid()))
+        for nome in os.listdir(self.diretorio):
+            if nome == proprio or not nome.startswith('metricas_') or not nome.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.diretorio, nome), encoding='utf-8') as arquivo:
+                    yield json.load(arquivo)
+            except (OSError, ValueError):
+                # Arquivo sendo trocado ou corrompido: fica para a próxima coleta
+                continue
+    
+    def coletar(self):
+        """Valores agregados de todos os processos: {nome: {rótulos: valor}}"""
+        agregado = {nome: {} for nome in self._metricas}
+        for estado in self._estados():
+            for nome, valores in estado.items():
+                metrica = self._metricas.get(nome)
+                if metrica is None:
+                    continue
+                destino = agregado[nome]
+                for chave, valor in valores.items():
+                    chave = tuple(json.loads(chave))
+                    destino[chave] = metrica.somar(destino.get(chave), valor)
+        return agregado
+    
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)"""
+        linhas = []
+        for nome, valores in self.coletar().items():
+            metrica = self._metricas[nome]
+            linhas.append(f'# HELP {nome} {metrica.descricao}')
+            linhas.append(f'# TYPE {nome} {metrica.tipo}')
+            linhas.extend(metrica.linhas(valores))
+        return '\n'.join(linhas) + '\n'
+    
+    def limpar(self):
+        """Zera todos os valores deste processo"""
+        with self._lock:
+            for metrica in self._metricas.values():
+                metrica._valores.clear()
+
+def contar_bytes(chunks, formato):
+    """Repassa os pedaços de uma exportação em streaming e observa o tamanho total ao final"""
+    total = 0
+    for chunk in chunks:
+        total += len(chunk.encode('utf-8')) if isinstance(chunk, str) else len(chunk)
+        yield chunk
+    TAMANHO_EXPORTACAO.observar(total, formato=formato)
+
+# Instância global
+metricas = RegistroMetricas()
+
+REQUISICOES = metricas.contador(
+    'patrimonio_requisicoes_total', 'Requisições HTTP atendidas', ('endpoint', 'metodo', 'status'))
+LATENCIA = metricas.histograma(
+    'patrimonio_requisicao_segundos', 'Latência das requisições HTTP', ('endpoint', 'status'))
+TEMPO_DB = metricas.histograma(
+    'patrimonio_db_segundos', 'Tempo de banco por requisição', ('endpoint',))
+CONSULTAS_DB = metricas.contador(
+    'patrimonio_db_consultas_total', 'Consultas SQL executadas', ('endpoint',))
+RENDERIZACAO_PDF = metricas.histograma(
+    'patrimonio_pdf_renderizacao_segundos', 'Tempo de renderização de PDFs', ('documento',))
+TAMANHO_EXPORTACAO = metricas.histograma(
+    'patrimonio_exportacao_bytes', 'Tamanho das exportações', ('formato',), limites=LIMITES_BYTES)
@@ -0,0 +1,55 @@
+"""Trigger de atualização do FTS5 só quando colunas buscadas mudam
+
+Revision ID: gatilho_busca_colunas
+Revises: indices_caminhos_acesso
+Create Date: 2026-10-17
+
+- SQLite: equipamento_fts_au passa a ser AFTER UPDATE OF (colunas buscadas);
+  atualizações em massa de outras colunas (ex.: valor_depreciado pelo job de
+  depreciação) deixam de reindexar a tabela FTS5 linha a linha
+- Outros bancos: nada a fazer
+"""
+from alembic import op
+
+# revision identifiers
+revision = 'gatilho_busca_colunas'
+down_revision = 'indices_caminhos_acesso'
+branch_labels = None
+depends_on = None
+
+# Manter em sincronia com search.COLUNAS_BUSCA
+COLUNAS_BUSCA = ('id_publico', 'tipo', 'marca', 'localizacao', 'responsavel')
+TABELA_FTS = 'equipamento_fts'
+
+
+def _recriar_gatilho(evento):
+    colunas = ', '.join(COLUNAS_BUSCA)
+    novos = ', '.join(f"new.{c}" for c in COLUNAS_BUSCA)
+    antigos = ', '.join(f"old.{c}" for c in COLUNAS_BUSCA)
+
+    existe = op.get_bind().exec_driver_sql(
+        f"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '{TABELA_FTS}'"
+    ).first()
+    if not existe:
+        return
+
+    op.execute(f"DROP TRIGGER IF EXISTS {TABELA_FTS}_au")
+    op.execute(f"""
+        CREATE TRIGGER {TABELA_FTS}_au {evento} ON equipamento BEGIN
+            INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, {colunas}) VALUES ('delete', old.id_interno, {antigos});
+            INSERT INTO {TABELA_FTS}(rowid, {colunas}) VALUES (new.id_interno, {novos});
+        END
+    """)
+
+
+def upgrade():
+    """Restringir o trigger de atualização às colunas buscadas"""
+    if op.get_bind().dialect.name == 'sqlite':
+        _recriar_gatilho(f"AFTER UPDATE OF {', '.join(COLUNAS_BUSCA)}")
+        print("✅ Trigger de busca restrito às colunas indexadas")
+
+
+def downgrade():
+    """Voltar ao trigger em qualquer UPDATE"""
+    if op.get_bind().dialect.name == 'sqlite':
+        _recriar_gatilho("AFTER UPDATE")
@@ -0,0 +1,83 @@
+"""Índices de busca textual: pg_trgm (PostgreSQL) ou FTS5 trigram (SQLite)
+
+Revision ID: indice_busca_textual
+Revises: adicionar_campos_modernos
+Create Date: 2026-10-17
+
+- PostgreSQL: extensão pg_trgm + índices GIN gin_trgm_ops nas colunas buscadas,
+  que atendem ILIKE '%termo%' sem varrer a tabela
+- SQLite: tabela virtual FTS5 (tokenizer trigram) espelhando equipamento,
+  mantida por triggers
+- Outros bancos: nada a fazer (a busca continua por LIKE)
+"""
+from alembic import op
+
+# revision identifiers
+revision = 'indice_busca_textual'
+down_revision = 'adicionar_campos_modernos'
+branch_labels = None
+depends_on = None
+
+# Manter em sincronia com search.COLUNAS_BUSCA
+COLUNAS_BUSCA = ('id_publico', 'tipo', 'marca', 'localizacao', 'responsavel')
+TABELA_FTS = 'equipamento_fts'
+
+
+def upgrade():
+    """Criar índices de busca conforme o banco"""
+    dialeto = op.get_bind().dialect.name
+
+    if dialeto == 'postgresql':
+        print("📊 Criando índices trigram (pg_trgm)...")
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for coluna in COLUNAS_BUSCA:
+            op.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_equipamento_{coluna.lower()}_trgm "
+                f"ON equipamento USING gin ({coluna} gin_trgm_ops)"
+            )
+        print("✅ Índices trigram criados")
+
+    elif dialeto == 'sqlite':
+        print("📊 Criando tabela FTS5 de busca...")
+        colunas = ', '.join(COLUNAS_BUSCA)
+        novos = ', '.join(f"new.{c}" for c in COLUNAS_BUSCA)
+        antigos = ', '.join(f"old.{c}" for c in COLUNAS_BUSCA)
+
+        op.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5("
+            f"{colunas}, content='equipamento', content_rowid='id_interno', tokenize='trigram')"
+        )
+        op.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ai AFTER INSERT ON equipamento BEGIN
+                INSERT INTO {TABELA_FTS}(rowid, {colunas}) VALUES (new.id_interno, {novos});
+            END
+        """)
+        op.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ad AFTER DELETE ON equipamento BEGIN
+                INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, {colunas}) VALUES ('delete', old.id_interno, {antigos});
+            END
+        """)
+        op.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_au AFTER UPDATE ON equipamento BEGIN
+                INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, {colunas}) VALUES ('delete', old.id_interno, {antigos});
+                INSERT INTO {TABELA_FTS}(rowid, {colunas}) VALUES (new.id_interno, {novos});
+            END
+        """)
+        # Indexar as linhas já existentes
+        op.execute(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')")
+        print("✅ Tabela FTS5 criada e populada")
+
+
+def downgrade():
+    """Remover índices de busca"""
+    dialeto = op.get_bind().dialect.name
+
+    if dialeto == 'postgresql':
+        for coluna in COLUNAS_BUSCA:
+            op.execute(f"DROP INDEX IF EXISTS ix_equipamento_{coluna.lower()}_trgm")
+        # A extensão pg_trgm é mantida: pode estar em uso por outros objetos
+
+    elif dialeto == 'sqlite':
+        for sufixo in ('ai', 'ad', 'au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {TABELA_FTS}_{sufixo}")
+        op.execute(f"DROP TABLE IF EXISTS {TABELA_FTS}")
@@ -0,0 +1,28 @@
+"""Índice para deduplicação de notificações por equipamento/usuário
+
+Revision ID: indice_notificacao_equipamento
+Revises: sequencia_id_publico
+Create Date: 2026-10-17
+
+- ix_notificacao_equipamento_usuario (equipamento_id, usuario_id): atende a
+  verificação de notificações já enviadas do job de garantias
+"""
+from alembic import op
+
+# revision identifiers
+revision = 'indice_notificacao_equipamento'
+down_revision = 'sequencia_id_publico'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Criar índice de notificações por equipamento/usuário"""
+    print("📊 Criando índice de notificações...")
+    op.create_index('ix_notificacao_equipamento_usuario', 'notificacao', ['equipamento_id', 'usuario_id'])
+    print("✅ Índice de notificações criado")
+
+
+def downgrade():
+    """Remover índice de notificações por equipamento/usuário"""
+    op.drop_index('ix_notificacao_equipamento_usuario', table_name='notificacao')
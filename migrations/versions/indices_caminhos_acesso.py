@@ -0,0 +1,64 @@
+"""Índices dos caminhos de acesso mais frequentes
+
+Revision ID: indices_caminhos_acesso
+Revises: indice_notificacao_equipamento
+Create Date: 2026-10-17
+
+- ix_equipamento_status (status): dashboard e filtro de status da consulta
+- ix_equipamento_ativo_garantia (ativo, garantia_ate) parcial, só linhas com
+  garantia: job de garantias expirando
+- ix_historico_equipamento_data (equipamento_id, data_acao DESC): histórico
+  de um equipamento, mais recente primeiro
+- ix_notificacao_usuario_lida (usuario_id, lida, created_at): notificações
+  (não lidas) de um usuário
+- ix_equipamento_categoria_id / ix_equipamento_fornecedor_id: chaves
+  estrangeiras (joins e filtros por categoria/fornecedor)
+
+No PostgreSQL os índices são criados com CONCURRENTLY (sem bloquear escritas).
+Verifique os planos antes/depois com: python verificar_indices.py
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'indices_caminhos_acesso'
+down_revision = 'indice_notificacao_equipamento'
+branch_labels = None
+depends_on = None
+
+# Manter em sincronia com models.py (__table_args__)
+INDICES = (
+    ('ix_equipamento_status', 'equipamento', ['status'], None),
+    ('ix_equipamento_ativo_garantia', 'equipamento', ['ativo', 'garantia_ate'], 'garantia_ate IS NOT NULL'),
+    ('ix_equipamento_categoria_id', 'equipamento', ['categoria_id'], None),
+    ('ix_equipamento_fornecedor_id', 'equipamento', ['fornecedor_id'], None),
+    ('ix_historico_equipamento_data', 'historico_equipamento', ['equipamento_id', sa.text('data_acao DESC')], None),
+    ('ix_notificacao_usuario_lida', 'notificacao', ['usuario_id', 'lida', 'created_at'], None),
+)
+
+
+def upgrade():
+    """Criar índices compostos/parciais"""
+    print("📊 Criando índices dos caminhos de acesso...")
+    if op.get_bind().dialect.name == 'postgresql':
+        # CREATE INDEX CONCURRENTLY não pode rodar dentro de transação
+        with op.get_context().autocommit_block():
+            for nome, tabela, colunas, condicao in INDICES:
+                op.create_index(
+                    nome, tabela, colunas, if_not_exists=True,
+                    postgresql_concurrently=True,
+                    postgresql_where=sa.text(condicao) if condicao else None
+                )
+    else:
+        for nome, tabela, colunas, condicao in INDICES:
+            op.create_index(
+                nome, tabela, colunas, if_not_exists=True,
+                sqlite_where=sa.text(condicao) if condicao else None
+            )
+    print("✅ Índices criados")
+
+
+def downgrade():
+    """Remover índices dos caminhos de acesso"""
+    for nome, tabela, _, _ in reversed(INDICES):
+        op.drop_index(nome, table_name=tabela, if_exists=True)
@@ -0,0 +1,41 @@
+"""Índice da ordem numérica dos IDs públicos
+
+Revision ID: ordem_id_publico
+Revises: particionamento_mensal
+Create Date: 2026-10-17
+
+- ix_equipamento_id_publico_ordem (length(id_publico), id_publico): ordenação
+  e paginação por cursor em ordem numérica (PAT-999 antes de PAT-1000) na
+  consulta, etiquetas, termos em lote e exportação CSV
+
+No PostgreSQL o índice é criado com CONCURRENTLY (sem bloquear escritas).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'ordem_id_publico'
+down_revision = 'particionamento_mensal'
+branch_labels = None
+depends_on = None
+
+# Manter em sincronia com models.py e services.IdPublicoService.ORDEM
+COLUNAS = [sa.text('length(id_publico)'), 'id_publico']
+
+
+def upgrade():
+    """Criar índice da ordem numérica dos IDs públicos"""
+    print("📊 Criando índice da ordem dos IDs públicos...")
+    if op.get_bind().dialect.name == 'postgresql':
+        # CREATE INDEX CONCURRENTLY não pode rodar dentro de transação
+        with op.get_context().autocommit_block():
+            op.create_index('ix_equipamento_id_publico_ordem', 'equipamento', COLUNAS,
+                            if_not_exists=True, postgresql_concurrently=True)
+    else:
+        op.create_index('ix_equipamento_id_publico_ordem', 'equipamento', COLUNAS, if_not_exists=True)
+    print("✅ Índice da ordem dos IDs públicos criado")
+
+
+def downgrade():
+    """Remover índice da ordem numérica dos IDs públicos"""
+    op.drop_index('ix_equipamento_id_publico_ordem', table_name='equipamento', if_exists=True)
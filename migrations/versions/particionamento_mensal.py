@@ -0,0 +1,108 @@
+"""Partições mensais de historico_equipamento e notificacao (PostgreSQL)
+
+Revision ID: particionamento_mensal
+Revises: snapshot_equipamento
+Create Date: 2026-10-17
+
+- PostgreSQL: recria historico_equipamento (por data_acao) e notificacao (por
+  created_at) como tabelas particionadas por mês (RANGE): uma partição por
+  mês, da linha mais antiga até MESES_FUTUROS meses à frente, e uma partição
+  DEFAULT. A chave primária passa a ser (id, coluna da partição), exigência
+  do PostgreSQL; ids e sequências são mantidos. As partições dos meses
+  seguintes são criadas pelo job arquivar_historico.py
+- Outros bancos: nada a fazer (o arquivamento remove as linhas com DELETE)
+
+A cópia das linhas bloqueia as duas tabelas: rode em janela de manutenção.
+"""
+from datetime import datetime
+from alembic import op
+
+# revision identifiers
+revision = 'particionamento_mensal'
+down_revision = 'snapshot_equipamento'
+branch_labels = None
+depends_on = None
+
+MESES_FUTUROS = 3
+
+# tabela, coluna da partição, índices (manter em sincronia com models.py) e chaves estrangeiras
+TABELAS = (
+    ('historico_equipamento', 'data_acao',
+     (('ix_historico_equipamento_data', 'equipamento_id, data_acao DESC'),),
+     (('equipamento_id', 'equipamento(id_interno)'), ('usuario_id', 'usuario(id)'))),
+    ('notificacao', 'created_at',
+     (('ix_notificacao_equipamento_usuario', 'equipamento_id, usuario_id'),
+      ('ix_notificacao_usuario_lida', 'usuario_id, lida, created_at')),
+     (('usuario_id', 'usuario(id)'), ('equipamento_id', 'equipamento(id_interno)'))),
+)
+
+
+def _somar_meses(mes, meses):
+    total = mes.year * 12 + mes.month - 1 + meses
+    return datetime(total // 12, total % 12 + 1, 1)
+
+
+def _particao(tabela, mes):
+    # Manter em sincronia com arquivamento.ArquivoService.particao
+    return f"{tabela}_p{mes:%Y_%m}"
+
+
+def _recriar(tabela, coluna, indices, chaves, particionada):
+    """Copia a tabela para uma nova (particionada ou não) e troca os nomes"""
+    bind = op.get_bind()
+    nova = f"{tabela}_nova"
+    sequencia = bind.exec_driver_sql(f"SELECT pg_get_serial_sequence('{tabela}', 'id')").scalar()
+
+    if particionada:
+        op.execute(f"CREATE TABLE {nova} (LIKE {tabela} INCLUDING DEFAULTS) PARTITION BY RANGE ({coluna})")
+        op.execute(f"ALTER TABLE {nova} ADD PRIMARY KEY (id, {coluna})")
+        agora = datetime.utcnow()
+        mais_antiga = bind.exec_driver_sql(f"SELECT min({coluna}) FROM {tabela}").scalar() or agora
+        mes = datetime(mais_antiga.year, mais_antiga.month, 1)
+        fim = _somar_meses(datetime(agora.year, agora.month, 1), MESES_FUTUROS + 1)
+        while mes < fim:
+            proximo = _somar_meses(mes, 1)
+            op.execute(
+                f"CREATE TABLE {_particao(tabela, mes)} PARTITION OF {nova} "
+                f"FOR VALUES FROM ('{mes:%Y-%m-%d}') TO ('{proximo:%Y-%m-%d}')"
+            )
+            mes = proximo
+        # Linhas sem partição do mês (job atrasado); garantir_particoes as move
+        # para a partição do mês ao criá-la. Manter em sincronia com
+        # arquivamento.ArquivoService.particao_padrao
+        op.execute(f"CREATE TABLE {tabela}_padrao PARTITION OF {nova} DEFAULT")
+    else:
+        op.execute(f"CREATE TABLE {nova} (LIKE {tabela} INCLUDING DEFAULTS)")
+        op.execute(f"ALTER TABLE {nova} ADD PRIMARY KEY (id)")
+
+    op.execute(f"INSERT INTO {nova} SELECT * FROM {tabela}")
+    if sequencia:
+        # Sem isso o DROP da tabela antiga levaria a sequência dos ids junto
+        op.execute(f"ALTER SEQUENCE {sequencia} OWNED BY {nova}.id")
+    op.execute(f"DROP TABLE {tabela}")
+    op.execute(f"ALTER TABLE {nova} RENAME TO {tabela}")
+    op.execute(f"ALTER TABLE {tabela} RENAME CONSTRAINT {nova}_pkey TO {tabela}_pkey")
+    for nome, colunas in indices:
+        op.execute(f"CREATE INDEX {nome} ON {tabela} ({colunas})")
+    for coluna_chave, referencia in chaves:
+        op.execute(f"ALTER TABLE {tabela} ADD FOREIGN KEY ({coluna_chave}) REFERENCES {referencia}")
+
+
+def upgrade():
+    """Particionar historico_equipamento e notificacao por mês"""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for tabela, coluna, indices, chaves in TABELAS:
+        print(f"📊 Particionando {tabela.upper()} por mês ({coluna})...")
+        _recriar(tabela, coluna, indices, chaves, particionada=True)
+    print("✅ Tabelas particionadas")
+
+
+def downgrade():
+    """Voltar historico_equipamento e notificacao para tabelas simples"""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for tabela, coluna, indices, chaves in TABELAS:
+        _recriar(tabela, coluna, indices, chaves, particionada=False)
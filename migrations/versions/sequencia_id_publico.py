@@ -0,0 +1,48 @@
+"""Sequência para alocação de IDs públicos (PAT-xxx)
+
+Revision ID: sequencia_id_publico
+Revises: indice_busca_textual
+Create Date: 2026-10-17
+
+- PostgreSQL: SEQUENCE equipamento_id_publico_seq iniciada após o maior ID existente
+- Demais bancos: tabela contador_sequencia (criada pelo serviço na primeira
+  alocação se ainda não tiver linha)
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'sequencia_id_publico'
+down_revision = 'indice_busca_textual'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Criar sequência/contador de IDs públicos"""
+    print("📊 Criando contador de IDs públicos...")
+    op.create_table('contador_sequencia',
+        sa.Column('nome', sa.String(length=50), nullable=False),
+        sa.Column('valor', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('nome')
+    )
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("CREATE SEQUENCE IF NOT EXISTS equipamento_id_publico_seq")
+        # Continuar a partir do maior número já usado (id_interno ou sufixo de PAT-xxx)
+        op.execute("""
+            SELECT setval('equipamento_id_publico_seq', GREATEST(
+                1,
+                COALESCE((SELECT MAX(id_interno) FROM equipamento), 0),
+                COALESCE((SELECT MAX(CAST(SUBSTRING(id_publico FROM '^PAT-([0-9]+)$') AS BIGINT))
+                          FROM equipamento), 0)
+            ), (SELECT COUNT(*) > 0 FROM equipamento))
+        """)
+    print("✅ Contador de IDs públicos criado")
+
+
+def downgrade():
+    """Remover sequência/contador de IDs públicos"""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP SEQUENCE IF EXISTS equipamento_id_publico_seq")
+    op.drop_table('contador_sequencia')
@@ -0,0 +1,44 @@
+"""Snapshots de estado para reconstrução histórica de equipamentos
+
+Revision ID: snapshot_equipamento
+Revises: gatilho_busca_colunas
+Create Date: 2026-10-17
+
+- snapshot_equipamento: estado completo (JSON) de um equipamento em um
+  instante, gravado pelo job gerar_snapshots.py
+- ix_snapshot_equipamento_data (equipamento_id, data_snapshot): snapshot
+  mais próximo de um instante
+
+A reconstrução lê os eventos pelo índice ix_historico_equipamento_data
+(equipamento_id, data_acao), criado em indices_caminhos_acesso.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'snapshot_equipamento'
+down_revision = 'gatilho_busca_colunas'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Criar tabela de snapshots de equipamento"""
+    print("📊 Criando tabela SNAPSHOT_EQUIPAMENTO...")
+    op.create_table('snapshot_equipamento',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('equipamento_id', sa.Integer(), nullable=False),
+        sa.Column('data_snapshot', sa.DateTime(), nullable=False),
+        sa.Column('estado', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['equipamento_id'], ['equipamento.id_interno']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_snapshot_equipamento_data', 'snapshot_equipamento', ['equipamento_id', 'data_snapshot'])
+    print("✅ Tabela SNAPSHOT_EQUIPAMENTO criada")
+
+
+def downgrade():
+    """Remover tabela de snapshots de equipamento"""
+    op.drop_index('ix_snapshot_equipamento_data', table_name='snapshot_equipamento')
+    op.drop_table('snapshot_equipamento')
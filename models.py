@@ -2,7 +2,7 @@
 Modelos de dados do Sistema de Controle de Patrimônio
 Separado do app.py para melhor organização
 """
-from datetime import datetime
+from datetime import datetime, date
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 
@@ -80,6 +80,12 @@ class ManutencaoProgramada(db.Model):
 
 class HistoricoEquipamento(db.Model):
     __tablename__ = 'historico_equipamento'
+    # PostgreSQL: particionada por mês em data_acao (chave primária (id, data_acao)); meses
+    # fora da retenção vão para ARQUIVO_DIR (arquivar_historico.py)
+    __table_args__ = (
+        # Histórico de um equipamento, mais recente primeiro
+        db.Index('ix_historico_equipamento_data', 'equipamento_id', db.text('data_acao DESC')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     equipamento_id = db.Column(db.Integer, db.ForeignKey('equipamento.id_interno'), nullable=False)
@@ -92,8 +98,30 @@ class HistoricoEquipamento(db.Model):
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=True)
     ip_address = db.Column(db.String(45), nullable=True)  # Suporte IPv6
 
+class SnapshotEquipamento(db.Model):
+    """Estado completo de um equipamento em um instante (base da reconstrução histórica)"""
+    __tablename__ = 'snapshot_equipamento'
+    __table_args__ = (
+        # Snapshot mais próximo de um instante, por equipamento
+        db.Index('ix_snapshot_equipamento_data', 'equipamento_id', 'data_snapshot'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    equipamento_id = db.Column(db.Integer, db.ForeignKey('equipamento.id_interno'), nullable=False)
+    data_snapshot = db.Column(db.DateTime, nullable=False)  # Estado inclui as alterações até este instante
+    estado = db.Column(db.Text, nullable=False)  # JSON: {campo: valor}
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 class Notificacao(db.Model):
     __tablename__ = 'notificacao'
+    # PostgreSQL: particionada por mês em created_at (chave primária (id, created_at)); meses
+    # fora da retenção vão para ARQUIVO_DIR (arquivar_historico.py)
+    __table_args__ = (
+        # Deduplicação de notificações por (equipamento, usuário)
+        db.Index('ix_notificacao_equipamento_usuario', 'equipamento_id', 'usuario_id'),
+        # Notificações (não lidas) de um usuário por data
+        db.Index('ix_notificacao_usuario_lida', 'usuario_id', 'lida', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
@@ -106,8 +134,29 @@ class Notificacao(db.Model):
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     lida_em = db.Column(db.DateTime, nullable=True)
 
+# Sequência dos IDs públicos (PAT-xxx) no PostgreSQL; criada pelo create_all/migração e
+# alinhada aos IDs existentes por IdPublicoService.sincronizar_sequencia
+SEQUENCIA_ID_PUBLICO = db.Sequence('equipamento_id_publico_seq', metadata=db.metadata)
+
+class ContadorSequencia(db.Model):
+    """Contador com lock de escrita para bancos sem SEQUENCE (SQLite)"""
+    __tablename__ = 'contador_sequencia'
+    
+    nome = db.Column(db.String(50), primary_key=True)
+    valor = db.Column(db.BigInteger, nullable=False, default=0)
+
 class Equipamento(db.Model):
     __tablename__ = 'equipamento'
+    __table_args__ = (
+        # Caminhos de acesso do dashboard, consulta, job de garantias e FKs
+        # (mesmos índices da migração indices_caminhos_acesso)
+        db.Index('ix_equipamento_status', 'status'),
+        db.Index('ix_equipamento_ativo_garantia', 'ativo', 'garantia_ate',
+                 postgresql_where=db.text('garantia_ate IS NOT NULL'),
+                 sqlite_where=db.text('garantia_ate IS NOT NULL')),
+        db.Index('ix_equipamento_categoria_id', 'categoria_id'),
+        db.Index('ix_equipamento_fornecedor_id', 'fornecedor_id'),
+    )
     
     id_interno = db.Column(db.Integer, primary_key=True)
     id_publico = db.Column(db.String(20), unique=True, nullable=False)
@@ -123,7 +172,7 @@ class Equipamento(db.Model):
     valor = db.Column(db.Float, nullable=True, default=0.0)
     valor_residual = db.Column(db.Float, nullable=True, default=0.0)
     vida_util_anos = db.Column(db.Integer, nullable=True, default=5)
-    valor_depreciado = db.Column(db.Float, nullable=True, default=0.0)  # Calculado automaticamente
+    valor_depreciado = db.Column(db.Float, nullable=True, default=0.0)  # Valor contábil, gravado pelo job atualizar_depreciacao.py
     
     # Localização e Responsabilidade
     localizacao = db.Column(db.String(200), nullable=True)
@@ -180,29 +229,36 @@ class Equipamento(db.Model):
     historicos = db.relationship('HistoricoEquipamento', backref='equipamento', lazy=True, cascade='all, delete-orphan')
     manutencoes = db.relationship('ManutencaoProgramada', backref='equipamento', lazy=True, cascade='all, delete-orphan')
     notificacoes = db.relationship('Notificacao', backref='equipamento', lazy=True)
+    snapshots = db.relationship('SnapshotEquipamento', backref='equipamento', lazy=True, cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Equipamento {self.id_publico}: {self.tipo}>'
     
-    def to_dict(self):
-        """Converte o equipamento para dicionário (para API JSON)"""
-        return {
-            'id_interno': self.id_interno,
-            'id_publico': self.id_publico,
-            'tipo': self.tipo,
-            'marca': self.marca,
-            'modelo': self.modelo,
-            'num_serie': self.num_serie,
-            'status': self.status,
-            'localizacao': self.localizacao,
-            'responsavel': self.responsavel,
-            'valor': self.valor,
-            'data_aquisicao': self.data_aquisicao.isoformat() if self.data_aquisicao else None,
-            'garantia_ate': self.garantia_ate.isoformat() if self.garantia_ate else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'categoria': self.categoria_obj.nome if self.categoria_obj else None,
-            'fornecedor': self.fornecedor_obj.nome if self.fornecedor_obj else None
-        }
+    # Campos expostos pela API JSON (e aceitos em sparse fieldsets)
+    CAMPOS_API = (
+        'id_interno', 'id_publico', 'tipo', 'marca', 'modelo', 'num_serie', 'status',
+        'localizacao', 'responsavel', 'valor', 'data_aquisicao', 'garantia_ate',
+        'created_at', 'categoria', 'fornecedor'
+    )
+    
+    def to_dict(self, campos=None):
+        """Converte o equipamento para dicionário (para API JSON)
+        
+        `campos` restringe a saída a um subconjunto de CAMPOS_API; categoria e
+        fornecedor só tocam os relacionamentos quando pedidos.
+        """
+        dados = {}
+        for campo in campos or self.CAMPOS_API:
+            if campo == 'categoria':
+                valor = self.categoria_obj.nome if self.categoria_obj else None
+            elif campo == 'fornecedor':
+                valor = self.fornecedor_obj.nome if self.fornecedor_obj else None
+            else:
+                valor = getattr(self, campo)
+                if isinstance(valor, (date, datetime)):
+                    valor = valor.isoformat()
+            dados[campo] = valor
+        return dados
     
     @property
     def dias_garantia_restante(self):
@@ -229,4 +285,8 @@ class Equipamento(db.Model):
         """Verifica se precisa de manutenção baseado na data"""
         if not self.proxima_manutencao:
             return False
-        return datetime.now().date() >= self.proxima_manutencao
\ No newline at end of file
+        return datetime.now().date() >= self.proxima_manutencao
+
+# Ordem numérica dos IDs públicos (services.IdPublicoService.ORDEM); fora do
+# __table_args__ porque a expressão referencia a coluna (migração ordem_id_publico)
+db.Index('ix_equipamento_id_publico_ordem', db.func.length(Equipamento.id_publico), Equipamento.id_publico)
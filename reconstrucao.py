@@ -0,0 +1,242 @@
+"""
+Reconstrução Histórica de Equipamentos
+Estado de um equipamento em qualquer instante, revertendo os eventos de
+historico_equipamento a partir do snapshot seguinte (ou da linha atual)
+"""
+import json
+import time
+from datetime import datetime, date, timedelta, timezone
+from datetime import time as hora
+from itertools import groupby
+from operator import itemgetter
+from sqlalchemy import insert
+from models import db, Equipamento, HistoricoEquipamento, SnapshotEquipamento
+from arquivamento import ArquivoService
+from logging_config_simple import log_performance_metric
+
+# Campos reconstruídos. imagem_url fica de fora: o histórico só registra
+# 'sem imagem'/'imagem atualizada', não as URLs
+CAMPOS_ESTADO = (
+    'tipo', 'marca', 'modelo', 'num_serie', 'SPE', 'data_aquisicao', 'valor', 'valor_residual',
+    'vida_util_anos', 'localizacao', 'responsavel', 'centro_custo', 'departamento', 'status',
+    'condicao', 'ultima_manutencao', 'proxima_manutencao', 'garantia_ate', 'fornecedor_id',
+    'nota_fiscal', 'categoria_id', 'subcategoria', 'tags', 'codigo_barras', 'rfid_tag',
+    'observacoes', 'ativo', 'bloqueado', 'motivo_bloqueio'
+)
+
+# Máximo de eventos revertidos entre dois snapshots consecutivos
+INTERVALO_SNAPSHOT = 50
+
+TAMANHO_LOTE = 500
+
+class ReconstrucaoService:
+    """Estado de equipamentos no passado (viagem no tempo pelo histórico)"""
+    
+    @staticmethod
+    def extrair_instante(texto):
+        """AAAA-MM-DD (fim do dia) ou data/hora ISO 8601 como datetime UTC sem fuso
+        
+        Levanta ValueError se o texto for inválido.
+        """
+        texto = (texto or '').strip()
+        if len(texto) == 10:
+            return datetime.combine(date.fromisoformat(texto), hora.max)
+        instante = datetime.fromisoformat(texto)
+        if instante.tzinfo:
+            # data_acao é gravado em UTC (datetime.utcnow)
+            instante = instante.astimezone(timezone.utc).replace(tzinfo=None)
+        return instante
+    
+    @staticmethod
+    def _json(valor):
+        return valor.isoformat() if isinstance(valor, (date, datetime)) else valor
+    
+    @staticmethod
+    def estado_atual(equipamento):
+        """Campos de CAMPOS_ESTADO do equipamento como valores JSON"""
+        return {campo: ReconstrucaoService._json(getattr(equipamento, campo)) for campo in CAMPOS_ESTADO}
+    
+    @staticmethod
+    def valor_do_historico(campo, texto):
+        """Converte o texto de valor_anterior/valor_novo para o tipo da coluna (valor JSON)
+        
+        O histórico grava str(valor), ou None quando o valor é None; textos que
+        não convertem (ex.: registros manuais) são mantidos como estão.
+        """
+        if texto is None:
+            return None
+        tipo = Equipamento.__table__.c[campo].type.python_type
+        if texto == '' and tipo is not str:
+            return None
+        try:
+            if tipo is bool:
+                return texto in ('True', 'true', '1')
+            if tipo is int:
+                return int(float(texto))
+            if tipo is float:
+                return float(texto)
+            if tipo is datetime:
+                return datetime.fromisoformat(texto).isoformat()
+            if tipo is date:
+                return date.fromisoformat(texto[:10]).isoformat()
+        except ValueError:
+            pass
+        return texto
+    
+    @staticmethod
+    def _eventos(equipamento_id, apos, ate=None):
+        """(campo, valor_anterior) dos eventos em (apos, ate], do mais recente ao mais antigo
+        
+        Faixa de (equipamento_id, data_acao): índice ix_historico_equipamento_data.
+        Antes do corte do arquivamento, inclui os eventos dos arquivos mensais.
+        """
+        consulta = db.select(
+            HistoricoEquipamento.campo_alterado, HistoricoEquipamento.valor_anterior,
+            HistoricoEquipamento.data_acao, HistoricoEquipamento.id
+        ).where(
+            HistoricoEquipamento.equipamento_id == equipamento_id,
+            HistoricoEquipamento.data_acao > apos,
+            HistoricoEquipamento.campo_alterado.in_(CAMPOS_ESTADO)
+        )
+        if ate is not None:
+            consulta = consulta.where(HistoricoEquipamento.data_acao <= ate)
+        eventos = db.session.execute(consulta).all()
+        
+        corte = ArquivoService.corte('historico_equipamento')
+        if corte and apos < corte:
+            eventos += [
+                (linha['campo_alterado'], linha['valor_anterior'], linha['data_acao'], linha['id'])
+                for linha in ArquivoService.ler(
+                    'historico_equipamento',
+                    ate=ate + timedelta(microseconds=1) if ate is not None else None,
+                    desde=apos,
+                    filtros={'equipamento_id': equipamento_id}
+                )
+                if linha['data_acao'] > apos and linha['campo_alterado'] in CAMPOS_ESTADO
+            ]
+        eventos.sort(key=itemgetter(2, 3), reverse=True)
+        return [(campo, valor_anterior) for campo, valor_anterior, _, _ in eventos]
+    
+    @staticmethod
+    def estado_em(equipamento, instante):
+        """Estado do equipamento no instante (UTC), ou None se ainda não existia
+        
+        Parte do primeiro snapshot no instante ou depois dele (ou da linha atual,
+        se não houver) e reverte os eventos posteriores ao instante, do mais
+        recente para o mais antigo. Com os snapshots de gerar_snapshots, cada
+        consulta reverte no máximo INTERVALO_SNAPSHOT eventos, mais os
+        registrados desde a última execução do job. Alterações feitas sem
+        registro no histórico não são revertidas.
+        """
+        if equipamento.created_at and instante < equipamento.created_at:
+            return None
+        
+        snapshot = db.session.execute(
+            db.select(SnapshotEquipamento.data_snapshot, SnapshotEquipamento.estado)
+            .where(SnapshotEquipamento.equipamento_id == equipamento.id_interno,
+                   SnapshotEquipamento.data_snapshot >= instante)
+            .order_by(SnapshotEquipamento.data_snapshot)
+            .limit(1)
+        ).first()
+        if snapshot:
+            estado = json.loads(snapshot.estado)
+            eventos = ReconstrucaoService._eventos(equipamento.id_interno, instante, snapshot.data_snapshot)
+        else:
+            estado = ReconstrucaoService.estado_atual(equipamento)
+            eventos = ReconstrucaoService._eventos(equipamento.id_interno, instante)
+        
+        for campo, valor_anterior in eventos:
+            estado[campo] = ReconstrucaoService.valor_do_historico(campo, valor_anterior)
+        
+        return {
+            'estado': estado,
+            'base': 'snapshot' if snapshot else 'atual',
+            'base_em': snapshot.data_snapshot.isoformat() if snapshot else None,
+            'eventos_revertidos': len(eventos)
+        }
+    
+    @staticmethod
+    def _snapshots_do_equipamento(equipamento, eventos, intervalo, agora):
+        """Percorre os eventos (mais recente primeiro) a partir da linha atual e
+        monta um snapshot a cada `intervalo` eventos revertidos"""
+        estado = ReconstrucaoService.estado_atual(equipamento)
+        registros = []
+        revertidos = 0
+        for posicao, (campo, valor_anterior, data_acao) in enumerate(eventos):
+            estado[campo] = ReconstrucaoService.valor_do_historico(campo, valor_anterior)
+            revertidos += 1
+            anterior = eventos[posicao + 1][2] if posicao + 1 < len(eventos) else None
+            # Só corta entre instantes distintos (alterações de uma mesma edição têm o
+            # mesmo data_acao); o snapshot fica no instante do evento seguinte, que
+            # ainda não foi revertido e portanto já está incluído no estado
+            if revertidos >= intervalo and anterior is not None and anterior < data_acao:
+                registros.append({
+                    'equipamento_id': equipamento.id_interno,
+                    'data_snapshot': anterior,
+                    'estado': json.dumps(estado, ensure_ascii=False),
+                    'created_at': agora
+                })
+                revertidos = 0
+        return registros
+    
+    @staticmethod
+    def gerar_snapshots(intervalo=INTERVALO_SNAPSHOT, tamanho_lote=TAMANHO_LOTE):
+        """Grava snapshots para os equipamentos com mais de `intervalo` eventos
+        desde o último snapshot (job periódico)
+        
+        Retorna {'equipamentos', 'snapshots', 'segundos'}.
+        """
+        inicio = time.perf_counter()
+        agora = datetime.utcnow()
+        
+        ultimo = db.select(
+            SnapshotEquipamento.equipamento_id,
+            db.func.max(SnapshotEquipamento.data_snapshot).label('data')
+        ).group_by(SnapshotEquipamento.equipamento_id).subquery()
+        pendentes_desde_ultimo = db.and_(
+            HistoricoEquipamento.campo_alterado.in_(CAMPOS_ESTADO),
+            db.or_(ultimo.c.data.is_(None), HistoricoEquipamento.data_acao > ultimo.c.data)
+        )
+        
+        pendentes = db.session.execute(
+            db.select(HistoricoEquipamento.equipamento_id)
+            .outerjoin(ultimo, ultimo.c.equipamento_id == HistoricoEquipamento.equipamento_id)
+            .where(pendentes_desde_ultimo)
+            .group_by(HistoricoEquipamento.equipamento_id)
+            .having(db.func.count() > intervalo)
+        ).scalars().all()
+        
+        criados = 0
+        for i in range(0, len(pendentes), tamanho_lote):
+            ids = pendentes[i:i + tamanho_lote]
+            equipamentos = {
+                eq.id_interno: eq for eq in Equipamento.query.filter(Equipamento.id_interno.in_(ids))
+            }
+            eventos = db.session.execute(
+                db.select(HistoricoEquipamento.equipamento_id, HistoricoEquipamento.campo_alterado,
+                          HistoricoEquipamento.valor_anterior, HistoricoEquipamento.data_acao)
+                .outerjoin(ultimo, ultimo.c.equipamento_id == HistoricoEquipamento.equipamento_id)
+                .where(HistoricoEquipamento.equipamento_id.in_(ids), pendentes_desde_ultimo)
+                .order_by(HistoricoEquipamento.equipamento_id,
+                          HistoricoEquipamento.data_acao.desc(), HistoricoEquipamento.id.desc())
+            ).all()
+            
+            registros = []
+            for equipamento_id, linhas in groupby(eventos, key=itemgetter(0)):
+                # Histórico de equipamento já excluído: não há estado atual de onde partir
+                if equipamento_id in equipamentos:
+                    registros.extend(ReconstrucaoService._snapshots_do_equipamento(
+                        equipamentos[equipamento_id], [linha[1:] for linha in linhas], intervalo, agora
+                    ))
+            if registros:
+                db.session.execute(insert(SnapshotEquipamento.__table__), registros)
+            db.session.commit()
+            criados += len(registros)
+        
+        resultado = {
+            'equipamentos': len(pendentes),
+            'snapshots': criados,
+            'segundos': round(time.perf_counter() - inicio, 3)
+        }
+        log_performance_metric('snapshots_equipamento_segundos', resultado['segundos'], resultado)
+        return resultado
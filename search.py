@@ -0,0 +1,112 @@
+"""
+Subsistema de Busca Textual
+Índice trigram (PostgreSQL/pg_trgm) ou FTS5 (SQLite) com ranking por relevância
+"""
+from sqlalchemy import text
+from models import db, Equipamento
+from utils import escapar_like
+
+# Colunas cobertas pelo índice de busca (mesma ordem da migração indice_busca_textual)
+COLUNAS_BUSCA = ('id_publico', 'tipo', 'marca', 'localizacao', 'responsavel')
+
+# Tabela FTS5 espelho de equipamento no SQLite
+TABELA_FTS = 'equipamento_fts'
+
+# Trigramas só ajudam a partir de 3 caracteres; abaixo disso a busca é por LIKE
+TAMANHO_MINIMO_INDICE = 3
+
+class SearchIndex:
+    """Busca textual de equipamentos com detecção do índice disponível no banco"""
+    
+    def __init__(self):
+        self._backends = {}
+    
+    def backend(self):
+        """Retorna 'trgm', 'fts5' ou 'like' conforme o índice disponível no banco atual"""
+        engine = db.engine
+        chave = str(engine.url)
+        if chave not in self._backends:
+            self._backends[chave] = self._detectar(engine)
+        return self._backends[chave]
+    
+    def invalidar(self):
+        """Descarta a detecção em cache (usar após aplicar/reverter a migração)"""
+        self._backends.clear()
+    
+    @staticmethod
+    def _detectar(engine):
+        """Verifica se a migração de índices de busca foi aplicada"""
+        try:
+            with engine.connect() as conn:
+                if engine.dialect.name == 'postgresql':
+                    existe = conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first()
+                    return 'trgm' if existe else 'like'
+                if engine.dialect.name == 'sqlite':
+                    existe = conn.execute(
+                        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nome"),
+                        {'nome': TABELA_FTS}
+                    ).first()
+                    return 'fts5' if existe else 'like'
+        except Exception:
+            pass
+        return 'like'
+    
+    @staticmethod
+    def _consulta_fts(termo):
+        """Termo como frase FTS5: com tokenizer trigram equivale a um LIKE '%termo%' por coluna"""
+        return '"' + termo.replace('"', '""') + '"'
+    
+    def _usa_fts(self, termo):
+        return self.backend() == 'fts5' and len(termo) >= TAMANHO_MINIMO_INDICE
+    
+    def condicao(self, termo):
+        """Expressão de filtro para Equipamento que casa o termo em qualquer coluna indexada"""
+        if self._usa_fts(termo):
+            ids = text(f"SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH :termo_fts")
+            ids = ids.bindparams(termo_fts=self._consulta_fts(termo)).columns(rowid=db.Integer)
+            return Equipamento.id_interno.in_(ids)
+        
+        # No PostgreSQL com pg_trgm, o ILIKE é resolvido pelos índices GIN gin_trgm_ops
+        padrao = f"%{escapar_like(termo)}%"
+        return db.or_(*[getattr(Equipamento, coluna).ilike(padrao, escape='\\') for coluna in COLUNAS_BUSCA])
+    
+    def buscar(self, termo, limite=10):
+        """Retorna até `limite` equipamentos ordenados por relevância"""
+        termo = (termo or '').strip()
+        if not termo:
+            return []
+        
+        if self._usa_fts(termo):
+            linhas = db.session.execute(
+                text(f"SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH :termo_fts "
+                     f"ORDER BY bm25({TABELA_FTS}) LIMIT :limite"),
+                {'termo_fts': self._consulta_fts(termo), 'limite': limite}
+            ).all()
+            ordem = [linha[0] for linha in linhas]
+            if not ordem:
+                return []
+            por_id = {eq.id_interno: eq for eq in Equipamento.query.filter(Equipamento.id_interno.in_(ordem))}
+            return [por_id[i] for i in ordem if i in por_id]
+        
+        query = Equipamento.query.filter(self.condicao(termo))
+        if self.backend() == 'trgm':
+            relevancia = db.func.greatest(*[
+                db.func.word_similarity(termo, db.func.coalesce(getattr(Equipamento, coluna), ''))
+                for coluna in COLUNAS_BUSCA
+            ])
+            query = query.order_by(relevancia.desc(), Equipamento.id_publico)
+        else:
+            # Sem índice: aproximação portátil (ID exato, depois prefixo, depois o resto)
+            prefixo = f"{escapar_like(termo)}%"
+            relevancia = db.case(
+                (db.func.lower(Equipamento.id_publico) == termo.lower(), 0),
+                (Equipamento.id_publico.ilike(prefixo, escape='\\'), 1),
+                (Equipamento.tipo.ilike(prefixo, escape='\\'), 2),
+                else_=3
+            )
+            query = query.order_by(relevancia, Equipamento.id_publico)
+        
+        return query.limit(limite).all()
+
+# Instância global
+search_index = SearchIndex()
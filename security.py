@@ -2,48 +2,168 @@
 Middleware de Segurança Avançado
 Rate Limiting, Validações e Headers de Segurança
 """
+import os
 import time
+import sqlite3
 import hashlib
+import threading
 from functools import wraps
-from collections import defaultdict, deque
-from datetime import datetime, timedelta
 from flask import request, jsonify, abort, current_app, g
 from flask_login import current_user
 
+def _janela_deslizante(estado, limite, janela, bloqueio, agora):
+    """Algoritmo de janela deslizante aproximada (O(1) de memória por identificador)
+    
+    `estado` é (inicio_janela, contagem_atual, contagem_anterior, bloqueado_ate)
+    ou None. A contagem estimada é a atual somada à anterior ponderada pela
+    fração da janela anterior que ainda cabe na janela deslizante.
+    Retorna (permitido, novo_estado, excedeu_agora).
+    """
+    inicio, atual, anterior, bloqueado_ate = estado or (agora, 0, 0, 0.0)
+    
+    if bloqueado_ate and agora < bloqueado_ate:
+        return False, (inicio, atual, anterior, bloqueado_ate), False
+    
+    # Avançar a janela fixa: uma janela passada vira "anterior"; mais de uma zera tudo
+    decorrido = agora - inicio
+    if decorrido >= 2 * janela:
+        inicio, atual, anterior = agora, 0, 0
+    elif decorrido >= janela:
+        inicio, atual, anterior = inicio + janela, 0, atual
+    
+    peso_anterior = 1 - (agora - inicio) / janela
+    if atual + anterior * peso_anterior >= limite:
+        return False, (inicio, atual, anterior, agora + bloqueio), True
+    
+    return True, (inicio, atual + 1, anterior, 0.0), False
+
+class MemoriaRateLimitBackend:
+    """Estado do rate limiter em memória do processo (um worker), thread-safe
+    
+    Identificadores ociosos são descartados periodicamente.
+    """
+    
+    def __init__(self, intervalo_limpeza=60):
+        self.intervalo_limpeza = intervalo_limpeza
+        self._estados = {}
+        self._expira = {}
+        self._lock = threading.Lock()
+        self._proxima_limpeza = time.time() + intervalo_limpeza
+    
+    def registrar(self, chave, limite, janela, bloqueio, agora):
+        with self._lock:
+            if agora >= self._proxima_limpeza:
+                self._limpar(agora)
+            permitido, estado, excedeu = _janela_deslizante(self._estados.get(chave), limite, janela, bloqueio, agora)
+            self._estados[chave] = estado
+            self._expira[chave] = max(estado[0] + 2 * janela, estado[3])
+            return permitido, excedeu
+    
+    def _limpar(self, agora):
+        for chave in [c for c, expira in self._expira.items() if expira <= agora]:
+            del self._estados[chave]
+            del self._expira[chave]
+        self._proxima_limpeza = agora + self.intervalo_limpeza
+    
+    def __len__(self):
+        return len(self._estados)
+
+class SQLiteRateLimitBackend:
+    """Estado do rate limiter em um arquivo SQLite (WAL) compartilhado pelos workers do nó
+    
+    Cada verificação é uma transação BEGIN IMMEDIATE curta (leitura + upsert de
+    uma linha), então os limites valem para todos os processos que usam o arquivo.
+    """
+    
+    def __init__(self, caminho, intervalo_limpeza=60):
+        self.caminho = caminho
+        self.intervalo_limpeza = intervalo_limpeza
+        self._local = threading.local()
+        self._proxima_limpeza = 0.0
+    
+    def _conexao(self):
+        # Uma conexão por thread e por processo (não reaproveitar após fork)
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid():
+            conexao = sqlite3.connect(self.caminho, timeout=5, isolation_level=None, check_same_thread=False)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('PRAGMA synchronous=NORMAL')
+            conexao.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limit (
+                    chave TEXT PRIMARY KEY,
+                    inicio REAL NOT NULL,
+                    atual INTEGER NOT NULL,
+                    anterior INTEGER NOT NULL,
+                    bloqueado_ate REAL NOT NULL,
+                    expira REAL NOT NULL
+                )
+            """)
+            conexao.execute('CREATE INDEX IF NOT EXISTS ix_rate_limit_expira ON rate_limit (expira)')
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+    
+    def registrar(self, chave, limite, janela, bloqueio, agora):
+        conexao = self._conexao()
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            if agora >= self._proxima_limpeza:
+                conexao.execute('DELETE FROM rate_limit WHERE expira <= ?', (agora,))
+                self._proxima_limpeza = agora + self.intervalo_limpeza
+            
+            estado = conexao.execute(
+                'SELECT inicio, atual, anterior, bloqueado_ate FROM rate_limit WHERE chave = ?', (chave,)
+            ).fetchone()
+            permitido, estado, excedeu = _janela_deslizante(estado, limite, janela, bloqueio, agora)
+            conexao.execute(
+                'INSERT OR REPLACE INTO rate_limit (chave, inicio, atual, anterior, bloqueado_ate, expira) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (chave, *estado, max(estado[0] + 2 * janela, estado[3]))
+            )
+            conexao.execute('COMMIT')
+        except Exception:
+            conexao.execute('ROLLBACK')
+            raise
+        return permitido, excedeu
+    
+    def __len__(self):
+        return self._conexao().execute('SELECT COUNT(*) FROM rate_limit').fetchone()[0]
+
 class RateLimiter:
-    """Rate limiter baseado em IP e usuário"""
+    """Rate limiter baseado em IP e usuário
     
-    def __init__(self):
-        self.requests = defaultdict(deque)
-        self.blocked_ips = {}
+    O algoritmo é de janela deslizante aproximada; o estado fica no backend
+    configurado (RATE_LIMIT_STORAGE): 'memoria' (padrão, por processo) ou
+    'sqlite:///caminho/arquivo.db' (compartilhado entre os workers do nó).
+    """
     
-    def is_allowed(self, identifier, max_requests=60, window_minutes=1):
-        """Verificar se a requisição está dentro do limite"""
-        now = datetime.now()
-        window = timedelta(minutes=window_minutes)
-        
-        # Limpar requisições antigas
-        cutoff = now - window
-        while self.requests[identifier] and self.requests[identifier][0] < cutoff:
-            self.requests[identifier].popleft()
-        
-        # Verificar se está bloqueado
-        if identifier in self.blocked_ips:
-            if now < self.blocked_ips[identifier]:
-                return False
-            else:
-                del self.blocked_ips[identifier]
-        
-        # Verificar limite
-        if len(self.requests[identifier]) >= max_requests:
-            # Bloquear por 15 minutos
-            self.blocked_ips[identifier] = now + timedelta(minutes=15)
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else MemoriaRateLimitBackend()
+    
+    def init_app(self, app):
+        """Escolhe o backend pela configuração RATE_LIMIT_STORAGE"""
+        self.backend = criar_backend_rate_limit(app.config.get('RATE_LIMIT_STORAGE') or 'memoria')
+    
+    def is_allowed(self, identifier, max_requests=60, window_minutes=1, block_minutes=15):
+        """Verificar se a requisição está dentro do limite (excedido: bloqueia por `block_minutes`)"""
+        permitido, excedeu = self.backend.registrar(
+            identifier, max_requests, window_minutes * 60, block_minutes * 60, time.time()
+        )
+        if excedeu:
             current_app.logger.warning(f"Rate limit exceeded for {identifier}")
-            return False
-        
-        # Registrar requisição
-        self.requests[identifier].append(now)
-        return True
+        return permitido
+
+def criar_backend_rate_limit(storage):
+    """Backend de rate limit a partir de 'memoria' ou 'sqlite:///caminho'"""
+    if storage == 'memoria':
+        return MemoriaRateLimitBackend()
+    if storage.startswith('sqlite:///'):
+        caminho = storage[len('sqlite:///'):]
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        return SQLiteRateLimitBackend(caminho)
+    raise ValueError(f"RATE_LIMIT_STORAGE inválido: {storage}")
 
 class SecurityValidator:
     """Validador de entrada e segurança"""
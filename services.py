@@ -3,13 +3,22 @@ Serviços de negócio do Sistema de Controle de Patrimônio
 Lógica de negócio separada das views
 """
 import os
-import qrcode
+import csv
+import time
 import base64
-from io import BytesIO
+from io import BytesIO, StringIO
+from itertools import islice
 from datetime import datetime, timedelta
-from flask import request, current_app
+from flask import request, current_app, has_request_context
 from flask_login import current_user
-from models import db, Equipamento, Categoria, Fornecedor, HistoricoEquipamento, Notificacao, Usuario
+from sqlalchemy import text, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from models import db, Equipamento, Categoria, Fornecedor, HistoricoEquipamento, Notificacao, Usuario, ContadorSequencia, SEQUENCIA_ID_PUBLICO
+from utils import codificar_cursor, decodificar_cursor, escapar_like
+from search import search_index
+from arquivamento import ArquivoService
+from logging_config_simple import log_performance_metric
 
 class EquipamentoService:
     """Serviços relacionados aos equipamentos"""
@@ -17,13 +26,13 @@ class EquipamentoService:
     @staticmethod
     def gerar_id_publico():
         """Gera um novo ID público para equipamento"""
-        ultimo = Equipamento.query.order_by(Equipamento.id_interno.desc()).first()
-        novo_id = 1 if not ultimo else ultimo.id_interno + 1
-        return f"PAT-{novo_id:03d}"
+        return IdPublicoService.reservar(1)[0]
     
     @staticmethod
     def gerar_qr_code(equipamento_id):
         """Gera QR Code para o equipamento"""
+        import qrcode
+        
         qr_data = {
             'id': equipamento_id,
             'url': f"{request.host_url}equipamento/{equipamento_id}",
@@ -41,6 +50,39 @@ class EquipamentoService:
         
         return f"data:image/png;base64,{qr_code_b64}"
     
+    @staticmethod
+    def extrair_campos(parametro):
+        """Lê um sparse fieldset ('id_publico,tipo,...'); None = todos os campos"""
+        if not parametro:
+            return None
+        campos = tuple(c.strip() for c in parametro.split(',') if c.strip())
+        invalidos = [c for c in campos if c not in Equipamento.CAMPOS_API]
+        if invalidos:
+            raise ValueError(f"Campos inválidos: {', '.join(invalidos)}")
+        return campos or None
+    
+    @staticmethod
+    def serializar_lista(equipamentos, campos=None):
+        """Serializa uma lista de equipamentos com número fixo de consultas
+        
+        Categorias e fornecedores referenciados são carregados em uma consulta
+        IN cada; os relacionamentos many-to-one passam a ser resolvidos pelo
+        identity map da sessão, sem uma consulta por equipamento.
+        """
+        campos = campos or Equipamento.CAMPOS_API
+        referencias = []
+        if 'categoria' in campos:
+            ids = {eq.categoria_id for eq in equipamentos if eq.categoria_id}
+            if ids:
+                referencias += Categoria.query.filter(Categoria.id.in_(ids)).all()
+        if 'fornecedor' in campos:
+            ids = {eq.fornecedor_id for eq in equipamentos if eq.fornecedor_id}
+            if ids:
+                referencias += Fornecedor.query.filter(Fornecedor.id.in_(ids)).all()
+        
+        # `referencias` mantém os objetos vivos no identity map durante a serialização
+        return [eq.to_dict(campos) for eq in equipamentos]
+    
     @staticmethod
     def criar_equipamento(dados_formulario):
         """Cria um novo equipamento com todos os dados"""
@@ -105,23 +147,354 @@ class EquipamentoService:
             db.session.rollback()
             return None, str(e)
 
+class IdPublicoService:
+    """Alocação concorrente de IDs públicos (PAT-xxx)
+    
+    PostgreSQL usa uma SEQUENCE; os demais bancos usam a linha 'id_publico' de
+    contador_sequencia, incrementada sob lock de escrita. Em ambos os casos um
+    bloco de N IDs é reservado em uma única ida ao banco.
+    """
+    
+    PREFIXO = 'PAT-'
+    NOME_CONTADOR = 'id_publico'
+    
+    # Ordem numérica (PAT-999 antes de PAT-1000): comprimento e depois texto,
+    # equivalente ao número para IDs com o mesmo prefixo. Índice ix_equipamento_id_publico_ordem
+    ORDEM = (db.func.length(Equipamento.id_publico), Equipamento.id_publico)
+    
+    # Sequência já conferida contra os IDs existentes neste processo (PostgreSQL)
+    _sequencia_sincronizada = False
+    
+    @staticmethod
+    def formatar(numero):
+        """Formata o número como ID público"""
+        return f"{IdPublicoService.PREFIXO}{numero:03d}"
+    
+    @staticmethod
+    def numero(id_publico):
+        """Chave numérica de ordenação de um ID público (None se fora do padrão)"""
+        if not id_publico or not id_publico.startswith(IdPublicoService.PREFIXO):
+            return None
+        sufixo = id_publico[len(IdPublicoService.PREFIXO):]
+        return int(sufixo) if sufixo.isdigit() else None
+    
+    @staticmethod
+    def chave_ordem(id_publico):
+        """Valores de ORDEM para um ID público (ex.: posição de um cursor)"""
+        return (len(id_publico), id_publico)
+    
+    @staticmethod
+    def reservar(quantidade=1):
+        """Reserva `quantidade` IDs públicos únicos, em ordem crescente"""
+        if quantidade < 1:
+            return []
+        
+        if db.engine.dialect.name == 'postgresql':
+            if not IdPublicoService._sequencia_sincronizada:
+                IdPublicoService.sincronizar_sequencia()
+            numeros = db.session.execute(
+                text("SELECT nextval(:sequencia) FROM generate_series(1, :quantidade)"),
+                {'sequencia': SEQUENCIA_ID_PUBLICO.name, 'quantidade': quantidade}
+            ).scalars().all()
+        else:
+            ultimo = IdPublicoService._incrementar_contador(quantidade)
+            numeros = range(ultimo - quantidade + 1, ultimo + 1)
+        
+        return [IdPublicoService.formatar(n) for n in sorted(numeros)]
+    
+    @staticmethod
+    def sincronizar_sequencia():
+        """PostgreSQL: avança a sequência até o maior número já usado
+        
+        Bancos criados pelo create_all (sem a migração sequencia_id_publico)
+        têm a sequência começando em 1; sem isso o próximo ID colidiria com
+        PAT-001. Só avança, nunca volta. Roda no inicializar_banco e na
+        primeira reserva de cada processo.
+        """
+        if db.engine.dialect.name != 'postgresql':
+            return
+        
+        # Serializa as sincronizações de processos que sobem juntos
+        db.session.execute(text("SELECT pg_advisory_xact_lock(hashtext(:sequencia))"),
+                           {'sequencia': SEQUENCIA_ID_PUBLICO.name})
+        maior = db.session.execute(text("""
+            SELECT GREATEST(
+                COALESCE((SELECT MAX(id_interno) FROM equipamento), 0),
+                COALESCE((SELECT MAX(CAST(SUBSTRING(id_publico FROM '^PAT-([0-9]+)$') AS BIGINT))
+                          FROM equipamento), 0)
+            )
+        """)).scalar()
+        ultimo, usado = db.session.execute(
+            text(f"SELECT last_value, is_called FROM {SEQUENCIA_ID_PUBLICO.name}")
+        ).one()
+        if maior > (ultimo if usado else ultimo - 1):
+            db.session.execute(text("SELECT setval(:sequencia, :valor)"),
+                               {'sequencia': SEQUENCIA_ID_PUBLICO.name, 'valor': maior})
+        IdPublicoService._sequencia_sincronizada = True
+    
+    @staticmethod
+    def _incrementar_contador(quantidade):
+        """Soma `quantidade` ao contador e retorna o novo valor (na transação corrente)"""
+        tabela = ContadorSequencia.__table__
+        atualizar = tabela.update().where(
+            tabela.c.nome == IdPublicoService.NOME_CONTADOR
+        ).values(valor=tabela.c.valor + quantidade)
+        
+        for _ in range(2):
+            if db.engine.dialect.name == 'sqlite':
+                # UPDATE ... RETURNING: o lock de escrita serializa alocações concorrentes
+                valor = db.session.execute(atualizar.returning(tabela.c.valor)).scalar()
+            else:
+                atual = db.session.execute(
+                    db.select(tabela.c.valor).where(
+                        tabela.c.nome == IdPublicoService.NOME_CONTADOR
+                    ).with_for_update()
+                ).scalar()
+                valor = None
+                if atual is not None:
+                    db.session.execute(atualizar)
+                    valor = atual + quantidade
+            if valor is not None:
+                return valor
+            IdPublicoService._criar_contador()
+        
+        raise RuntimeError("Contador de IDs públicos indisponível")
+    
+    @staticmethod
+    def _criar_contador():
+        """Cria o contador a partir do maior ID já existente (executado uma única vez)"""
+        maior = db.session.query(db.func.max(Equipamento.id_interno)).scalar() or 0
+        existentes = db.session.query(Equipamento.id_publico).filter(
+            Equipamento.id_publico.like(f"{IdPublicoService.PREFIXO}%")
+        ).execution_options(yield_per=1000)
+        for (id_publico,) in existentes:
+            numero = IdPublicoService.numero(id_publico)
+            if numero and numero > maior:
+                maior = numero
+        
+        try:
+            with db.session.begin_nested():
+                db.session.add(ContadorSequencia(nome=IdPublicoService.NOME_CONTADOR, valor=maior))
+        except IntegrityError:
+            # Outro processo criou o contador primeiro
+            pass
+
+class ConsultaService:
+    """Serviços de consulta paginada de equipamentos"""
+    
+    POR_PAGINA_PADRAO = 50
+    POR_PAGINA_MAXIMO = 200
+    
+    # Apenas chaves únicas e indexadas: a paginação por cursor depende disso.
+    # id_publico ordena pelo número do ID (IdPublicoService.ORDEM)
+    ORDENACOES = {
+        'id_publico': (Equipamento.id_publico, False),
+        'id_publico_desc': (Equipamento.id_publico, True),
+        'recentes': (Equipamento.id_interno, True),
+        'antigos': (Equipamento.id_interno, False),
+    }
+    
+    FILTROS_TEXTO = ('busca', 'status', 'categoria', 'localizacao', 'centro_custo')
+    FILTROS_DATA = ('aquisicao_de', 'aquisicao_ate', 'garantia_de', 'garantia_ate')
+    
+    @staticmethod
+    def extrair_filtros(parametros):
+        """Extrai os filtros da requisição (levanta ValueError se algum for inválido)"""
+        filtros = {}
+        for campo in ConsultaService.FILTROS_TEXTO:
+            valor = (parametros.get(campo) or '').strip()
+            if valor:
+                filtros[campo] = valor
+        
+        if 'categoria' in filtros:
+            try:
+                filtros['categoria'] = int(filtros['categoria'])
+            except ValueError:
+                raise ValueError("Categoria inválida")
+        
+        for campo in ConsultaService.FILTROS_DATA:
+            valor = (parametros.get(campo) or '').strip()
+            if valor:
+                try:
+                    filtros[campo] = datetime.strptime(valor, '%Y-%m-%d').date()
+                except ValueError:
+                    raise ValueError(f"Data inválida em '{campo}' (use AAAA-MM-DD)")
+        
+        return filtros
+    
+    @staticmethod
+    def _prefixo(valor):
+        """Monta um padrão LIKE de prefixo escapando curingas digitados pelo usuário"""
+        return f"{escapar_like(valor)}%"
+    
+    @staticmethod
+    def aplicar_filtros(query, filtros):
+        """Aplica os filtros de consulta a uma query de Equipamento"""
+        if filtros.get('busca'):
+            query = query.filter(search_index.condicao(filtros['busca']))
+        
+        if filtros.get('status'):
+            query = query.filter(Equipamento.status == filtros['status'])
+        if filtros.get('categoria'):
+            query = query.filter(Equipamento.categoria_id == filtros['categoria'])
+        if filtros.get('localizacao'):
+            query = query.filter(Equipamento.localizacao.ilike(ConsultaService._prefixo(filtros['localizacao']), escape='\\'))
+        if filtros.get('centro_custo'):
+            query = query.filter(Equipamento.centro_custo.ilike(ConsultaService._prefixo(filtros['centro_custo']), escape='\\'))
+        
+        if filtros.get('aquisicao_de'):
+            query = query.filter(Equipamento.data_aquisicao >= filtros['aquisicao_de'])
+        if filtros.get('aquisicao_ate'):
+            query = query.filter(Equipamento.data_aquisicao <= filtros['aquisicao_ate'])
+        if filtros.get('garantia_de'):
+            query = query.filter(Equipamento.garantia_ate >= filtros['garantia_de'])
+        if filtros.get('garantia_ate'):
+            query = query.filter(Equipamento.garantia_ate <= filtros['garantia_ate'])
+        
+        return query
+    
+    @staticmethod
+    def paginar(filtros, ordenacao='id_publico', cursor=None, por_pagina=None):
+        """Retorna uma página de equipamentos usando paginação por cursor (keyset)
+        
+        O custo de cada página é constante: em vez de OFFSET, o cursor guarda o
+        último valor da chave de ordenação e a próxima página começa a partir dele.
+        """
+        if ordenacao not in ConsultaService.ORDENACOES:
+            ordenacao = 'id_publico'
+        coluna, descendente = ConsultaService.ORDENACOES[ordenacao]
+        
+        try:
+            por_pagina = int(por_pagina or ConsultaService.POR_PAGINA_PADRAO)
+        except (TypeError, ValueError):
+            por_pagina = ConsultaService.POR_PAGINA_PADRAO
+        por_pagina = max(1, min(por_pagina, ConsultaService.POR_PAGINA_MAXIMO))
+        
+        query = ConsultaService.aplicar_filtros(Equipamento.query, filtros)
+        
+        # Cursor inválido ou de outra ordenação é ignorado (volta para a primeira página)
+        posicao = decodificar_cursor(cursor)
+        if not isinstance(posicao, dict) or posicao.get('o') != ordenacao or 'k' not in posicao:
+            posicao = None
+        elif type(posicao['k']) is not coluna.type.python_type:
+            # A chave precisa ser do tipo da coluna (ex.: texto em id_publico, inteiro em id_interno)
+            posicao = None
+        
+        if coluna is Equipamento.id_publico:
+            expressoes, chave_ordem = IdPublicoService.ORDEM, IdPublicoService.chave_ordem
+        else:
+            expressoes, chave_ordem = (coluna,), lambda valor: (valor,)
+        
+        voltando = bool(posicao and posicao.get('d') == 'ant')
+        ordem_desc = descendente != voltando
+        if posicao:
+            atual, chave = db.tuple_(*expressoes), db.tuple_(*chave_ordem(posicao['k']))
+            query = query.filter(atual < chave if ordem_desc else atual > chave)
+        query = query.order_by(*[e.desc() if ordem_desc else e.asc() for e in expressoes])
+        
+        itens = query.limit(por_pagina + 1).all()
+        tem_mais = len(itens) > por_pagina
+        itens = itens[:por_pagina]
+        if voltando:
+            itens.reverse()
+        
+        tem_proxima = True if voltando else tem_mais
+        tem_anterior = tem_mais if voltando else posicao is not None
+        
+        proximo_cursor = None
+        cursor_anterior = None
+        if itens and tem_proxima:
+            proximo_cursor = codificar_cursor({'o': ordenacao, 'k': getattr(itens[-1], coluna.key), 'd': 'prox'})
+        if itens and tem_anterior:
+            cursor_anterior = codificar_cursor({'o': ordenacao, 'k': getattr(itens[0], coluna.key), 'd': 'ant'})
+        
+        return {
+            'itens': itens,
+            'ordenacao': ordenacao,
+            'por_pagina': por_pagina,
+            'proximo_cursor': proximo_cursor,
+            'cursor_anterior': cursor_anterior
+        }
+
 class HistoricoService:
     """Serviços relacionados ao histórico"""
     
+    POR_PAGINA_PADRAO = 50
+    POR_PAGINA_MAXIMO = 200
+    
+    FILTROS = ('acao', 'campo_alterado', 'usuario')
+    
+    @staticmethod
+    def _contexto_requisicao():
+        """Usuário e IP da requisição atual (None fora de requisições, ex.: CLI)"""
+        if not has_request_context():
+            return None, None
+        usuario_id = current_user.id if current_user.is_authenticated else None
+        return usuario_id, request.remote_addr
+    
+    @staticmethod
+    def montar_registro(equipamento_id, acao, descricao, campo_alterado=None, valor_anterior=None,
+                        valor_novo=None, usuario_id=None, ip_address=None, data_acao=None):
+        """Monta os valores de uma linha de histórico (para registrar_lote)
+        
+        Sem usuario_id/ip_address explícitos, usa os da requisição atual.
+        """
+        if usuario_id is None and ip_address is None:
+            usuario_id, ip_address = HistoricoService._contexto_requisicao()
+        return {
+            'equipamento_id': equipamento_id,
+            'acao': acao,
+            'descricao': descricao,
+            'campo_alterado': campo_alterado,
+            # Só None vira NULL: 0, 0.0, '' e False são valores reais
+            'valor_anterior': None if valor_anterior is None else str(valor_anterior),
+            'valor_novo': None if valor_novo is None else str(valor_novo),
+            'data_acao': data_acao or datetime.utcnow(),
+            'usuario_id': usuario_id,
+            'ip_address': ip_address
+        }
+    
+    @staticmethod
+    def registrar_lote(registros):
+        """Insere várias linhas de histórico em um único INSERT
+        
+        Não faz commit: as linhas entram na transação do chamador, junto com a
+        alteração que estão auditando.
+        """
+        if registros:
+            # Insert de Core (não o bulk do ORM, que separa as linhas por colunas nulas)
+            db.session.execute(insert(HistoricoEquipamento.__table__), list(registros))
+    
+    @staticmethod
+    def registrar_alteracoes(equipamento_id, alteracoes, acao='Editado'):
+        """Registra um conjunto de alterações de campo ({'campo', 'antigo', 'novo'}) sem commit"""
+        usuario_id, ip_address = HistoricoService._contexto_requisicao()
+        agora = datetime.utcnow()
+        HistoricoService.registrar_lote([
+            HistoricoService.montar_registro(
+                equipamento_id,
+                acao,
+                f"Campo '{alteracao['campo']}' alterado de '{alteracao['antigo']}' para '{alteracao['novo']}'",
+                campo_alterado=alteracao['campo'],
+                valor_anterior=alteracao['antigo'],
+                valor_novo=alteracao['novo'],
+                usuario_id=usuario_id,
+                ip_address=ip_address,
+                data_acao=agora
+            )
+            for alteracao in alteracoes
+        ])
+    
     @staticmethod
     def registrar_acao(equipamento_id, acao, descricao, campo_alterado=None, valor_anterior=None, valor_novo=None):
         """Registra uma ação no histórico do equipamento"""
         try:
-            historico = HistoricoEquipamento(
-                equipamento_id=equipamento_id,
-                acao=acao,
-                descricao=descricao,
+            historico = HistoricoEquipamento(**HistoricoService.montar_registro(
+                equipamento_id, acao, descricao,
                 campo_alterado=campo_alterado,
-                valor_anterior=str(valor_anterior) if valor_anterior else None,
-                valor_novo=str(valor_novo) if valor_novo else None,
-                usuario_id=current_user.id if current_user.is_authenticated else None,
-                ip_address=request.remote_addr if request else None
-            )
+                valor_anterior=valor_anterior,
+                valor_novo=valor_novo
+            ))
             db.session.add(historico)
             db.session.commit()
             return True
@@ -129,6 +502,120 @@ class HistoricoService:
             current_app.logger.error(f"Erro ao registrar histórico: {e}")
             db.session.rollback()
             return False
+    
+    @staticmethod
+    def extrair_filtros(parametros):
+        """Filtros da linha do tempo (acao, campo_alterado, usuario) presentes na requisição"""
+        filtros = {}
+        for campo in HistoricoService.FILTROS:
+            valor = (parametros.get(campo) or '').strip()
+            if valor:
+                filtros[campo] = valor
+        return filtros
+    
+    @staticmethod
+    def linha_do_tempo(equipamento_id, filtros=None, cursor=None, por_pagina=None):
+        """Página do histórico de um equipamento, mais recente primeiro (keyset)
+        
+        Ordena por (data_acao, id), decrescente; o cursor guarda o par do último
+        evento e a próxima página começa logo depois dele, pelo índice
+        ix_historico_equipamento_data, sem OFFSET. Os usernames da página são
+        resolvidos em uma única consulta. Filtro por usuario recebe o username.
+        
+        Quando o banco não completa a página e há período arquivado
+        (arquivar_historico.py), a página continua nos arquivos mensais.
+        """
+        filtros = filtros or {}
+        try:
+            por_pagina = int(por_pagina or HistoricoService.POR_PAGINA_PADRAO)
+        except (TypeError, ValueError):
+            por_pagina = HistoricoService.POR_PAGINA_PADRAO
+        por_pagina = max(1, min(por_pagina, HistoricoService.POR_PAGINA_MAXIMO))
+        
+        query = db.select(
+            HistoricoEquipamento.id, HistoricoEquipamento.data_acao, HistoricoEquipamento.acao,
+            HistoricoEquipamento.descricao, HistoricoEquipamento.campo_alterado,
+            HistoricoEquipamento.valor_anterior, HistoricoEquipamento.valor_novo,
+            HistoricoEquipamento.usuario_id
+        ).where(HistoricoEquipamento.equipamento_id == equipamento_id)
+        
+        # Mesmos filtros, por igualdade, nas linhas arquivadas
+        filtros_arquivo = {'equipamento_id': equipamento_id}
+        for campo in ('acao', 'campo_alterado'):
+            if filtros.get(campo):
+                query = query.where(getattr(HistoricoEquipamento, campo) == filtros[campo])
+                filtros_arquivo[campo] = filtros[campo]
+        if filtros.get('usuario'):
+            usuario_id = db.session.execute(
+                db.select(Usuario.id).where(Usuario.username == filtros['usuario'])
+            ).scalar()
+            if usuario_id is None:
+                return {'eventos': [], 'por_pagina': por_pagina, 'proximo_cursor': None}
+            query = query.where(HistoricoEquipamento.usuario_id == usuario_id)
+            filtros_arquivo['usuario_id'] = usuario_id
+        
+        # Cursor inválido é ignorado (volta para a primeira página)
+        chave = None
+        posicao = decodificar_cursor(cursor)
+        if isinstance(posicao, dict) and isinstance(posicao.get('k'), list) and len(posicao['k']) == 2:
+            try:
+                chave = (datetime.fromisoformat(posicao['k'][0]), int(posicao['k'][1]))
+            except (TypeError, ValueError):
+                chave = None
+        if chave:
+            query = query.where(db.or_(
+                HistoricoEquipamento.data_acao < chave[0],
+                db.and_(HistoricoEquipamento.data_acao == chave[0], HistoricoEquipamento.id < chave[1])
+            ))
+        
+        linhas = [linha._asdict() for linha in db.session.execute(
+            query.order_by(HistoricoEquipamento.data_acao.desc(), HistoricoEquipamento.id.desc())
+            .limit(por_pagina + 1)
+        )]
+        
+        corte = ArquivoService.corte('historico_equipamento')
+        if corte and (len(linhas) <= por_pagina or linhas[-1]['data_acao'] < corte):
+            criado_em = db.session.execute(
+                db.select(Equipamento.created_at).where(Equipamento.id_interno == equipamento_id)
+            ).scalar()
+            # Equipamento criado depois do corte não tem nada nos arquivos
+            if criado_em is None or criado_em < corte:
+                arquivadas = islice(ArquivoService.ler_ate('historico_equipamento', chave, filtros_arquivo), por_pagina + 1)
+                linhas = sorted(
+                    linhas + list(arquivadas), key=lambda linha: (linha['data_acao'], linha['id']), reverse=True
+                )[:por_pagina + 1]
+        
+        tem_mais = len(linhas) > por_pagina
+        linhas = linhas[:por_pagina]
+        
+        ids_usuarios = {linha['usuario_id'] for linha in linhas if linha['usuario_id'] is not None}
+        usernames = dict(db.session.execute(
+            db.select(Usuario.id, Usuario.username).where(Usuario.id.in_(ids_usuarios))
+        ).all()) if ids_usuarios else {}
+        
+        eventos = [{
+            'id': linha['id'],
+            'data_acao': linha['data_acao'].isoformat(),
+            'acao': linha['acao'],
+            'descricao': linha['descricao'],
+            'campo_alterado': linha['campo_alterado'],
+            'valor_anterior': linha['valor_anterior'],
+            'valor_novo': linha['valor_novo'],
+            'usuario': usernames.get(linha['usuario_id'])
+        } for linha in linhas]
+        
+        proximo_cursor = None
+        if linhas and tem_mais:
+            proximo_cursor = codificar_cursor({'k': [linhas[-1]['data_acao'].isoformat(), linhas[-1]['id']]})
+        
+        return {
+            'eventos': eventos,
+            'por_pagina': por_pagina,
+            'proximo_cursor': proximo_cursor
+        }
+
+# Prefixo do título das notificações de garantia (usado também na deduplicação)
+TITULO_GARANTIA = 'Garantia Expirando'
 
 class NotificacaoService:
     """Serviços relacionados às notificações"""
@@ -154,77 +641,344 @@ class NotificacaoService:
             return False
     
     @staticmethod
-    def verificar_garantias_expirando():
-        """Verifica equipamentos com garantia expirando em 30 dias e cria notificações"""
-        data_limite = datetime.now().date() + timedelta(days=30)
-        equipamentos_expirando = Equipamento.query.filter(
-            Equipamento.garantia_ate <= data_limite,
-            Equipamento.garantia_ate >= datetime.now().date(),
-            Equipamento.ativo == True
+    def verificar_garantias_expirando(dias=30, hoje=None):
+        """Notifica os administradores sobre garantias que expiram nos próximos `dias`
+        
+        Baseado em conjuntos: uma consulta traz os equipamentos, outra os
+        destinatários; pares (equipamento, usuário) já notificados sobre a garantia
+        atual (notificação criada a partir de `dias` antes de garantia_ate) são
+        descartados por uma consulta no índice ix_notificacao_equipamento_usuario
+        e o restante é inserido de uma vez, em uma única transação. Pode rodar
+        repetidamente sem duplicar notificações; uma garantia renovada volta a
+        ser notificada quando se aproximar do novo vencimento.
+        
+        Retorna {'equipamentos', 'destinatarios', 'criadas', 'ignoradas', 'segundos'}.
+        """
+        inicio = time.perf_counter()
+        hoje = hoje or datetime.now().date()
+        data_limite = hoje + timedelta(days=dias)
+        
+        equipamentos = db.session.execute(
+            db.select(Equipamento.id_interno, Equipamento.id_publico, Equipamento.tipo,
+                      Equipamento.marca, Equipamento.garantia_ate)
+            .where(
+                Equipamento.garantia_ate <= data_limite,
+                Equipamento.garantia_ate >= hoje,
+                Equipamento.ativo == True
+            )
         ).all()
+        admins = db.session.execute(
+            db.select(Usuario.id).where(Usuario.nivel_acesso >= 2, Usuario.ativo == True)
+        ).scalars().all()
+        
+        resultado = {
+            'equipamentos': len(equipamentos),
+            'destinatarios': len(admins),
+            'criadas': 0,
+            'ignoradas': 0
+        }
         
-        for equipamento in equipamentos_expirando:
-            dias_restantes = (equipamento.garantia_ate - datetime.now().date()).days
+        if equipamentos and admins:
+            # Início da janela de aviso de cada garantia: notificações anteriores
+            # são de uma garantia já renovada (e podem ter sido arquivadas)
+            janelas = {
+                eq.id_interno: datetime(eq.garantia_ate.year, eq.garantia_ate.month, eq.garantia_ate.day) - timedelta(days=dias)
+                for eq in equipamentos
+            }
+            
+            # Pares já notificados (por lotes, para não estourar o limite de parâmetros)
+            ids = list(janelas)
+            existentes = set()
+            for i in range(0, len(ids), 500):
+                for equipamento_id, usuario_id, criada_em in db.session.execute(
+                    db.select(Notificacao.equipamento_id, Notificacao.usuario_id, Notificacao.created_at).where(
+                        Notificacao.equipamento_id.in_(ids[i:i + 500]),
+                        Notificacao.titulo.like(f"{TITULO_GARANTIA}%"),
+                        Notificacao.created_at >= min(janelas.values())
+                    )
+                ):
+                    if criada_em >= janelas[equipamento_id]:
+                        existentes.add((equipamento_id, usuario_id))
             
-            # Notificar usuários admin
-            admins = Usuario.query.filter(Usuario.nivel_acesso >= 2, Usuario.ativo == True).all()
-            for admin in admins:
-                titulo = f"Garantia Expirando - {equipamento.id_publico}"
-                mensagem = f"A garantia do equipamento {equipamento.tipo} ({equipamento.marca}) expira em {dias_restantes} dias."
-                NotificacaoService.criar_notificacao(
-                    usuario_id=admin.id,
-                    titulo=titulo,
-                    mensagem=mensagem,
-                    tipo='warning',
-                    equipamento_id=equipamento.id_interno,
-                    link_acao=f"/consulta?busca={equipamento.id_publico}"
-                )
+            agora = datetime.utcnow()
+            registros = []
+            for eq in equipamentos:
+                dias_restantes = (eq.garantia_ate - hoje).days
+                for usuario_id in admins:
+                    if (eq.id_interno, usuario_id) in existentes:
+                        continue
+                    registros.append({
+                        'usuario_id': usuario_id,
+                        'titulo': f"{TITULO_GARANTIA} - {eq.id_publico}",
+                        'mensagem': f"A garantia do equipamento {eq.tipo} ({eq.marca}) expira em {dias_restantes} dias.",
+                        'tipo': 'warning',
+                        'lida': False,
+                        'equipamento_id': eq.id_interno,
+                        'link_acao': f"/consulta?busca={eq.id_publico}",
+                        'created_at': agora
+                    })
+            
+            try:
+                if registros:
+                    db.session.execute(insert(Notificacao.__table__), registros)
+                db.session.commit()
+            except Exception as e:
+                current_app.logger.error(f"Erro ao criar notificações de garantia: {e}")
+                db.session.rollback()
+                raise
+            
+            resultado['criadas'] = len(registros)
+            resultado['ignoradas'] = len(equipamentos) * len(admins) - len(registros)
+        
+        resultado['segundos'] = round(time.perf_counter() - inicio, 3)
+        log_performance_metric('notificacoes_garantia_segundos', resultado['segundos'], resultado)
+        return resultado
 
 class ReportService:
     """Serviços relacionados aos relatórios"""
     
     @staticmethod
     def gerar_dados_dashboard():
-        """Gera dados para o dashboard"""
+        """Gera dados para o dashboard
+        
+        Uma única consulta agrupada por (status, condicao, categoria) traz todas as
+        células do cubo; contagens e somas são consolidadas em memória.
+        """
         try:
-            total = Equipamento.query.count()
-            em_uso = Equipamento.query.filter_by(status='Em uso').count()
-            manutencao = Equipamento.query.filter_by(status='Manutenção').count()
-            estocado = Equipamento.query.filter_by(status='Estocado').count()
+            linhas = db.session.query(
+                Equipamento.status,
+                Equipamento.condicao,
+                Categoria.nome,
+                db.func.count(Equipamento.id_interno),
+                db.func.sum(Equipamento.valor)
+            ).outerjoin(
+                Categoria, Equipamento.categoria_id == Categoria.id
+            ).group_by(
+                Equipamento.status, Equipamento.condicao, Categoria.nome
+            ).all()
             
-            valor_total = db.session.query(db.func.sum(Equipamento.valor)).scalar() or 0
+            total = 0
+            valor_total = 0.0
+            por_status = {}
+            por_condicao = {}
+            valor_por_categoria = {}
+            
+            for status, condicao, categoria, quantidade, valor in linhas:
+                valor = float(valor or 0)
+                total += quantidade
+                valor_total += valor
+                por_status[status] = por_status.get(status, 0) + quantidade
+                condicao = condicao or 'Não informada'
+                por_condicao[condicao] = por_condicao.get(condicao, 0) + quantidade
+                categoria = categoria or 'Sem categoria'
+                valor_por_categoria[categoria] = valor_por_categoria.get(categoria, 0.0) + valor
             
             return {
                 'total': total,
-                'em_uso': em_uso,
-                'manutencao': manutencao,
-                'estocado': estocado,
-                'valor_total': float(valor_total)
+                'em_uso': por_status.get('Em uso', 0),
+                'manutencao': por_status.get('Manutenção', 0),
+                'estocado': por_status.get('Estocado', 0),
+                'valor_total': valor_total,
+                'por_status': por_status,
+                'por_condicao': por_condicao,
+                'valor_por_categoria': valor_por_categoria
             }
         except Exception as e:
             current_app.logger.error(f"Erro ao gerar dados do dashboard: {e}")
             return None
+    
+    @staticmethod
+    def gerar_estatisticas_usuarios():
+        """Gera estatísticas de usuários em uma única consulta agrupada"""
+        try:
+            linhas = db.session.query(
+                Usuario.nivel_acesso,
+                Usuario.ativo,
+                db.func.count(Usuario.id)
+            ).group_by(Usuario.nivel_acesso, Usuario.ativo).all()
+            
+            stats = {
+                'total_usuarios': 0,
+                'usuarios_ativos': 0,
+                'usuarios_inativos': 0,
+                'nivel_1': 0,  # Visualizador
+                'nivel_2': 0,  # Operador
+                'nivel_3': 0   # Admin
+            }
+            for nivel, ativo, quantidade in linhas:
+                stats['total_usuarios'] += quantidade
+                if ativo:
+                    stats['usuarios_ativos'] += quantidade
+                if nivel in (1, 2, 3):
+                    stats[f'nivel_{nivel}'] += quantidade
+            
+            # Usuários com ativo NULL contam como inativos, como no relatório original
+            stats['usuarios_inativos'] = stats['total_usuarios'] - stats['usuarios_ativos']
+            stats['admins'] = stats['nivel_3']
+            return stats
+        except Exception as e:
+            current_app.logger.error(f"Erro ao gerar estatísticas de usuários: {e}")
+            return None
+
+class ExportService:
+    """Serviços de exportação de dados"""
+    
+    # (cabeçalho, coluna) na ordem do arquivo exportado
+    COLUNAS_CSV = [
+        ('ID Público', Equipamento.id_publico),
+        ('Tipo', Equipamento.tipo),
+        ('Marca', Equipamento.marca),
+        ('Modelo', Equipamento.modelo),
+        ('Número Série', Equipamento.num_serie),
+        ('Data Aquisição', Equipamento.data_aquisicao),
+        ('Localização', Equipamento.localizacao),
+        ('Status', Equipamento.status),
+        ('Responsável', Equipamento.responsavel),
+        ('Valor', Equipamento.valor),
+        ('SPE', Equipamento.SPE),
+        ('Centro de Custo', Equipamento.centro_custo),
+        ('Garantia até', Equipamento.garantia_ate)
+    ]
+    
+    TAMANHO_LOTE = 1000
+    
+    @staticmethod
+    def gerar_csv(filtros, tamanho_lote=None):
+        """Gera o CSV de equipamentos em blocos de texto (memória constante)
+        
+        As linhas são lidas do cursor do servidor em lotes (yield_per) e cada lote
+        é convertido em um bloco de CSV, sem materializar a tabela inteira.
+        """
+        tamanho_lote = tamanho_lote or ExportService.TAMANHO_LOTE
+        colunas = [coluna for _, coluna in ExportService.COLUNAS_CSV]
+        query = ConsultaService.aplicar_filtros(db.session.query(*colunas), filtros)
+        query = query.order_by(*IdPublicoService.ORDEM).execution_options(yield_per=tamanho_lote)
+        
+        buffer = StringIO()
+        escritor = csv.writer(buffer)
+        
+        # BOM para o Excel reconhecer UTF-8 (equivalente ao antigo encoding='utf-8-sig')
+        buffer.write('\ufeff')
+        escritor.writerow([cabecalho for cabecalho, _ in ExportService.COLUNAS_CSV])
+        
+        for indice, linha in enumerate(query, start=1):
+            escritor.writerow(linha)
+            if indice % tamanho_lote == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        
+        yield buffer.getvalue()
+
+class TermoLoteService:
+    """Geração de termos de cautela em lote (ZIP ou PDF único)"""
+    
+    MAXIMO_ITENS = 2000
+    FORMATOS = ('zip', 'pdf')
+    
+    @staticmethod
+    def extrair_ids(valor):
+        """Lista de IDs públicos a partir de texto separado por vírgula, espaço ou linha"""
+        return [parte for parte in valor.replace(',', ' ').split() if parte]
+    
+    @staticmethod
+    def selecionar(ids_publicos=None, filtros=None):
+        """Equipamentos do lote, com categoria e fornecedor carregados na mesma consulta
+        
+        Aceita uma lista de IDs públicos ou os filtros de ConsultaService; levanta
+        ValueError se a seleção for vazia, grande demais ou tiver IDs inexistentes.
+        """
+        query = Equipamento.query.options(
+            joinedload(Equipamento.categoria_obj),
+            joinedload(Equipamento.fornecedor_obj)
+        ).filter(Equipamento.ativo == True)
+        
+        if ids_publicos:
+            ids_publicos = list(dict.fromkeys(ids_publicos))
+            if len(ids_publicos) > TermoLoteService.MAXIMO_ITENS:
+                raise ValueError(f"Máximo de {TermoLoteService.MAXIMO_ITENS} termos por lote")
+            equipamentos = query.filter(Equipamento.id_publico.in_(ids_publicos)).all()
+            encontrados = {eq.id_publico for eq in equipamentos}
+            faltando = [i for i in ids_publicos if i not in encontrados]
+            if faltando:
+                raise ValueError(f"Equipamentos não encontrados: {', '.join(faltando[:20])}")
+            ordem = {id_publico: i for i, id_publico in enumerate(ids_publicos)}
+            return sorted(equipamentos, key=lambda eq: ordem[eq.id_publico])
+        
+        if not filtros:
+            raise ValueError("Informe IDs ou ao menos um filtro")
+        
+        query = ConsultaService.aplicar_filtros(query, filtros).order_by(*IdPublicoService.ORDEM)
+        equipamentos = query.limit(TermoLoteService.MAXIMO_ITENS + 1).all()
+        if len(equipamentos) > TermoLoteService.MAXIMO_ITENS:
+            raise ValueError(f"O filtro seleciona mais de {TermoLoteService.MAXIMO_ITENS} equipamentos")
+        if not equipamentos:
+            raise ValueError("Nenhum equipamento encontrado")
+        return equipamentos
+    
+    @staticmethod
+    def gerar(equipamentos, formato='zip', usuario_emitente=None, usuario_id=None,
+              ip_address=None, descricao='Termo de cautela gerado em lote', processos=None):
+        """Gera o lote em pedaços de bytes e, ao final, registra o histórico em um único INSERT
+        
+        Os dados dos termos são montados antes de renderizar, então o gerador pode
+        ser consumido em streaming sem acessar a sessão até o registro do histórico.
+        """
+        from termo import montar_dados_termo, gerar_zip_termos, gerar_pdf_unico
+        
+        if formato not in TermoLoteService.FORMATOS:
+            raise ValueError(f"Formato inválido (use {' ou '.join(TermoLoteService.FORMATOS)})")
+        
+        data_emissao = datetime.now().strftime('%d/%m/%Y')
+        itens = [
+            (f"termo_cautela_{eq.id_publico}.pdf",
+             montar_dados_termo(eq, usuario_emitente=usuario_emitente, data_emissao=data_emissao))
+            for eq in equipamentos
+        ]
+        ids_internos = [(eq.id_interno, eq.id_publico) for eq in equipamentos]
+        
+        def chunks():
+            inicio = time.perf_counter()
+            if formato == 'zip':
+                yield from gerar_zip_termos(itens, processos=processos)
+            else:
+                yield gerar_pdf_unico([dados for _, dados in itens])
+            
+            agora = datetime.utcnow()
+            try:
+                HistoricoService.registrar_lote([
+                    HistoricoService.montar_registro(
+                        id_interno, 'Termo Gerado', descricao,
+                        usuario_id=usuario_id,
+                        ip_address=ip_address,
+                        data_acao=agora
+                    )
+                    for id_interno, _ in ids_internos
+                ])
+                db.session.commit()
+            except Exception as e:
+                current_app.logger.error(f"Erro ao registrar histórico do lote de termos: {e}")
+                db.session.rollback()
+            
+            log_performance_metric('termos_lote_segundos', round(time.perf_counter() - inicio, 3),
+                                   {'quantidade': len(itens), 'formato': formato})
+        
+        return chunks()
 
 class SearchService:
     """Serviços relacionados à busca"""
     
     @staticmethod
-    def buscar_equipamentos(query, limit=10):
+    def buscar_equipamentos(query, limit=10, campos=None):
         """Busca equipamentos por texto"""
         if len(query) < 2:
             return []
         
         try:
-            equipamentos = Equipamento.query.filter(
-                db.or_(
-                    Equipamento.id_publico.ilike(f'%{query}%'),
-                    Equipamento.tipo.ilike(f'%{query}%'),
-                    Equipamento.marca.ilike(f'%{query}%'),
-                    Equipamento.responsavel.ilike(f'%{query}%')
-                )
-            ).limit(limit).all()
+            # Ordenado por relevância usando o índice trigram/FTS5 quando disponível
+            equipamentos = search_index.buscar(query, limit)
             
-            return [eq.to_dict() for eq in equipamentos]
+            return EquipamentoService.serializar_lista(equipamentos, campos)
         except Exception as e:
             current_app.logger.error(f"Erro na busca: {e}")
             return []
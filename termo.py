@@ -0,0 +1,353 @@
+"""
+Geração do Termo de Cautela
+Estilos e layouts reportlab montados uma vez por processo e cache de PDFs prontos
+"""
+import os
+import json
+import zipfile
+import hashlib
+import threading
+from io import BytesIO
+from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from metricas import RENDERIZACAO_PDF
+
+# Limite padrão do cache de PDFs por processo (sobrescrito por TERMO_CACHE_MB)
+CACHE_PADRAO_MB = 32
+
+# Abaixo deste número de termos o lote é renderizado sem abrir o pool de processos
+MINIMO_PARALELO = 8
+
+class EstilosTermo:
+    """Estilos de parágrafo e tabela do termo (imutáveis, compartilhados entre requisições)"""
+    
+    def __init__(self):
+        # reportlab só é carregado na primeira renderização (boot mais rápido)
+        from reportlab.lib import colors
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.platypus import TableStyle
+        
+        base = getSampleStyleSheet()
+        
+        self.titulo = ParagraphStyle(
+            'TituloTermo',
+            parent=base['Heading1'],
+            fontSize=16,
+            textColor=colors.darkgreen,
+            alignment=1,  # Centralizado
+            spaceAfter=20
+        )
+        
+        self.subtitulo = ParagraphStyle(
+            'SubtituloTermo',
+            parent=base['Heading2'],
+            fontSize=12,
+            textColor=colors.black,
+            alignment=1,
+            spaceAfter=15
+        )
+        
+        self.normal = ParagraphStyle(
+            'NormalTermo',
+            parent=base['Normal'],
+            fontSize=11,
+            textColor=colors.black,
+            spaceBefore=5,
+            spaceAfter=5
+        )
+        
+        self.rodape = ParagraphStyle(
+            'Rodape',
+            parent=base['Normal'],
+            fontSize=8,
+            textColor=colors.grey,
+            alignment=1
+        )
+        
+        self.tabela_equipamento = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.darkgreen),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ])
+        
+        self.tabela_assinaturas = TableStyle([
+            ('SPAN', (0, 0), (-1, 0)),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.darkgreen),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('TOPPADDING', (0, 3), (-1, 3), 10),
+        ])
+
+class TermoRenderer:
+    """Monta o PDF do termo a partir do dicionário de dados
+    
+    Os estilos são criados na primeira renderização e reaproveitados; PDFs
+    prontos ficam em um cache LRU (limitado em bytes) indexado pelo hash dos
+    dados, de modo que o mesmo termo não é renderizado duas vezes.
+    """
+    
+    def __init__(self, limite_bytes=CACHE_PADRAO_MB * 1024 * 1024):
+        self.limite_bytes = limite_bytes
+        self._estilos = None
+        self._cache = OrderedDict()
+        self._bytes_cache = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def estilos(self):
+        if self._estilos is None:
+            self._estilos = EstilosTermo()
+        return self._estilos
+    
+    @staticmethod
+    def chave(dados):
+        """Hash estável dos dados do termo (ordem das chaves não importa)"""
+        serializado = json.dumps(dados, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(serializado.encode('utf-8')).hexdigest()
+    
+    def _story(self, dados):
+        """Flowables de um termo"""
+        from reportlab.platypus import Paragraph, Table, Spacer
+        from reportlab.lib.units import mm
+        
+        estilos = self.estilos
+        story = []
+        
+        # Cabeçalho
+        story.append(Paragraph("TERMO DE CAUTELA DE EQUIPAMENTO", estilos.titulo))
+        story.append(Paragraph("SISTEMA DE CONTROLE PATRIMONIAL", estilos.subtitulo))
+        story.append(Spacer(1, 20))
+        
+        # Dados do equipamento em tabela
+        equipamento_data = [
+            ['DADOS DO EQUIPAMENTO', ''],
+            ['Patrimônio:', dados.get('patrimonio', 'N/A')],
+            ['Tipo:', dados.get('tipo', 'N/A')],
+            ['Categoria:', dados.get('categoria', 'N/A')],
+            ['Marca:', dados.get('marca', 'N/A')],
+            ['Modelo:', dados.get('modelo', 'N/A')],
+            ['Número de Série:', dados.get('num_serie', 'N/A')],
+            ['Código de Barras:', dados.get('codigo_barras', 'N/A')],
+            ['Valor:', f"R$ {dados.get('valor', '0,00')}"],
+            ['Fornecedor:', dados.get('fornecedor', 'N/A')],
+            ['Localização:', dados.get('localizacao', 'N/A')],
+        ]
+        
+        equipamento_table = Table(equipamento_data, colWidths=[4*72, 4*72])
+        equipamento_table.setStyle(estilos.tabela_equipamento)
+        
+        story.append(equipamento_table)
+        story.append(Spacer(1, 20))
+        
+        # Responsabilidade
+        story.append(Paragraph("TERMO DE RESPONSABILIDADE", estilos.subtitulo))
+        
+        texto_responsabilidade = f"""
+        Eu, <b>{dados.get('responsavel', '__________________')}</b>, declaro ter recebido em perfeitas
+        condições o equipamento acima descrito, comprometendo-me a:
+        
+        • Utilizar o equipamento exclusivamente para fins profissionais;
+        • Zelar pela conservação e guarda do equipamento;
+        • Comunicar imediatamente qualquer problema, dano ou furto;
+        • Devolver o equipamento quando solicitado pela empresa;
+        • Responsabilizar-me por eventuais danos causados por mau uso.
+        
+        <b>Observações:</b> {dados.get('observacoes', 'Nenhuma observação especial.')}
+        """
+        
+        story.append(Paragraph(texto_responsabilidade, estilos.normal))
+        story.append(Spacer(1, 30))
+        
+        # QR Code do patrimônio (mesmo desenho, em cache, usado nas etiquetas)
+        story.append(Paragraph(f"<b>Código QR:</b> {dados.get('patrimonio', 'N/A')} | {dados.get('tipo', 'N/A')}", estilos.normal))
+        if dados.get('patrimonio'):
+            from etiquetas import desenho_qr
+            story.append(desenho_qr(dados['patrimonio'], 25 * mm))
+        story.append(Spacer(1, 30))
+        
+        # Assinaturas
+        assinatura_data = [
+            ['ASSINATURAS', '', ''],
+            ['', '', ''],
+            ['_' * 30, '_' * 30, '_' * 30],
+            ['Responsável pelo Equipamento', 'Setor de TI/Patrimônio', 'Data'],
+            [dados.get('responsavel', ''), dados.get('usuario_emitente', ''), dados.get('data_emissao', '')]
+        ]
+        
+        assinatura_table = Table(assinatura_data, colWidths=[2.5*72, 2.5*72, 1.5*72])
+        assinatura_table.setStyle(estilos.tabela_assinaturas)
+        
+        story.append(assinatura_table)
+        story.append(Spacer(1, 20))
+        
+        # Rodapé
+        story.append(Paragraph(
+            f"<i>Documento gerado automaticamente em {dados.get('data_emissao', 'N/A')} pelo Sistema de Controle Patrimonial.</i>",
+            estilos.rodape
+        ))
+        return story
+    
+    def construir(self, dados, pdf_buffer):
+        """Renderiza o termo em `pdf_buffer` (sem cache)"""
+        from reportlab.platypus import SimpleDocTemplate
+        from reportlab.lib.pagesizes import A4
+        
+        doc = SimpleDocTemplate(pdf_buffer, pagesize=A4)
+        doc.build(self._story(dados))
+        return doc
+    
+    def construir_varios(self, lista_dados, pdf_buffer):
+        """Renderiza vários termos em um único PDF, um por página"""
+        from reportlab.platypus import SimpleDocTemplate, PageBreak
+        from reportlab.lib.pagesizes import A4
+        
+        story = []
+        for dados in lista_dados:
+            if story:
+                story.append(PageBreak())
+            story.extend(self._story(dados))
+        doc = SimpleDocTemplate(pdf_buffer, pagesize=A4)
+        doc.build(story)
+        return doc
+    
+    def renderizar(self, dados):
+        """Retorna os bytes do PDF, do cache quando os dados não mudaram"""
+        chave = self.chave(dados)
+        with self._lock:
+            pdf = self._cache.get(chave)
+            if pdf is not None:
+                self._cache.move_to_end(chave)
+                return pdf
+        
+        buffer = BytesIO()
+        with RENDERIZACAO_PDF.cronometrar(documento='termo'):
+            self.construir(dados, buffer)
+        pdf = buffer.getvalue()
+        self._guardar(chave, pdf)
+        return pdf
+    
+    def _guardar(self, chave, pdf):
+        if len(pdf) > self.limite_bytes:
+            return
+        with self._lock:
+            if chave in self._cache:
+                return
+            self._cache[chave] = pdf
+            self._bytes_cache += len(pdf)
+            while self._bytes_cache > self.limite_bytes:
+                _, antigo = self._cache.popitem(last=False)
+                self._bytes_cache -= len(antigo)
+    
+    def limpar_cache(self):
+        with self._lock:
+            self._cache.clear()
+            self._bytes_cache = 0
+    
+    def init_app(self, app):
+        """Ajusta o limite do cache pela configuração TERMO_CACHE_MB"""
+        self.limite_bytes = int(app.config.get('TERMO_CACHE_MB', CACHE_PADRAO_MB)) * 1024 * 1024
+
+def montar_dados_termo(equipamento, usuario_emitente=None, data_emissao=None):
+    """Dicionário de dados do termo para um equipamento
+    
+    Categoria e fornecedor vêm dos relacionamentos; carregue o equipamento com
+    joinedload/prefetch para não gerar consultas extras.
+    """
+    categoria = equipamento.categoria_obj
+    fornecedor = equipamento.fornecedor_obj
+    return {
+        'tipo': equipamento.tipo,
+        'marca': equipamento.marca,
+        'modelo': equipamento.modelo,
+        'num_serie': equipamento.num_serie,
+        'patrimonio': equipamento.id_publico,
+        'valor': f"{equipamento.valor:.2f}" if equipamento.valor else '0,00',
+        'responsavel': equipamento.responsavel or 'A definir',
+        'localizacao': equipamento.localizacao,
+        'observacoes': equipamento.observacoes or 'Nenhuma observação especial.',
+        'categoria': categoria.nome if categoria else 'N/A',
+        'fornecedor': fornecedor.nome if fornecedor else 'N/A',
+        'codigo_barras': equipamento.codigo_barras or 'N/A',
+        'data_emissao': data_emissao or datetime.now().strftime('%d/%m/%Y'),
+        'usuario_emitente': usuario_emitente or 'Setor de TI/Patrimônio'
+    }
+
+def renderizar_termo_isolado(dados):
+    """Renderiza um termo e devolve os bytes (executado nos processos do pool)"""
+    from utils import criar_termo_cautela_pdf
+    buffer = BytesIO()
+    criar_termo_cautela_pdf(dados, buffer)
+    return buffer.getvalue()
+
+class _SaidaStream:
+    """Destino de escrita não-seekable para o zipfile: acumula o que for escrito até ser drenado"""
+    
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+    
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+    
+    def tell(self):
+        return self._posicao
+    
+    def flush(self):
+        pass
+    
+    def drenar(self):
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+def gerar_zip_termos(itens, processos=None, minimo_paralelo=MINIMO_PARALELO):
+    """Gera um ZIP com um PDF por termo, em pedaços (para resposta em streaming)
+    
+    `itens` é uma lista de (nome_arquivo, dados). Os termos são renderizados em
+    paralelo num ProcessPoolExecutor e gravados no ZIP na ordem recebida, à
+    medida que ficam prontos; lotes pequenos são renderizados no próprio processo.
+    """
+    saida = _SaidaStream()
+    lista_dados = [dados for _, dados in itens]
+    
+    with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_STORED) as zf:
+        if len(itens) < minimo_paralelo:
+            pdfs = (termo_renderer.renderizar(dados) for dados in lista_dados)
+            for (nome, _), pdf in zip(itens, pdfs):
+                zf.writestr(nome, pdf)
+                yield saida.drenar()
+        else:
+            processos = processos or min(os.cpu_count() or 1, 8)
+            lote = max(1, len(itens) // (processos * 4))
+            with ProcessPoolExecutor(max_workers=processos) as executor:
+                pdfs = executor.map(renderizar_termo_isolado, lista_dados, chunksize=lote)
+                for (nome, _), pdf in zip(itens, pdfs):
+                    zf.writestr(nome, pdf)
+                    yield saida.drenar()
+    
+    yield saida.drenar()
+
+def gerar_pdf_unico(lista_dados):
+    """Todos os termos em um único PDF (um documento reportlab, uma página por termo)"""
+    buffer = BytesIO()
+    with RENDERIZACAO_PDF.cronometrar(documento='termos_lote'):
+        termo_renderer.construir_varios(lista_dados, buffer)
+    return buffer.getvalue()
+
+# Instância global
+termo_renderer = TermoRenderer()
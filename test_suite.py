@@ -4,9 +4,10 @@ Testes abrangentes para o sistema de controle de patrimônio
 """
 import os
 import sys
+import time
 import unittest
 import tempfile
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 import sqlite3
 
 # Adicionar o diretório pai ao path para importar a aplicação
@@ -51,7 +52,7 @@ class BaseTestCase(unittest.TestCase):
         os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
         os.environ['FLASK_ENV'] = 'testing'
         
-        from app_refatorado import create_app
+        from app import create_app
         self.app = create_app('testing')
         self.app_context = self.app.app_context()
         self.app_context.push()
@@ -167,6 +168,13 @@ class ModelTestCase(BaseTestCase):
         saved_fornecedor = Fornecedor.query.filter_by(nome='Dell Technologies').first()
         self.assertIsNotNone(saved_fornecedor)
         self.assertEqual(saved_fornecedor.cnpj, '12.345.678/0001-90')
+    
+    def test_indices_caminhos_acesso_usados(self):
+        """Testar (EXPLAIN) que as consultas frequentes usam os índices compostos/parciais"""
+        from verificar_indices import verificar
+        resultado = verificar(db.session.connection())
+        sem_indice = {nome: item['plano'] for nome, item in resultado.items() if not item['usa_indice']}
+        self.assertEqual(sem_indice, {})
 
 class ServiceTestCase(BaseTestCase):
     """Testes para os serviços"""
@@ -184,6 +192,125 @@ class ServiceTestCase(BaseTestCase):
         next_id = EquipamentoService.gerar_id_publico()
         self.assertEqual(next_id, 'PAT-002')
     
+    def test_id_publico_service_reservar_bloco(self):
+        """Testar reserva de bloco de IDs públicos sem repetição"""
+        from services import IdPublicoService
+        db.session.add(Equipamento(id_publico='PAT-1000', tipo='Test', status='Estocado'))
+        db.session.commit()
+        
+        bloco = IdPublicoService.reservar(3)
+        self.assertEqual(bloco, ['PAT-1001', 'PAT-1002', 'PAT-1003'])
+        self.assertEqual(EquipamentoService.gerar_id_publico(), 'PAT-1004')
+        self.assertEqual(IdPublicoService.numero('PAT-1004'), 1004)
+    
+    def test_historico_service_registrar_alteracoes(self):
+        """Testar registro de um conjunto de alterações em um único INSERT, sem commit"""
+        from services import HistoricoService
+        from models import HistoricoEquipamento
+        equipamento = Equipamento(id_publico='PAT-001', tipo='Test', status='Estocado')
+        db.session.add(equipamento)
+        db.session.commit()
+        
+        with self.app.test_request_context():
+            HistoricoService.registrar_alteracoes(equipamento.id_interno, [
+                {'campo': 'status', 'antigo': 'Estocado', 'novo': 'Em uso'},
+                {'campo': 'localizacao', 'antigo': None, 'novo': 'Sala 1'}
+            ])
+        db.session.rollback()
+        self.assertEqual(HistoricoEquipamento.query.count(), 0)
+        
+        with self.app.test_request_context():
+            HistoricoService.registrar_alteracoes(equipamento.id_interno, [
+                {'campo': 'status', 'antigo': 'Estocado', 'novo': 'Em uso'},
+                {'campo': 'localizacao', 'antigo': None, 'novo': 'Sala 1'},
+                {'campo': 'valor', 'antigo': 0.0, 'novo': 150.0},
+                {'campo': 'bloqueado', 'antigo': True, 'novo': False}
+            ])
+        db.session.commit()
+        
+        registros = HistoricoEquipamento.query.order_by(HistoricoEquipamento.id).all()
+        self.assertEqual([r.campo_alterado for r in registros], ['status', 'localizacao', 'valor', 'bloqueado'])
+        self.assertIsNone(registros[1].valor_anterior)
+        # Valores falsos não viram NULL
+        self.assertEqual((registros[2].valor_anterior, registros[3].valor_novo), ('0.0', 'False'))
+        self.assertEqual(registros[0].data_acao, registros[1].data_acao)
+    
+    def test_termo_lote_service_zip(self):
+        """Testar lote de termos em ZIP com histórico registrado de uma vez"""
+        import io
+        import zipfile
+        from services import TermoLoteService
+        from models import HistoricoEquipamento
+        db.session.add_all([
+            Equipamento(id_publico='PAT-001', tipo='Notebook', status='Em uso'),
+            Equipamento(id_publico='PAT-002', tipo='Mouse', status='Em uso')
+        ])
+        db.session.commit()
+        
+        with self.assertRaises(ValueError):
+            TermoLoteService.selecionar(['PAT-001', 'PAT-999'])
+        
+        equipamentos = TermoLoteService.selecionar(['PAT-002', 'PAT-001'])
+        conteudo = b''.join(TermoLoteService.gerar(equipamentos, 'zip', usuario_id=1))
+        nomes = zipfile.ZipFile(io.BytesIO(conteudo)).namelist()
+        self.assertEqual(nomes, ['termo_cautela_PAT-002.pdf', 'termo_cautela_PAT-001.pdf'])
+        self.assertEqual(HistoricoEquipamento.query.filter_by(acao='Termo Gerado').count(), 2)
+    
+    def test_notificacao_service_garantias_sem_duplicar(self):
+        """Testar job de garantias: uma notificação por (equipamento, admin), sem duplicar"""
+        from services import NotificacaoService
+        from models import Notificacao
+        hoje = date.today()
+        db.session.add_all([
+            Equipamento(id_publico='PAT-001', tipo='Notebook', status='Em uso', garantia_ate=hoje + timedelta(days=10)),
+            Equipamento(id_publico='PAT-002', tipo='Mouse', status='Estocado', garantia_ate=hoje + timedelta(days=90)),
+            Usuario(username='gestor', password_hash='x', nivel_acesso=2, ativo=True),
+            Usuario(username='leitor', password_hash='x', nivel_acesso=1, ativo=True)
+        ])
+        db.session.commit()
+        
+        resultado = NotificacaoService.verificar_garantias_expirando()
+        self.assertEqual(resultado['equipamentos'], 1)
+        self.assertEqual(resultado['criadas'], resultado['destinatarios'])
+        self.assertIn('segundos', resultado)
+        
+        repeticao = NotificacaoService.verificar_garantias_expirando()
+        self.assertEqual(repeticao['criadas'], 0)
+        self.assertEqual(Notificacao.query.count(), resultado['criadas'])
+        
+        # Garantia renovada por um ano: avisa de novo perto do novo vencimento
+        equipamento = Equipamento.query.filter_by(id_publico='PAT-001').first()
+        equipamento.garantia_ate = hoje + timedelta(days=375)
+        db.session.commit()
+        renovada = NotificacaoService.verificar_garantias_expirando(hoje=hoje + timedelta(days=365))
+        self.assertEqual(renovada['criadas'], resultado['criadas'])
+    
+    def test_cache_usuarios_snapshot_e_invalidacao(self):
+        """Testar snapshot imutável de usuário em cache e invalidação explícita"""
+        from cache_usuarios import CacheUsuarios
+        cache = CacheUsuarios(ttl=60)
+        usuario = Usuario(username='operador', password_hash='x', nivel_acesso=1)
+        db.session.add(usuario)
+        db.session.commit()
+        
+        snapshot = cache.obter(usuario.id)
+        self.assertEqual(snapshot.nivel_acesso, 1)
+        self.assertEqual(snapshot.get_id(), str(usuario.id))
+        with self.assertRaises(AttributeError):
+            snapshot.nivel_acesso = 3
+        
+        usuario.nivel_acesso = 3
+        db.session.commit()
+        self.assertIs(cache.obter(usuario.id), snapshot)
+        
+        cache.invalidar(usuario.id)
+        self.assertTrue(cache.obter(usuario.id).is_admin)
+        
+        db.session.delete(usuario)
+        db.session.commit()
+        cache.invalidar(usuario.id)
+        self.assertIsNone(cache.obter(usuario.id))
+    
     def test_report_service_gerar_dados_dashboard(self):
         """Testar geração de dados do dashboard"""
         # Criar equipamentos de teste
@@ -205,6 +332,316 @@ class ServiceTestCase(BaseTestCase):
         self.assertEqual(dados['estocado'], 1)
         self.assertEqual(dados['manutencao'], 1)
         self.assertEqual(dados['valor_total'], 1150.00)
+    
+    def test_depreciacao_service_backfill_e_relatorio(self):
+        """Testar depreciação vetorizada: mesma regra de valor_atual, backfill e relatório por categoria"""
+        from depreciacao import DepreciacaoService
+        categoria = Categoria(nome='Informática')
+        db.session.add(categoria)
+        db.session.flush()
+        hoje = date.today()
+        equipamentos = [
+            Equipamento(id_publico='PAT-001', tipo='Notebook', status='Em uso', valor=5000.0, valor_residual=500.0,
+                        vida_util_anos=5, data_aquisicao=hoje - timedelta(days=730), categoria_id=categoria.id),
+            Equipamento(id_publico='PAT-002', tipo='Monitor', status='Em uso', valor=1000.0, valor_residual=100.0,
+                        vida_util_anos=3, data_aquisicao=hoje - timedelta(days=3650), categoria_id=categoria.id),
+            Equipamento(id_publico='PAT-003', tipo='Mouse', status='Estocado', valor=80.0)
+        ]
+        db.session.add_all(equipamentos)
+        db.session.commit()
+        atualizado_em = equipamentos[0].updated_at
+        
+        resultado = DepreciacaoService.atualizar_valor_depreciado(hoje)
+        self.assertEqual((resultado['equipamentos'], resultado['atualizados']), (3, 3))
+        self.assertEqual(DepreciacaoService.atualizar_valor_depreciado(hoje)['atualizados'], 0)
+        for eq in equipamentos:
+            db.session.refresh(eq)
+            self.assertAlmostEqual(eq.valor_depreciado, eq.valor_atual, places=2)
+        self.assertEqual(equipamentos[0].updated_at, atualizado_em)
+        
+        relatorio = DepreciacaoService.relatorio_por_categoria(hoje, anos=2)
+        informatica = relatorio['categorias'][0]
+        self.assertEqual(informatica['categoria'], 'Informática')
+        self.assertEqual(informatica['quantidade'], 2)
+        self.assertAlmostEqual(informatica['valor_contabil'],
+                               round(equipamentos[0].valor_depreciado + 100.0, 2), places=2)
+        self.assertEqual([p['valor_contabil'] < informatica['valor_contabil'] for p in informatica['projecao']],
+                         [True, True])
+        self.assertEqual(relatorio['categorias'][1]['categoria'], 'Sem categoria')
+        self.assertEqual(relatorio['totais']['valor_aquisicao'], 6080.0)
+    
+    def test_depreciacao_service_previsao_fim_de_vida(self):
+        """Testar previsão mensal: fim de vida útil no mês certo, vencidos e agrupamento por centro de custo"""
+        from depreciacao import DepreciacaoService
+        db.session.add_all([
+            Equipamento(id_publico='PAT-001', tipo='Notebook', status='Em uso', valor=1200.0, vida_util_anos=2,
+                        data_aquisicao=date(2025, 1, 1), centro_custo='CC-1'),
+            Equipamento(id_publico='PAT-002', tipo='Monitor', status='Em uso', valor=600.0, vida_util_anos=1,
+                        data_aquisicao=date(2024, 1, 1), centro_custo='CC-1'),
+            Equipamento(id_publico='PAT-003', tipo='Mouse', status='Em uso', valor=100.0, vida_util_anos=5,
+                        data_aquisicao=date(2026, 1, 1))
+        ])
+        db.session.commit()
+        
+        previsao = DepreciacaoService.previsao(date(2026, 1, 15), meses=24, agrupar_por='centro_custo')
+        self.assertEqual(len(previsao['fechamentos']), 24)
+        self.assertEqual(previsao['fechamentos'][0], '2026-01-31')
+        grupos = {item['grupo']: item for item in previsao['grupos']}
+        self.assertEqual(set(grupos), {'CC-1', 'Não informado'})
+        
+        cc = grupos['CC-1']
+        self.assertEqual((cc['quantidade'], cc['vencidos'], cc['custo_reposicao_vencidos']), (2, 1, 600.0))
+        # PAT-001 atinge o fim da vida útil em 02/01/2027 (730,5 dias): 12º mês após jan/2026
+        self.assertEqual(cc['fim_vida'][12], 1)
+        self.assertEqual(sum(cc['fim_vida']), 1)
+        self.assertEqual(cc['custo_reposicao'][12], 1200.0)
+        self.assertEqual(cc['valor_contabil'][-1], 0.0)
+        self.assertEqual([ano['ano'] for ano in previsao['totais']['anual']], [2026, 2027])
+        self.assertEqual(previsao['totais']['anual'][1]['fim_vida'], 1)
+        with self.assertRaises(ValueError):
+            DepreciacaoService.previsao(agrupar_por='localizacao')
+    
+    def test_reconstrucao_estado_com_snapshots(self):
+        """Testar estado em um instante, revertendo o histórico com e sem snapshots"""
+        from models import SnapshotEquipamento
+        from reconstrucao import ReconstrucaoService
+        equipamento = Equipamento(id_publico='PAT-001', tipo='Notebook', status='Em uso', localizacao='Sala 12',
+                                  bloqueado=True, created_at=datetime(2026, 1, 1))
+        db.session.add(equipamento)
+        db.session.commit()
+        # Evento i em 01/01 + i dias: localizacao 'Sala i-1' -> 'Sala i'; bloqueio no dia 10
+        registros = [
+            HistoricoService.montar_registro(equipamento.id_interno, 'Editado', 'Movido', campo_alterado='localizacao',
+                                             valor_anterior=f'Sala {i - 1}', valor_novo=f'Sala {i}',
+                                             data_acao=datetime(2026, 1, 1 + i))
+            for i in range(1, 13)
+        ]
+        registros.append(HistoricoService.montar_registro(
+            equipamento.id_interno, 'Editado', 'Bloqueado', campo_alterado='bloqueado',
+            valor_anterior=False, valor_novo=True, data_acao=datetime(2026, 1, 10, 12)
+        ))
+        HistoricoService.registrar_lote(registros)
+        db.session.commit()
+        
+        sem_snapshot = ReconstrucaoService.estado_em(equipamento, datetime(2026, 1, 5, 12))
+        self.assertEqual(sem_snapshot['base'], 'atual')
+        self.assertEqual(sem_snapshot['eventos_revertidos'], 9)
+        self.assertEqual(sem_snapshot['estado']['localizacao'], 'Sala 4')
+        self.assertIs(sem_snapshot['estado']['bloqueado'], False)
+        
+        self.assertEqual(ReconstrucaoService.gerar_snapshots(intervalo=5)['snapshots'], 2)
+        self.assertEqual(SnapshotEquipamento.query.count(), 2)
+        # Eventos após o último snapshot não passam do intervalo: nada a gravar
+        self.assertEqual(ReconstrucaoService.gerar_snapshots(intervalo=5)['equipamentos'], 0)
+        
+        com_snapshot = ReconstrucaoService.estado_em(equipamento, datetime(2026, 1, 5, 12))
+        self.assertEqual(com_snapshot['base'], 'snapshot')
+        self.assertEqual(com_snapshot['estado'], sem_snapshot['estado'])
+        self.assertLessEqual(com_snapshot['eventos_revertidos'], 5)
+        for dia in range(1, 15):
+            instante = datetime(2026, 1, dia, 23)
+            resultado = ReconstrucaoService.estado_em(equipamento, instante)
+            self.assertEqual(resultado['estado']['localizacao'], f'Sala {min(dia - 1, 12)}')
+            self.assertEqual(resultado['estado']['bloqueado'], dia >= 10)
+            self.assertLessEqual(resultado['eventos_revertidos'], 6)
+        self.assertIsNone(ReconstrucaoService.estado_em(equipamento, datetime(2025, 12, 31)))
+        
+        # Excluir o equipamento leva os snapshots junto
+        db.session.delete(equipamento)
+        db.session.commit()
+        self.assertEqual(SnapshotEquipamento.query.count(), 0)
+    
+    def test_arquivamento_historico_leitura_transparente(self):
+        """Testar arquivamento de meses antigos e leitura dos arquivos pela linha do tempo e reconstrução"""
+        import shutil
+        from models import HistoricoEquipamento, Notificacao
+        from arquivamento import ArquivoService
+        from reconstrucao import ReconstrucaoService
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio)
+        # Sem ARQUIVO_DIR não há o que ler e o arquivamento é recusado
+        self.app.config['ARQUIVO_DIR'] = None
+        self.assertIsNone(ArquivoService.corte('historico_equipamento'))
+        with self.assertRaises(ValueError):
+            ArquivoService.arquivar('historico_equipamento', 12, 'jsonl')
+        self.app.config['ARQUIVO_DIR'] = diretorio
+        
+        equipamento = Equipamento(id_publico='PAT-001', tipo='Notebook', status='Em uso', localizacao='Sala 5',
+                                  created_at=datetime(2020, 1, 1))
+        db.session.add(equipamento)
+        db.session.commit()
+        datas = [datetime(2024, 1, 10), datetime(2024, 1, 20), datetime(2024, 2, 5),
+                 datetime(2026, 9, 1), datetime(2026, 9, 2)]
+        HistoricoService.registrar_lote([
+            HistoricoService.montar_registro(
+                equipamento.id_interno, 'Movido', f'Evento {i}', campo_alterado='localizacao',
+                valor_anterior=f'Sala {i}', valor_novo=f'Sala {i + 1}', usuario_id=self.test_user.id, data_acao=data
+            )
+            for i, data in enumerate(datas)
+        ])
+        db.session.add_all([
+            Notificacao(usuario_id=self.test_user.id, titulo='Antiga', mensagem='-', tipo='info', created_at=datetime(2025, 1, 5)),
+            Notificacao(usuario_id=self.test_user.id, titulo='Recente', mensagem='-', tipo='info', created_at=datetime(2026, 10, 1))
+        ])
+        db.session.commit()
+        
+        hoje = datetime(2026, 10, 17)
+        resultado = ArquivoService.arquivar('historico_equipamento', retencao_meses=12, formato='jsonl', hoje=hoje)
+        self.assertEqual((resultado['meses'], resultado['linhas'], resultado['corte']), (2, 3, '2025-10-01T00:00:00'))
+        self.assertTrue(os.path.exists(os.path.join(diretorio, 'historico_equipamento', '2024-01.jsonl.gz')))
+        self.assertEqual(HistoricoEquipamento.query.count(), 2)
+        self.assertEqual(ArquivoService.arquivar('historico_equipamento', 12, 'jsonl', hoje=hoje)['linhas'], 0)
+        self.assertEqual(ArquivoService.arquivar('notificacao', 12, 'jsonl', hoje=hoje)['linhas'], 1)
+        self.assertEqual([linha['titulo'] for linha in ArquivoService.ler('notificacao')], ['Antiga'])
+        
+        # Linha do tempo: banco primeiro, depois os arquivos, sem repetir nem pular eventos
+        descricoes = []
+        cursor = None
+        while True:
+            pagina = HistoricoService.linha_do_tempo(equipamento.id_interno, cursor=cursor, por_pagina=2)
+            descricoes += [evento['descricao'] for evento in pagina['eventos']]
+            cursor = pagina['proximo_cursor']
+            if not cursor:
+                break
+        self.assertEqual(descricoes, [f'Evento {i}' for i in range(4, -1, -1)])
+        self.assertEqual(pagina['eventos'][-1]['usuario'], 'testuser')
+        
+        self.assertEqual(ReconstrucaoService.estado_em(equipamento, datetime(2024, 1, 15))['estado']['localizacao'], 'Sala 1')
+        self.assertEqual(ReconstrucaoService.estado_em(equipamento, datetime(2023, 12, 1))['eventos_revertidos'], 5)
+        with self.assertRaises(ValueError):
+            ArquivoService.arquivar('usuario', 12)
+        
+        # Equipamento criado depois do corte: a linha do tempo não abre os arquivos
+        from unittest import mock
+        novo = Equipamento(id_publico='PAT-002', tipo='Monitor', status='Em uso', created_at=datetime(2026, 1, 1))
+        db.session.add(novo)
+        db.session.commit()
+        HistoricoService.registrar_acao(novo.id_interno, 'Criado', 'Novo')
+        db.session.commit()
+        with mock.patch.object(ArquivoService, 'ler_ate', side_effect=AssertionError('arquivo lido')):
+            pagina = HistoricoService.linha_do_tempo(novo.id_interno)
+        self.assertEqual([evento['descricao'] for evento in pagina['eventos']], ['Novo'])
+        self.assertEqual(list(ArquivoService.ler('historico_equipamento', filtros={'equipamento_id': novo.id_interno})), [])
+    
+class ConsultaServiceTestCase(BaseTestCase):
+    """Testes para a consulta paginada por cursor"""
+    
+    def setUp(self):
+        super().setUp()
+        from services import ConsultaService
+        self.ConsultaService = ConsultaService
+        for i in range(1, 8):
+            db.session.add(Equipamento(
+                id_publico=f'PAT-{i:03d}',
+                tipo='Notebook',
+                status='Em uso' if i % 2 else 'Estocado',
+                localizacao='Sala 1'
+            ))
+        db.session.commit()
+    
+    def test_paginacao_percorre_todos_sem_repetir(self):
+        """Testar que os cursores percorrem todos os registros uma única vez"""
+        vistos = []
+        pagina = self.ConsultaService.paginar({}, por_pagina=3)
+        vistos += [e.id_publico for e in pagina['itens']]
+        self.assertIsNone(pagina['cursor_anterior'])
+        while pagina['proximo_cursor']:
+            pagina = self.ConsultaService.paginar({}, cursor=pagina['proximo_cursor'], por_pagina=3)
+            vistos += [e.id_publico for e in pagina['itens']]
+        
+        self.assertEqual(vistos, [f'PAT-{i:03d}' for i in range(1, 8)])
+        
+        # Voltar uma página a partir da última
+        anterior = self.ConsultaService.paginar({}, cursor=pagina['cursor_anterior'], por_pagina=3)
+        self.assertEqual([e.id_publico for e in anterior['itens']], ['PAT-004', 'PAT-005', 'PAT-006'])
+    
+    def test_cursor_com_chave_de_tipo_errado_volta_ao_inicio(self):
+        """Testar que um cursor adulterado é tratado como primeira página"""
+        from utils import codificar_cursor
+        for chave in ([1, 2], 5, None):
+            cursor = codificar_cursor({'o': 'id_publico', 'k': chave})
+            pagina = self.ConsultaService.paginar({}, cursor=cursor, por_pagina=3)
+            self.assertEqual([e.id_publico for e in pagina['itens']], ['PAT-001', 'PAT-002', 'PAT-003'])
+        cursor = codificar_cursor({'o': 'recentes', 'k': 'PAT-003'})
+        self.assertEqual(len(self.ConsultaService.paginar({}, ordenacao='recentes', cursor=cursor)['itens']), 7)
+    
+    def test_ordem_numerica_dos_ids_publicos(self):
+        """Testar que PAT-999 vem antes de PAT-1000 na paginação, nas etiquetas e nos termos em lote"""
+        from etiquetas import EtiquetaService
+        from services import TermoLoteService
+        db.session.add_all([Equipamento(id_publico=f'PAT-{i:03d}', tipo='Monitor', status='Em uso', localizacao='Sala 9')
+                            for i in (1001, 999, 1000, 998)])
+        db.session.commit()
+        esperados = ['PAT-998', 'PAT-999', 'PAT-1000', 'PAT-1001']
+        filtros = {'localizacao': 'Sala 9'}
+        
+        vistos = []
+        pagina = self.ConsultaService.paginar(filtros, por_pagina=1)
+        vistos += [e.id_publico for e in pagina['itens']]
+        while pagina['proximo_cursor']:
+            pagina = self.ConsultaService.paginar(filtros, cursor=pagina['proximo_cursor'], por_pagina=1)
+            vistos += [e.id_publico for e in pagina['itens']]
+        self.assertEqual(vistos, esperados)
+        
+        decrescente = self.ConsultaService.paginar(filtros, ordenacao='id_publico_desc', por_pagina=2)
+        self.assertEqual([e.id_publico for e in decrescente['itens']], ['PAT-1001', 'PAT-1000'])
+        seguinte = self.ConsultaService.paginar(filtros, ordenacao='id_publico_desc',
+                                                cursor=decrescente['proximo_cursor'], por_pagina=2)
+        self.assertEqual([e.id_publico for e in seguinte['itens']], ['PAT-999', 'PAT-998'])
+        
+        self.assertEqual([linha.id_publico for linha in EtiquetaService.selecionar(filtros=filtros)], esperados)
+        self.assertEqual([eq.id_publico for eq in TermoLoteService.selecionar(filtros=filtros)], esperados)
+    
+    def test_filtros(self):
+        """Testar filtros de status e datas inválidas"""
+        filtros = self.ConsultaService.extrair_filtros({'status': 'Estocado'})
+        pagina = self.ConsultaService.paginar(filtros)
+        self.assertEqual(len(pagina['itens']), 3)
+        
+        with self.assertRaises(ValueError):
+            self.ConsultaService.extrair_filtros({'aquisicao_de': '31/12/2024'})
+
+class SearchServiceTestCase(BaseTestCase):
+    """Testes para a busca textual"""
+    
+    def test_busca_ordena_por_relevancia(self):
+        """Testar que o ID exato vem antes de correspondências parciais"""
+        from services import SearchService
+        db.session.add(Equipamento(id_publico='PAT-010', tipo='Mouse', status='Estocado'))
+        db.session.add(Equipamento(id_publico='PAT-001', tipo='Notebook', status='Estocado'))
+        db.session.add(Equipamento(id_publico='PAT-100', tipo='Monitor', responsavel='pat-001 reserva', status='Estocado'))
+        db.session.commit()
+        
+        resultados = SearchService.buscar_equipamentos('PAT-001')
+        self.assertEqual([r['id_publico'] for r in resultados], ['PAT-001', 'PAT-100'])
+        self.assertEqual(SearchService.buscar_equipamentos('%'), [])
+
+class ImportacaoTestCase(BaseTestCase):
+    """Testes para a importação em lote"""
+    
+    def test_importar_csv_reporta_erros_por_linha(self):
+        """Testar que linhas válidas entram e inválidas são reportadas"""
+        from io import BytesIO
+        from importacao import ImportacaoService
+        from models import HistoricoEquipamento
+        
+        conteudo = (
+            "Tipo;Número Série;Valor;Data Aquisição\n"
+            "Notebook;ABC1;1.500,00;15/01/2024\n"
+            ";ABC2;10;2024-01-15\n"
+            "Mouse;ABC3;abc;2024-02-30\n"
+        ).encode('utf-8')
+        
+        relatorio = ImportacaoService.importar(BytesIO(conteudo), 'planilha.csv')
+        
+        self.assertEqual(relatorio['importados'], 1)
+        self.assertEqual([e['linha'] for e in relatorio['erros']], [3, 4])
+        self.assertEqual(len(relatorio['erros'][1]['mensagens']), 2)
+        
+        equipamento = Equipamento.query.filter_by(num_serie='ABC1').first()
+        self.assertEqual(equipamento.valor, 1500.00)
+        self.assertEqual(equipamento.data_aquisicao, date(2024, 1, 15))
+        self.assertEqual(HistoricoEquipamento.query.filter_by(equipamento_id=equipamento.id_interno).count(), 1)
 
 class SecurityTestCase(BaseTestCase):
     """Testes para segurança"""
@@ -261,6 +698,31 @@ class SecurityTestCase(BaseTestCase):
         # A próxima deve ser bloqueada
         self.assertFalse(limiter.is_allowed('test_ip2', max_requests=5, window_minutes=1))
 
+    def test_rate_limiter_compartilhado_entre_processos(self):
+        """Testar backend SQLite: dois limiters (workers) no mesmo arquivo somam as requisições"""
+        from security import SQLiteRateLimitBackend
+        caminho = os.path.join(tempfile.mkdtemp(), 'rate_limit.db')
+        worker_a = RateLimiter(SQLiteRateLimitBackend(caminho))
+        worker_b = RateLimiter(SQLiteRateLimitBackend(caminho))
+        
+        for i in range(3):
+            self.assertTrue(worker_a.is_allowed('ip', max_requests=6, window_minutes=1))
+            self.assertTrue(worker_b.is_allowed('ip', max_requests=6, window_minutes=1))
+        self.assertFalse(worker_a.is_allowed('ip', max_requests=6, window_minutes=1))
+        self.assertFalse(worker_b.is_allowed('ip', max_requests=6, window_minutes=1))
+    
+    def test_rate_limiter_descarta_ociosos(self):
+        """Testar limpeza de identificadores ociosos no backend em memória"""
+        from security import MemoriaRateLimitBackend
+        backend = MemoriaRateLimitBackend(intervalo_limpeza=0)
+        agora = time.time()
+        for i in range(100):
+            backend.registrar(f'ip{i}', 10, 60, 900, agora)
+        self.assertEqual(len(backend), 100)
+        
+        backend.registrar('novo', 10, 60, 900, agora + 121)
+        self.assertEqual(len(backend), 1)
+
 class UtilsTestCase(BaseTestCase):
     """Testes para utilitários"""
     
@@ -287,6 +749,116 @@ class UtilsTestCase(BaseTestCase):
         self.assertTrue(validate_cnpj(''))                    # Vazio é permitido
         self.assertTrue(validate_cnpj(None))                  # None é permitido
         self.assertFalse(validate_cnpj('123'))               # Muito curto
+    
+    def test_etiquetas_folhas_e_cache(self):
+        """Testar paginação das etiquetas e cache dos códigos por id_publico"""
+        import re
+        from etiquetas import EtiquetaService, modulos_qr, LAYOUTS
+        db.session.add_all([
+            Equipamento(id_publico=f'PAT-{i:03d}', tipo='Notebook', status='Em uso', localizacao='Almoxarifado')
+            for i in range(1, 26)
+        ])
+        db.session.commit()
+        
+        linhas = EtiquetaService.selecionar(filtros={'localizacao': 'Almox'})
+        self.assertEqual(len(linhas), 25)
+        
+        modulos_qr.cache_clear()
+        pdf = EtiquetaService.gerar_pdf(linhas, '3x8')
+        por_folha = LAYOUTS['3x8']['colunas'] * LAYOUTS['3x8']['linhas']
+        self.assertEqual(len(re.findall(rb'/Type /Page\b(?!s)', pdf)), -(-25 // por_folha))
+        
+        EtiquetaService.gerar_pdf(linhas, '2x7')
+        self.assertEqual(modulos_qr.cache_info().currsize, 25)
+        
+        with self.assertRaises(ValueError):
+            EtiquetaService.gerar_pdf(linhas, '9x9')
+        
+        # Barras lidas das formas do widget Code128: uma por barra do símbolo
+        from reportlab.graphics.barcode.code128 import Code128
+        from etiquetas import codigo_barras
+        largura, caminho, texto = codigo_barras('PAT-1000')
+        simbolo = Code128('PAT-1000')
+        simbolo.validate()
+        simbolo.encode()
+        simbolo.decompose()
+        larguras = [float(largura_barra) / 0.8 for largura_barra in re.findall(r'\S+ \S+ (\S+) \S+ re', caminho.getCode())]
+        self.assertTrue(larguras)
+        self.assertEqual([round(l) for l in larguras], [ord(c) - ord('A') + 1 for c in simbolo.decomposed if c.isupper()])
+        self.assertEqual(texto[2], 'PAT-1000')
+        self.assertGreater(largura, 0)
+        with self.assertRaises(ValueError):
+            codigo_barras('PAT-ç')
+        
+        # IDs informados: inexistentes ou inativos são recusados, não omitidos da folha
+        self.assertEqual(len(EtiquetaService.selecionar(['PAT-002', 'PAT-001', 'PAT-002'])), 2)
+        Equipamento.query.filter_by(id_publico='PAT-003').first().ativo = False
+        db.session.commit()
+        with self.assertRaisesRegex(ValueError, 'PAT-003, PAT-999'):
+            EtiquetaService.selecionar(['PAT-001', 'PAT-003', 'PAT-999'])
+    
+    def test_termo_renderer_cache(self):
+        """Testar cache de PDFs do termo por hash dos dados"""
+        from termo import TermoRenderer
+        renderer = TermoRenderer()
+        dados = {'patrimonio': 'PAT-001', 'tipo': 'Notebook', 'responsavel': 'Fulano'}
+        
+        pdf = renderer.renderizar(dados)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertIs(renderer.renderizar(dict(reversed(list(dados.items())))), pdf)
+        self.assertIsNot(renderer.renderizar(dict(dados, responsavel='Beltrano')), pdf)
+        
+        renderer.limite_bytes = len(pdf) * 2
+        for tipo in ('Mouse', 'Teclado', 'Monitor'):
+            renderer.renderizar(dict(dados, tipo=tipo))
+        self.assertLessEqual(renderer._bytes_cache, renderer.limite_bytes)
+        self.assertLessEqual(len(renderer._cache), 2)
+    
+    def test_log_assincrono_fila_e_compressao(self):
+        """Testar política de descarte da fila de log e rotação comprimida"""
+        import gzip
+        import queue
+        import logging
+        import logging.handlers
+        from logging_config_simple import FilaLogHandler, _nome_comprimido, _comprimir_rotacao
+        
+        fila_handler = FilaLogHandler(queue.Queue(maxsize=2), politica='descartar', espera=0.01)
+        logger = logging.getLogger('teste_fila_log')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(fila_handler)
+        for i in range(5):
+            logger.info('linha %d', i)
+        logger.removeHandler(fila_handler)
+        self.assertEqual(fila_handler.descartados, 3)
+        self.assertEqual(fila_handler.queue.get_nowait().msg, 'linha 0')
+        
+        diretorio = tempfile.mkdtemp()
+        arquivo = logging.handlers.RotatingFileHandler(os.path.join(diretorio, 'app.log'), maxBytes=50, backupCount=2)
+        arquivo.namer = _nome_comprimido
+        arquivo.rotator = _comprimir_rotacao
+        for i in range(4):
+            arquivo.emit(logging.makeLogRecord({'msg': f'registro de teste {i}' * 3}))
+        arquivo.close()
+        self.assertIn('app.log.1.gz', os.listdir(diretorio))
+        self.assertNotIn('app.log.1', os.listdir(diretorio))
+        with gzip.open(os.path.join(diretorio, 'app.log.1.gz'), 'rt') as comprimido:
+            self.assertIn('registro de teste', comprimido.read())
+    
+    def test_boot_sem_bibliotecas_pesadas(self):
+        """Testar que importar a aplicação não carrega reportlab, qrcode, pandas nem o SDK do Azure"""
+        import subprocess
+        codigo = (
+            "import sys, app; "
+            "print('carregadas:' + ','.join(m for m in ('reportlab', 'qrcode', 'pandas', 'azure.storage.blob') if m in sys.modules))"
+        )
+        ambiente = dict(os.environ, DATABASE_URL='sqlite:///:memory:')
+        resultado = subprocess.run(
+            [sys.executable, '-c', codigo],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=ambiente, capture_output=True, text=True
+        )
+        self.assertEqual(resultado.returncode, 0, resultado.stderr)
+        self.assertEqual(resultado.stdout.strip().splitlines()[-1], 'carregadas:')
 
 class ViewTestCase(BaseTestCase):
     """Testes para as views"""
@@ -309,7 +881,7 @@ class ViewTestCase(BaseTestCase):
             'username': 'invalid',
             'senha': 'wrong'
         }, follow_redirects=True)
-        self.assertIn(b'Credenciais inválidas', response.data)
+        self.assertIn('Credenciais inválidas'.encode(), response.data)
     
     def test_home_requires_login(self):
         """Testar que home requer login"""
@@ -321,6 +893,184 @@ class ViewTestCase(BaseTestCase):
         self.login()
         response = self.client.get('/')
         self.assertEqual(response.status_code, 200)
+    
+    def test_consulta_parametros_desconhecidos_e_links_lote(self):
+        """Testar que parâmetros estranhos não quebram a consulta e links de lote exigem filtro"""
+        self.login()
+        for consulta in ('formato=zip', 'endpoint=x', 'ordenacao=recentes'):
+            response = self.client.get(f'/consulta?{consulta}')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('/termos/lote', response.get_data(as_text=True))
+        
+        response = self.client.get('/consulta?status=Em+uso&ordenacao=recentes&formato=zip')
+        pagina = response.get_data(as_text=True)
+        self.assertIn('/termos/lote?formato=zip&amp;status=Em+uso', pagina)
+        self.assertNotIn('ordenacao=recentes&amp;formato', pagina)
+    
+    def test_server_timing_e_consultas_repetidas(self):
+        """Testar header Server-Timing e detecção de comandos repetidos (N+1)"""
+        from instrumentacao import EstatisticasSQL
+        
+        self.login()
+        response = self.client.get('/consulta')
+        self.assertIn('db;dur=', response.headers.get('Server-Timing', ''))
+        
+        estatisticas = EstatisticasSQL()
+        for _ in range(6):
+            estatisticas.registrar('SELECT * FROM categoria WHERE id = ?', 0.001)
+        estatisticas.registrar('SELECT * FROM equipamento', 0.002)
+        repetidas = estatisticas.repetidas(5)
+        self.assertEqual(estatisticas.consultas, 7)
+        self.assertEqual(len(repetidas), 1)
+        self.assertEqual(repetidas[0]['vezes'], 6)
+        
+        # Comando com erro também é contado
+        from flask import g
+        from sqlalchemy.exc import OperationalError
+        with self.app.test_request_context('/'):
+            g._estatisticas_sql = EstatisticasSQL()
+            with self.assertRaises(OperationalError):
+                db.session.execute(db.text('SELECT * FROM tabela_inexistente'))
+            db.session.rollback()
+            self.assertIn('SELECT * FROM tabela_inexistente', g._estatisticas_sql.por_comando)
+    
+    def test_metrics_agrega_workers(self):
+        """Testar /metrics somando o estado gravado por outro worker"""
+        import json
+        from metricas import metricas
+        
+        diretorio = tempfile.mkdtemp()
+        metricas.limpar()
+        metricas.diretorio = diretorio
+        try:
+            self.client.get('/login')
+            outro = {'patrimonio_requisicoes_total': {json.dumps(['login', 'GET', '200']): 4}}
+            with open(os.path.join(diretorio, 'metricas_1.json'), 'w') as arquivo:
+                json.dump(outro, arquivo)
+            
+            # Sem token configurado, só usuários autenticados
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            self.app.config['METRICAS_TOKEN'] = 'segredo'
+            self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer errado'}).status_code, 401)
+            texto = self.client.get('/metrics', headers={'Authorization': 'Bearer segredo'}).get_data(as_text=True)
+            self.assertIn('# TYPE patrimonio_requisicao_segundos histogram', texto)
+            self.assertIn('patrimonio_requisicoes_total{endpoint="login",metodo="GET",status="200"} 5', texto)
+            self.assertIn('patrimonio_requisicao_segundos_count{endpoint="login",status="200"} 1', texto)
+        finally:
+            metricas.diretorio = None
+    
+    def test_api_depreciacao_categorias(self):
+        """Testar API de depreciação por categoria e validação dos parâmetros"""
+        self.login()
+        db.session.add(Equipamento(id_publico='PAT-001', tipo='Notebook', status='Em uso', valor=1200.0,
+                                   vida_util_anos=4, data_aquisicao=date(2024, 1, 1)))
+        db.session.commit()
+        
+        dados = self.client.get('/api/depreciacao/categorias?data=2026-01-01&anos=1').get_json()
+        # Ano de 365,25 dias (mesma base de valor_atual)
+        self.assertAlmostEqual(dados['totais']['valor_contabil'], 600.0, delta=1)
+        projecao = dados['categorias'][0]['projecao']
+        self.assertEqual([p['data'] for p in projecao], ['2027-01-01'])
+        self.assertAlmostEqual(projecao[0]['valor_contabil'], 300.0, delta=1)
+        self.assertEqual(self.client.get('/api/depreciacao/categorias?data=01/01/2026').status_code, 400)
+        self.assertEqual(self.client.get('/api/depreciacao/categorias?anos=99').status_code, 400)
+    
+    def test_api_depreciacao_previsao_xlsx(self):
+        """Testar previsão de depreciação exportada em XLSX"""
+        import io
+        from openpyxl import load_workbook
+        self.login()
+        db.session.add(Equipamento(id_publico='PAT-001', tipo='Notebook', status='Em uso', valor=1200.0,
+                                   vida_util_anos=4, data_aquisicao=date(2024, 1, 1), departamento='TI'))
+        db.session.commit()
+        
+        response = self.client.get('/api/depreciacao/previsao?formato=xlsx&meses=12&agrupar_por=departamento')
+        self.assertEqual(response.status_code, 200)
+        livro = load_workbook(io.BytesIO(response.data), read_only=True)
+        self.assertEqual(livro.sheetnames, ['Valor contábil', 'Fim de vida', 'Custo de reposição', 'Resumo anual'])
+        linhas = list(livro['Valor contábil'].iter_rows(values_only=True))
+        self.assertEqual(linhas[0][:3], ('Departamento', 'Quantidade', 'Vencidos'))
+        self.assertEqual(len(linhas[0]), 3 + 12)
+        self.assertEqual([linha[0] for linha in linhas[1:]], ['TI', 'Total'])
+        self.assertEqual(self.client.get('/api/depreciacao/previsao?formato=pdf').status_code, 400)
+    
+    def test_api_historico_equipamento_paginado(self):
+        """Testar linha do tempo do equipamento com cursor e filtros"""
+        self.login()
+        equipamento = Equipamento(id_publico='PAT-001', tipo='Notebook', status='Em uso')
+        db.session.add(equipamento)
+        db.session.commit()
+        usuario = Usuario.query.filter_by(username='testuser').first()
+        momento = datetime(2026, 3, 1, 10)
+        # Pares de eventos no mesmo instante: o desempate é pelo id
+        HistoricoService.registrar_lote([
+            HistoricoService.montar_registro(
+                equipamento.id_interno, 'Movido' if i % 2 else 'Editado', f'Evento {i}',
+                campo_alterado='localizacao' if i % 2 else 'status',
+                usuario_id=usuario.id if i < 3 else None, data_acao=momento + timedelta(hours=i // 2)
+            )
+            for i in range(7)
+        ])
+        db.session.commit()
+        
+        descricoes = []
+        cursor = ''
+        while True:
+            response = self.client.get(f'/api/equipamento/PAT-001/historico?por_pagina=3&cursor={cursor}')
+            self.assertEqual(response.status_code, 200)
+            data = response.get_json()
+            descricoes += [evento['descricao'] for evento in data['eventos']]
+            cursor = data['proximo_cursor']
+            if not cursor:
+                break
+        self.assertEqual(descricoes, [f'Evento {i}' for i in range(6, -1, -1)])
+        
+        data = self.client.get('/api/equipamento/PAT-001/historico?acao=Movido&usuario=testuser').get_json()
+        self.assertEqual([evento['descricao'] for evento in data['eventos']], ['Evento 1'])
+        self.assertEqual(data['eventos'][0]['usuario'], 'testuser')
+        data = self.client.get('/api/equipamento/PAT-001/historico?campo_alterado=status').get_json()
+        self.assertEqual(len(data['eventos']), 4)
+        self.assertEqual(self.client.get('/api/equipamento/PAT-999/historico').status_code, 404)
+    
+    def test_api_estado_equipamento(self):
+        """Testar reconstrução do estado de um equipamento por data"""
+        self.login()
+        equipamento = Equipamento(id_publico='PAT-001', tipo='Notebook', status='Em uso', responsavel='Bia',
+                                  created_at=datetime(2026, 1, 1))
+        db.session.add(equipamento)
+        db.session.commit()
+        HistoricoService.registrar_lote([HistoricoService.montar_registro(
+            equipamento.id_interno, 'Editado', 'Transferido', campo_alterado='responsavel',
+            valor_anterior='Ana', valor_novo='Bia', data_acao=datetime(2026, 3, 1, 10)
+        )])
+        db.session.commit()
+        
+        response = self.client.get('/api/equipamento/PAT-001/estado?em=2026-02-28')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['estado']['responsavel'], 'Ana')
+        self.assertEqual(data['instante'], '2026-02-28T23:59:59.999999')
+        response = self.client.get('/api/equipamento/PAT-001/estado?em=2026-03-01T10:00:00Z')
+        self.assertEqual(response.get_json()['estado']['responsavel'], 'Bia')
+        self.assertEqual(self.client.get('/api/equipamento/PAT-001/estado?em=2025-12-31').status_code, 404)
+        self.assertEqual(self.client.get('/api/equipamento/PAT-999/estado?em=2026-02-28').status_code, 404)
+        self.assertEqual(self.client.get('/api/equipamento/PAT-001/estado?em=28/02/2026').status_code, 400)
+    
+    def test_benchmark_dados_sinteticos(self):
+        """Testar o gerador de dados sintéticos e os cenários do benchmark"""
+        from benchmark import GeradorDados, executar_cenarios, CENARIOS
+        
+        volumes = GeradorDados(semente=1, escala=0.001).gerar()['volumes']
+        self.assertEqual(volumes['equipamentos'], 100)
+        self.assertEqual(volumes['historico'], 1000)
+        self.assertEqual(volumes['notificacoes'], 10)
+        
+        self.login()
+        resultados = executar_cenarios(self.client, repeticoes=1, aquecimento=0)
+        self.assertEqual(set(resultados), set(CENARIOS))
+        for nome, resumo in resultados.items():
+            self.assertEqual(resumo['status'], [200], nome)
+            self.assertGreater(resumo['mediana_ms'], 0)
 
 class IntegrationTestCase(BaseTestCase):
     """Testes de integração"""
@@ -369,6 +1119,9 @@ def create_test_suite():
     test_classes = [
         ModelTestCase,
         ServiceTestCase,
+        ConsultaServiceTestCase,
+        SearchServiceTestCase,
+        ImportacaoTestCase,
         SecurityTestCase,
         UtilsTestCase,
         ViewTestCase,
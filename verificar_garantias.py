@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Job agendado: notificações de garantias expirando
+
+Uso (ex.: cron diário):
+    python verificar_garantias.py [--dias 30]
+"""
+import sys
+import argparse
+
+from app import app
+from services import NotificacaoService
+
+def main():
+    parser = argparse.ArgumentParser(description='Notifica administradores sobre garantias expirando')
+    parser.add_argument('--dias', type=int, default=30, help='Janela em dias até o vencimento (padrão: 30)')
+    args = parser.parse_args()
+    
+    with app.app_context():
+        try:
+            resultado = NotificacaoService.verificar_garantias_expirando(dias=args.dias)
+        except Exception as e:
+            print(f"❌ Erro ao gerar notificações: {e}")
+            return 1
+        
+        print(f"📦 Equipamentos com garantia expirando: {resultado['equipamentos']}")
+        print(f"👥 Destinatários: {resultado['destinatarios']}")
+        print(f"🔔 Notificações criadas: {resultado['criadas']}")
+        print(f"↺ Já existentes (ignoradas): {resultado['ignoradas']}")
+        print(f"⏱️  Tempo: {resultado['segundos']:.3f}s")
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Verificação dos índices dos caminhos de acesso (EXPLAIN)
+
+Roda EXPLAIN (PostgreSQL) / EXPLAIN QUERY PLAN (SQLite) nas consultas que a
+migração indices_caminhos_acesso atende e informa se o índice esperado é usado.
+
+Uso:
+    python verificar_indices.py --saida antes.json      # antes de `flask db upgrade`
+    python verificar_indices.py --comparar antes.json   # depois, mostra antes -> depois
+    python verificar_indices.py --exigir                # código de saída 1 se algum índice não for usado
+
+Em tabelas pequenas o PostgreSQL prefere seq scan mesmo com índice; use
+--sem-seqscan para confirmar que o índice é utilizável.
+"""
+import sys
+import json
+import argparse
+from datetime import date, timedelta
+
+from app import app
+from models import db, Equipamento, HistoricoEquipamento, Notificacao
+
+def _consultas(hoje):
+    """(nome, índice esperado, select) de cada caminho de acesso"""
+    return (
+        ('equipamentos_por_status', 'ix_equipamento_status',
+         db.select(Equipamento.id_interno).where(Equipamento.status == 'Em uso')),
+        ('garantias_expirando', 'ix_equipamento_ativo_garantia',
+         db.select(Equipamento.id_interno, Equipamento.garantia_ate).where(
+             Equipamento.garantia_ate <= hoje + timedelta(days=30),
+             Equipamento.garantia_ate >= hoje,
+             Equipamento.ativo == True
+         )),
+        ('historico_do_equipamento', 'ix_historico_equipamento_data',
+         db.select(HistoricoEquipamento.id, HistoricoEquipamento.acao)
+         .where(HistoricoEquipamento.equipamento_id == 1)
+         .order_by(HistoricoEquipamento.data_acao.desc()).limit(50)),
+        ('notificacoes_nao_lidas', 'ix_notificacao_usuario_lida',
+         db.select(Notificacao.id, Notificacao.titulo)
+         .where(Notificacao.usuario_id == 1, Notificacao.lida == False)
+         .order_by(Notificacao.created_at.desc())),
+        ('equipamentos_da_categoria', 'ix_equipamento_categoria_id',
+         db.select(Equipamento.id_interno).where(Equipamento.categoria_id == 1)),
+        ('equipamentos_do_fornecedor', 'ix_equipamento_fornecedor_id',
+         db.select(Equipamento.id_interno).where(Equipamento.fornecedor_id == 1)),
+    )
+
+def explicar(conexao, consulta):
+    """Plano de execução da consulta como texto"""
+    sql = str(consulta.compile(dialect=conexao.dialect, compile_kwargs={'literal_binds': True}))
+    dialeto = conexao.dialect.name
+    if dialeto == 'sqlite':
+        return '\n'.join(linha[3] for linha in conexao.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}'))
+    if dialeto == 'postgresql':
+        return '\n'.join(linha[0] for linha in conexao.exec_driver_sql(f'EXPLAIN {sql}'))
+    raise ValueError(f"EXPLAIN não suportado para o banco '{dialeto}'")
+
+def verificar(conexao, hoje=None, sem_seqscan=False):
+    """{nome: {'indice', 'usa_indice', 'plano'}} para cada caminho de acesso"""
+    if sem_seqscan and conexao.dialect.name == 'postgresql':
+        conexao.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    resultado = {}
+    for nome, indice, consulta in _consultas(hoje or date.today()):
+        plano = explicar(conexao, consulta)
+        resultado[nome] = {'indice': indice, 'usa_indice': indice in plano, 'plano': plano}
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description='Confere com EXPLAIN se as consultas usam os índices esperados')
+    parser.add_argument('--saida', help='Grava o resultado em JSON (ex.: antes da migração)')
+    parser.add_argument('--comparar', help='JSON gravado antes, para comparar os planos')
+    parser.add_argument('--sem-seqscan', action='store_true', help='PostgreSQL: desabilita seq scan na verificação')
+    parser.add_argument('--exigir', action='store_true', help='Sai com código 1 se algum índice não for usado')
+    parser.add_argument('--planos', action='store_true', help='Mostra o plano completo de cada consulta')
+    args = parser.parse_args()
+    
+    with app.app_context():
+        conexao = db.session.connection()
+        try:
+            resultado = verificar(conexao, sem_seqscan=args.sem_seqscan)
+        except Exception as e:
+            print(f"❌ Erro ao obter os planos: {e}")
+            return 1
+        finally:
+            db.session.rollback()
+    
+    anterior = {}
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            anterior = json.load(arquivo)
+    
+    for nome, item in resultado.items():
+        marca = '✅' if item['usa_indice'] else '⚠️ '
+        linha = f"{marca} {nome}: {item['indice']}"
+        if nome in anterior:
+            antes = 'índice' if anterior[nome]['usa_indice'] else 'sem índice'
+            depois = 'índice' if item['usa_indice'] else 'sem índice'
+            linha += f" ({antes} -> {depois})"
+        print(linha)
+        if args.planos or not item['usa_indice']:
+            for passo in item['plano'].splitlines():
+                print(f"     {passo}")
+    
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+        print(f"💾 Planos gravados em {args.saida}")
+    
+    sem_indice = [nome for nome, item in resultado.items() if not item['usa_indice']]
+    print(f"📊 {len(resultado) - len(sem_indice)}/{len(resultado)} consultas usando o índice esperado")
+    return 1 if args.exigir and sem_indice else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,17 +3,21 @@ Views/Controllers do Sistema de Controle de Patrimônio
 Separação das rotas e lógica de apresentação
 """
 import os
-import pandas as pd
 from datetime import datetime
-from flask import render_template, request, redirect, url_for, flash, send_file, jsonify, Response, session
+from flask import render_template, request, redirect, url_for, flash, send_file, jsonify, Response, session, stream_with_context
 from flask_login import login_required, current_user, login_user, logout_user
+from sqlalchemy.orm import joinedload
 from werkzeug.utils import secure_filename
+import hmac
 import uuid
 import bcrypt
 
 from models import db, Usuario, Equipamento, Categoria, Fornecedor
-from services import EquipamentoService, HistoricoService, ReportService, SearchService
-from utils import criar_termo_cautela_pdf, allowed_file
+from services import EquipamentoService, ConsultaService, ExportService, HistoricoService, ReportService, SearchService, TermoLoteService
+from utils import allowed_file
+from termo import termo_renderer, montar_dados_termo
+from cache_usuarios import cache_usuarios
+from metricas import metricas, contar_bytes, TAMANHO_EXPORTACAO
 
 def init_routes(app):
     """Inicializa todas as rotas da aplicação"""
@@ -43,6 +47,7 @@ def init_routes(app):
                 # Atualizar último login
                 usuario.last_login = datetime.utcnow()
                 db.session.commit()
+                cache_usuarios.invalidar(usuario.id)
                 
                 flash("Login realizado com sucesso!", "success")
                 return redirect(url_for('home'))
@@ -247,27 +252,65 @@ def init_routes(app):
     @app.route('/consulta', methods=['GET', 'POST'])
     @login_required
     def consulta():
-        """Consulta de equipamentos"""
-        busca = request.form.get('busca') if request.method == 'POST' else request.args.get('busca', '')
-        ordenacao = request.args.get('ordenacao', 'id_publico')
-
-        query = Equipamento.query
-        if busca:
-            query = query.filter(
-                db.or_(
-                    Equipamento.id_publico.ilike(f"%{busca}%"),
-                    Equipamento.tipo.ilike(f"%{busca}%"),
-                    Equipamento.marca.ilike(f"%{busca}%"),
-                    Equipamento.localizacao.ilike(f"%{busca}%"),
-                    Equipamento.responsavel.ilike(f"%{busca}%")
-                )
+        """Consulta de equipamentos (paginada por cursor, com filtros no servidor)"""
+        try:
+            filtros = ConsultaService.extrair_filtros(request.values)
+        except ValueError as e:
+            flash(str(e), 'error')
+            filtros = {}
+        
+        pagina = ConsultaService.paginar(
+            filtros,
+            ordenacao=request.values.get('ordenacao', 'id_publico'),
+            cursor=request.values.get('cursor'),
+            por_pagina=request.values.get('por_pagina')
+        )
+        
+        # Parâmetros preservados nos links de navegação entre páginas; só os
+        # conhecidos, para não colidir com argumentos do url_for (ex.: endpoint)
+        campos_filtro = ConsultaService.FILTROS_TEXTO + ConsultaService.FILTROS_DATA
+        parametros = {
+            k: request.values[k] for k in campos_filtro + ('ordenacao', 'por_pagina') if request.values.get(k)
+        }
+        # Links de termos/etiquetas em lote só com algum filtro de fato
+        filtros_lote = {k: v for k, v in parametros.items() if k in campos_filtro}
+        categorias = Categoria.query.filter_by(ativo=True).order_by(Categoria.nome).all()
+        
+        return render_template('consulta.html',
+                             resultados=pagina['itens'],
+                             busca=filtros.get('busca', ''),
+                             pagina=pagina,
+                             parametros=parametros,
+                             filtros_lote=filtros_lote,
+                             categorias=categorias)
+    
+    @app.route('/api/consulta')
+    @login_required
+    def api_consulta():
+        """API: Consulta paginada de equipamentos (mesmos filtros de /consulta)"""
+        try:
+            filtros = ConsultaService.extrair_filtros(request.args)
+            campos = EquipamentoService.extrair_campos(request.args.get('campos'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        try:
+            pagina = ConsultaService.paginar(
+                filtros,
+                ordenacao=request.args.get('ordenacao', 'id_publico'),
+                cursor=request.args.get('cursor'),
+                por_pagina=request.args.get('por_pagina')
             )
-
-        if ordenacao == 'id_publico':
-            query = query.order_by(Equipamento.id_publico.asc())
-
-        resultados = query.all()
-        return render_template('consulta.html', resultados=resultados, busca=busca)
+            return jsonify({
+                'resultados': EquipamentoService.serializar_lista(pagina['itens'], campos),
+                'ordenacao': pagina['ordenacao'],
+                'por_pagina': pagina['por_pagina'],
+                'proximo_cursor': pagina['proximo_cursor'],
+                'cursor_anterior': pagina['cursor_anterior']
+            })
+        except Exception as e:
+            app.logger.error(f"Erro na API de consulta: {e}")
+            return jsonify({'error': 'Erro ao consultar equipamentos'}), 500
     
     @app.route('/equipamento/<id_publico>/editar', methods=['GET', 'POST'])
     @login_required
@@ -358,19 +401,10 @@ def init_routes(app):
                             'novo': 'imagem atualizada'
                         })
                 
+                # Histórico das alterações em um único INSERT, no mesmo commit da edição
+                HistoricoService.registrar_alteracoes(equipamento.id_interno, campos_alterados)
                 db.session.commit()
                 
-                # Registrar histórico para cada campo alterado
-                for alteracao in campos_alterados:
-                    HistoricoService.registrar_acao(
-                        equipamento_id=equipamento.id_interno,
-                        acao='Editado',
-                        campo_alterado=alteracao['campo'],
-                        valor_anterior=str(alteracao['antigo']),
-                        valor_novo=str(alteracao['novo']),
-                        descricao=f"Campo '{alteracao['campo']}' alterado de '{alteracao['antigo']}' para '{alteracao['novo']}'"
-                    )
-                
                 flash(f'Equipamento {equipamento.id_publico} atualizado com sucesso!', 'success')
                 return redirect(url_for('consulta'))
                 
@@ -421,32 +455,64 @@ def init_routes(app):
     @app.route('/exportar_csv')
     @login_required
     def exportar_csv():
-        """Exportar dados para CSV"""
+        """Exportar dados para CSV (streaming, aceita os mesmos filtros de /consulta)"""
         try:
-            equipamentos = Equipamento.query.all()
-            df = pd.DataFrame([{
-                'ID Público': e.id_publico,
-                'Tipo': e.tipo,
-                'Marca': e.marca,
-                'Modelo': e.modelo,
-                'Número Série': e.num_serie,
-                'Data Aquisição': e.data_aquisicao,
-                'Localização': e.localizacao,
-                'Status': e.status,
-                'Responsável': e.responsavel,
-                'Valor': e.valor,
-                'SPE': e.SPE,
-                'Centro de Custo': e.centro_custo,
-                'Garantia até': e.garantia_ate
-            } for e in equipamentos])
-            
-            csv_path = os.path.join(app.config['UPLOAD_FOLDER'], 'export.csv')
-            df.to_csv(csv_path, index=False, encoding='utf-8-sig')
-            return send_file(csv_path, as_attachment=True, download_name=f'equipamentos_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv')
-        except Exception as e:
-            flash("Erro ao exportar CSV!", "error")
-            app.logger.error(f"Erro na exportação CSV: {e}")
+            filtros = ConsultaService.extrair_filtros(request.args)
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('consulta'))
+        
+        nome_arquivo = f'equipamentos_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        return Response(
+            stream_with_context(contar_bytes(ExportService.gerar_csv(filtros), 'csv')),
+            mimetype='text/csv; charset=utf-8',
+            headers={'Content-Disposition': f'attachment; filename={nome_arquivo}'}
+        )
+    
+    @app.route('/importar', methods=['GET', 'POST'])
+    @login_required
+    def importar_equipamentos():
+        """Importação em lote de equipamentos (CSV/XLSX)"""
+        if current_user.nivel_acesso < 2:
+            flash('Você não tem permissão para importar equipamentos!', 'error')
             return redirect(url_for('home'))
+        
+        relatorio = None
+        if request.method == 'POST':
+            from importacao import ImportacaoService, EXTENSOES_IMPORTACAO
+            
+            file = request.files.get('arquivo')
+            if not file or file.filename == '':
+                flash('Nenhum arquivo selecionado!', 'error')
+                return redirect(request.url)
+            
+            extensao = file.filename.rsplit('.', 1)[-1].lower() if '.' in file.filename else ''
+            if extensao not in EXTENSOES_IMPORTACAO:
+                flash('Tipo de arquivo não permitido! Use CSV ou XLSX.', 'error')
+                return redirect(request.url)
+            
+            try:
+                relatorio = ImportacaoService.importar(
+                    file.stream,
+                    secure_filename(file.filename),
+                    usuario_id=current_user.id,
+                    ip_address=request.remote_addr,
+                    apenas_validar='apenas_validar' in request.form
+                )
+                if relatorio['importados']:
+                    flash(f"{relatorio['importados']} equipamentos importados com sucesso!", 'success')
+                if relatorio['erros']:
+                    flash(f"{len(relatorio['erros'])} linhas com erro não foram importadas.", 'error')
+            except ValueError as e:
+                flash(str(e), 'error')
+            except Exception as e:
+                flash('Erro ao importar equipamentos!', 'error')
+                app.logger.error(f"Erro na importação em lote: {e}")
+            
+            if relatorio and request.accept_mimetypes.best == 'application/json':
+                return jsonify(relatorio)
+        
+        return render_template('importar_equipamentos.html', relatorio=relatorio)
     
     @app.route('/gerar_pdf')
     @login_required
@@ -477,6 +543,125 @@ def init_routes(app):
             app.logger.error(f"Erro na API dashboard: {e}")
             return jsonify({'error': str(e)}), 500
     
+    @app.route('/api/depreciacao/categorias')
+    @login_required
+    def api_depreciacao_categorias():
+        """API: Depreciação por categoria (?data=AAAA-MM-DD, ?anos=N de projeção)"""
+        from depreciacao import DepreciacaoService
+        
+        try:
+            data = request.args.get('data')
+            data_referencia = datetime.strptime(data, '%Y-%m-%d').date() if data else None
+        except ValueError:
+            return jsonify({'error': 'Data inválida (use AAAA-MM-DD)'}), 400
+        
+        try:
+            return jsonify(DepreciacaoService.relatorio_por_categoria(
+                data_referencia, anos=request.args.get('anos', 0, type=int)
+            ))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            app.logger.error(f"Erro no relatório de depreciação: {e}")
+            return jsonify({'error': 'Erro ao gerar relatório de depreciação'}), 500
+    
+    @app.route('/api/depreciacao/previsao')
+    @login_required
+    def api_depreciacao_previsao():
+        """API: Previsão mensal de valor contábil e reposição
+        
+        ?meses=60, ?agrupar_por=categoria|centro_custo|departamento,
+        ?data=AAAA-MM-DD e ?formato=json|xlsx
+        """
+        from depreciacao import DepreciacaoService, MESES_PREVISAO
+        
+        formato = request.args.get('formato', 'json')
+        if formato not in ('json', 'xlsx'):
+            return jsonify({'error': 'Formato inválido (use json ou xlsx)'}), 400
+        try:
+            data = request.args.get('data')
+            data_referencia = datetime.strptime(data, '%Y-%m-%d').date() if data else None
+        except ValueError:
+            return jsonify({'error': 'Data inválida (use AAAA-MM-DD)'}), 400
+        
+        try:
+            previsao = DepreciacaoService.previsao(
+                data_referencia,
+                meses=request.args.get('meses', MESES_PREVISAO, type=int),
+                agrupar_por=request.args.get('agrupar_por', 'categoria')
+            )
+            if formato == 'json':
+                return jsonify(previsao)
+            
+            planilha = DepreciacaoService.previsao_xlsx(previsao)
+            TAMANHO_EXPORTACAO.observar(len(planilha), formato='previsao_xlsx')
+            return Response(
+                planilha,
+                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                headers={'Content-Disposition': f'attachment; filename=previsao_depreciacao_{previsao["data_referencia"]}.xlsx'}
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            app.logger.error(f"Erro na previsão de depreciação: {e}")
+            return jsonify({'error': 'Erro ao gerar previsão de depreciação'}), 500
+    
+    @app.route('/api/equipamento/<id_publico>/historico')
+    @login_required
+    def api_historico_equipamento(id_publico):
+        """API: Linha do tempo do equipamento, paginada por cursor
+        
+        Filtros opcionais: ?acao, ?campo_alterado e ?usuario (username)
+        """
+        equipamento_id = db.session.execute(
+            db.select(Equipamento.id_interno).where(Equipamento.id_publico == id_publico)
+        ).scalar()
+        if equipamento_id is None:
+            return jsonify({'error': 'Equipamento não encontrado'}), 404
+        
+        try:
+            pagina = HistoricoService.linha_do_tempo(
+                equipamento_id,
+                filtros=HistoricoService.extrair_filtros(request.args),
+                cursor=request.args.get('cursor'),
+                por_pagina=request.args.get('por_pagina')
+            )
+            return jsonify({'id_publico': id_publico, **pagina})
+        except Exception as e:
+            app.logger.error(f"Erro na linha do tempo de {id_publico}: {e}")
+            return jsonify({'error': 'Erro ao carregar histórico do equipamento'}), 500
+    
+    @app.route('/api/equipamento/<id_publico>/estado')
+    @login_required
+    def api_estado_equipamento(id_publico):
+        """API: Estado do equipamento em um instante
+        
+        ?em=AAAA-MM-DD (fim do dia) ou AAAA-MM-DDTHH:MM:SS, em UTC
+        """
+        from reconstrucao import ReconstrucaoService
+        
+        em = request.args.get('em')
+        if not em:
+            return jsonify({'error': 'Informe o instante em ?em=AAAA-MM-DD[THH:MM:SS]'}), 400
+        try:
+            instante = ReconstrucaoService.extrair_instante(em)
+        except ValueError:
+            return jsonify({'error': 'Instante inválido (use AAAA-MM-DD ou AAAA-MM-DDTHH:MM:SS)'}), 400
+        
+        equipamento = Equipamento.query.filter_by(id_publico=id_publico).first()
+        if not equipamento:
+            return jsonify({'error': 'Equipamento não encontrado'}), 404
+        
+        try:
+            resultado = ReconstrucaoService.estado_em(equipamento, instante)
+        except Exception as e:
+            app.logger.error(f"Erro ao reconstruir estado de {id_publico}: {e}")
+            return jsonify({'error': 'Erro ao reconstruir estado do equipamento'}), 500
+        
+        if resultado is None:
+            return jsonify({'error': f'Equipamento {id_publico} ainda não existia em {instante.isoformat()}'}), 404
+        return jsonify({'id_publico': id_publico, 'instante': instante.isoformat(), **resultado})
+    
     @app.route('/api/search')
     @login_required
     def api_search():
@@ -484,54 +669,50 @@ def init_routes(app):
         query = request.args.get('q', '')
         
         try:
-            resultados = SearchService.buscar_equipamentos(query)
+            campos = EquipamentoService.extrair_campos(request.args.get('campos'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        try:
+            resultados = SearchService.buscar_equipamentos(query, campos=campos)
             return jsonify({'resultados': resultados})
         except Exception as e:
             app.logger.error(f"Erro na API de busca: {e}")
             return jsonify({'error': str(e)}), 500
     
+    @app.route('/metrics')
+    def metrics():
+        """Métricas no formato de exposição do Prometheus (agregadas entre os workers)
+        
+        Com METRICAS_TOKEN, exige 'Authorization: Bearer <token>' (scrape);
+        sem token, só para usuários autenticados.
+        """
+        token = app.config.get('METRICAS_TOKEN')
+        if token:
+            autorizado = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+        else:
+            autorizado = current_user.is_authenticated
+        if not autorizado:
+            return Response('Não autorizado\n', status=401, mimetype='text/plain')
+        return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+    
     @app.route('/gerar_termo_cautela/<id_publico>')
     @login_required
     def gerar_termo_cautela(id_publico):
         """Gerar PDF do Termo de Cautela"""
         try:
-            equipamento = Equipamento.query.filter_by(id_publico=id_publico).first()
+            # Categoria e fornecedor na mesma consulta do equipamento
+            equipamento = Equipamento.query.options(
+                joinedload(Equipamento.categoria_obj),
+                joinedload(Equipamento.fornecedor_obj)
+            ).filter_by(id_publico=id_publico).first()
             if not equipamento:
                 return jsonify({'error': 'Equipamento não encontrado'}), 404
             
-            # Coletar dados do equipamento com tratamento seguro
-            categoria_nome = 'N/A'
-            if equipamento.categoria_id:
-                categoria = Categoria.query.get(equipamento.categoria_id)
-                categoria_nome = categoria.nome if categoria else 'N/A'
-                
-            fornecedor_nome = 'N/A'  
-            if equipamento.fornecedor_id:
-                fornecedor = Fornecedor.query.get(equipamento.fornecedor_id)
-                fornecedor_nome = fornecedor.nome if fornecedor else 'N/A'
-            
-            dados = {
-                'tipo': equipamento.tipo,
-                'marca': equipamento.marca,
-                'modelo': equipamento.modelo,
-                'num_serie': equipamento.num_serie,
-                'patrimonio': equipamento.id_publico,
-                'valor': f"{equipamento.valor:.2f}" if equipamento.valor else '0,00',
-                'responsavel': equipamento.responsavel or 'A definir',
-                'localizacao': equipamento.localizacao,
-                'observacoes': equipamento.observacoes or 'Nenhuma observação especial.',
-                'categoria': categoria_nome,
-                'fornecedor': fornecedor_nome,
-                'codigo_barras': equipamento.codigo_barras or 'N/A',
-                'data_emissao': datetime.now().strftime('%d/%m/%Y'),
-                'usuario_emitente': current_user.nome_completo or 'Setor de TI/Patrimônio'
-            }
-            
-            # Gerar PDF
-            from io import BytesIO
-            pdf_buffer = BytesIO()
-            criar_termo_cautela_pdf(dados, pdf_buffer)
-            pdf_buffer.seek(0)
+            dados = montar_dados_termo(equipamento, usuario_emitente=current_user.nome_completo)
+            
+            # Gerar PDF (reaproveitado do cache se os dados não mudaram)
+            pdf = termo_renderer.renderizar(dados)
             
             # Registrar ação no histórico
             HistoricoService.registrar_acao(
@@ -541,7 +722,7 @@ def init_routes(app):
             )
             
             return Response(
-                pdf_buffer.getvalue(),
+                pdf,
                 mimetype='application/pdf',
                 headers={'Content-Disposition': f'attachment; filename=termo_cautela_{equipamento.id_publico}.pdf'}
             )
@@ -550,6 +731,58 @@ def init_routes(app):
             app.logger.error(f"Erro ao gerar termo de cautela: {e}")
             return jsonify({'error': 'Erro ao gerar termo de cautela'}), 500
     
+    @app.route('/termos/lote', methods=['GET', 'POST'])
+    @login_required
+    def gerar_termos_lote():
+        """Termos de cautela em lote: ZIP (um PDF por equipamento) ou PDF único
+        
+        Aceita `ids` (IDs públicos separados por vírgula/espaço) ou os mesmos
+        filtros de /consulta; a resposta é enviada em streaming.
+        """
+        formato = request.values.get('formato', 'zip')
+        try:
+            filtros = ConsultaService.extrair_filtros(request.values)
+            ids_publicos = TermoLoteService.extrair_ids(request.values.get('ids', ''))
+            equipamentos = TermoLoteService.selecionar(ids_publicos, filtros)
+            chunks = TermoLoteService.gerar(
+                equipamentos,
+                formato,
+                usuario_emitente=current_user.nome_completo,
+                usuario_id=current_user.id,
+                ip_address=request.remote_addr,
+                descricao=f'Termo de cautela gerado em lote por {current_user.username}',
+                processos=app.config.get('TERMO_PROCESSOS')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        nome_arquivo = f'termos_cautela_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{formato}'
+        return Response(
+            stream_with_context(contar_bytes(chunks, f'termos_{formato}')),
+            mimetype='application/zip' if formato == 'zip' else 'application/pdf',
+            headers={'Content-Disposition': f'attachment; filename={nome_arquivo}'}
+        )
+    
+    @app.route('/etiquetas')
+    @login_required
+    def gerar_etiquetas():
+        """Folha A4 de etiquetas (QR Code + Code128) para `ids` ou filtros de /consulta"""
+        from etiquetas import EtiquetaService, LAYOUT_PADRAO
+        try:
+            filtros = ConsultaService.extrair_filtros(request.args)
+            ids_publicos = TermoLoteService.extrair_ids(request.args.get('ids', ''))
+            linhas = EtiquetaService.selecionar(ids_publicos, filtros)
+            pdf = EtiquetaService.gerar_pdf(linhas, request.args.get('layout', LAYOUT_PADRAO))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        TAMANHO_EXPORTACAO.observar(len(pdf), formato='etiquetas')
+        return Response(
+            pdf,
+            mimetype='application/pdf',
+            headers={'Content-Disposition': f'attachment; filename=etiquetas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'}
+        )
+    
     @app.route('/upload_termo/<id_publico>', methods=['GET', 'POST'])
     @login_required
     def upload_termo(id_publico):
@@ -681,6 +914,7 @@ def init_routes(app):
                     flash(f'Senha do usuário {usuario.username} foi resetada!', 'warning')
                 
                 db.session.commit()
+                cache_usuarios.invalidar(usuario.id)
                 
                 # Registrar histórico da ação
                 HistoricoService.registrar_acao(
@@ -720,6 +954,7 @@ def init_routes(app):
             status_texto = 'ativado' if usuario.ativo else 'desativado'
             
             db.session.commit()
+            cache_usuarios.invalidar(usuario.id)
             
             # Registrar histórico
             HistoricoService.registrar_acao(
@@ -791,6 +1026,7 @@ def init_routes(app):
             username = usuario.username
             db.session.delete(usuario)
             db.session.commit()
+            cache_usuarios.invalidar(user_id)
             
             # Registrar histórico
             HistoricoService.registrar_acao(
@@ -815,27 +1051,15 @@ def init_routes(app):
             return redirect(url_for('home'))
         
         # Estatísticas de usuários
-        total_usuarios = Usuario.query.count()
-        usuarios_ativos = Usuario.query.filter_by(ativo=True).count()
-        usuarios_inativos = total_usuarios - usuarios_ativos
-        
-        # Usuários por nível de acesso
-        nivel_1 = Usuario.query.filter_by(nivel_acesso=1).count()  # Visualizador
-        nivel_2 = Usuario.query.filter_by(nivel_acesso=2).count()  # Operador
-        nivel_3 = Usuario.query.filter_by(nivel_acesso=3).count()  # Admin
+        stats = ReportService.gerar_estatisticas_usuarios()
+        if stats is None:
+            flash('Erro ao gerar estatísticas de usuários!', 'error')
+            return redirect(url_for('admin_usuarios'))
         
         dados = {
             'now': datetime.utcnow(),
             'usuarios': Usuario.query.order_by(Usuario.created_at.desc()).all(),
-            'stats': {
-                'total_usuarios': total_usuarios,
-                'usuarios_ativos': usuarios_ativos,
-                'usuarios_inativos': usuarios_inativos,
-                'admins': nivel_3,
-                'nivel_1': nivel_1,
-                'nivel_2': nivel_2,
-                'nivel_3': nivel_3
-            }
+            'stats': stats
         }
         
         return render_template('admin_relatorio_usuarios.html', **dados)
\ No newline at end of file